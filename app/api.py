@@ -1,16 +1,16 @@
-from flask import Flask, request, jsonify, render_template, make_response
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context, g
 import os
 import json
-from .utils import (
-    check_gitlab_pipeline,
-    check_gitlab_project,
-    check_gitlab_runner,
-    get_gitlab_project_id,
-    check_gitlab_pipeline_two_success,
-    check_gitlab_pipeline_min_success
-)
-from .database import db_session, init_db
-from .models import User, Lab, GradingResult
+import hmac
+import threading
+import time
+from .database import db_session, init_db, get_worker_db_stats
+from sqlalchemy import tuple_, insert, func, case, or_
+from sqlalchemy.exc import OperationalError
+from .models import User, Lab, Submission, CriterionResult, GradingResult, BestResult
+from .scheme_registry import SchemeRegistry
+from .logging_setup import setup_logging, get_logger
+from . import pipeline_store, project_cache, lab_sessions, best_results, grading_jobs, lab_logs, metrics, grading_engine, regrade
 from datetime import datetime
 import pytz
 wib = pytz.timezone("Asia/Jakarta")
@@ -18,19 +18,38 @@ timestamp = datetime.now(wib)
 import csv
 from io import StringIO
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
-
-SCHEME_PATH = "/opt/grading/app/schemes/"
-GITLAB_URL = "https://gitlab.smkn1cibinong.sch.id"
-ACTIVE_LABS = {}
-
-def get_latest_pipeline(project_id, ref="main"):
-    url = f"{GITLAB_URL}/api/v4/projects/{project_id}/pipelines"
-    headers = {"Authorization": f"Bearer {GITLAB_TOKEN}"}
-
-    r = requests.get(url, headers=headers, params={"ref": ref})
-    return r.json()[0]
+setup_logging()
+log = get_logger(__name__)
+init_db()
+
+SCHEME_PATH = os.getenv("SCHEME_PATH", "/opt/grading/app/schemes/")
+schemes_registry = SchemeRegistry(SCHEME_PATH)
+GITLAB_SECRET = os.getenv("GITLAB_SECRET")
+# Event system hook GitLab yang mengubah path -> project_id
+PROJECT_EVENTS = ("project_create", "project_destroy", "project_rename", "project_transfer")
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+NOT_STARTED_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+RESULTS_COUNT_TTL = int(os.getenv("RESULTS_COUNT_TTL", "60"))
+LOG_READ_MAX_BYTES = 1024 * 1024  # maksimal isi log per respons /get-log?offset=
+LOG_FOLLOW_INTERVAL = float(os.getenv("LOG_FOLLOW_INTERVAL", "0.5"))
+LOG_FOLLOW_MAX_SECONDS = int(os.getenv("LOG_FOLLOW_MAX_SECONDS", "60"))
+GRADING_JOB_MAX_WAIT = float(os.getenv("GRADING_JOB_MAX_WAIT", "20"))  # < timeout worker gunicorn (30 dtk)
+BATCH_GRADE_MAX = int(os.getenv("BATCH_GRADE_MAX", "200"))  # submission per request /grade-lab/batch
+
+# Cache jumlah hasil /results per filter: key -> (expires_monotonic, total)
+_results_count_cache = {}
+_results_count_lock = threading.Lock()
+
+# Kriteria remote (GitLab API) dari plan grading_engine dijalankan paralel di pool ini
+GITLAB_CHECK_WORKERS = int(os.getenv("GITLAB_CHECK_WORKERS", "8"))
+gitlab_executor = ThreadPoolExecutor(
+    max_workers=GITLAB_CHECK_WORKERS,
+    thread_name_prefix="gitlab-check",
+)
 
 
 def sync_labs_from_schemes():
@@ -38,30 +57,21 @@ def sync_labs_from_schemes():
     Sinkronkan tabel 'labs' dengan semua file JSON di SCHEME_PATH.
     lab_id = nama file tanpa ekstensi .json
     """
-    scheme_files = glob.glob(os.path.join(SCHEME_PATH, "*.json"))
-
     # Ambil lab_id yang sudah ada di DB
     existing = {lab.lab_id for lab in db_session.query(Lab.lab_id).all()}
 
-    for path in scheme_files:
-        filename = os.path.basename(path)
-        lab_id, ext = os.path.splitext(filename)
-        if ext != ".json":
-            continue
+    for lab_id in schemes_registry.lab_ids():
         if lab_id not in existing:
-            db_session.add(Lab(lab_id=lab_id, scheme_path=path))
+            db_session.add(Lab(lab_id=lab_id, scheme_path=schemes_registry.path_for(lab_id)))
             existing.add(lab_id)
 
     db_session.commit()
 
 def run_cleanup_actions(lab_id):
-    scheme_file = os.path.join(SCHEME_PATH, f"{lab_id}.json")
-    if not os.path.exists(scheme_file):
+    scheme = schemes_registry.get(lab_id)
+    if scheme is None:
         return
 
-    with open(scheme_file, "r") as f:
-        scheme = json.load(f)
-
     for criterion in scheme.get("criteria", []):
         ctype = criterion.get("type")
         key = criterion.get("key")
@@ -75,8 +85,28 @@ def run_cleanup_actions(lab_id):
                 username = key
                 subprocess.run(["userdel", "-r", username], check=False)
         except Exception as e:
-            print(f"Cleanup error for {lab_id} {ctype} {key}: {e}")
+            log.warning("Cleanup error", extra={"lab_id": lab_id, "type": ctype, "key": key, "error": str(e)})
+
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        # Label pakai pola route (mis. /grade-jobs/<job_id>), bukan URL mentah
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.REQUEST_DURATION.labels(
+            method=request.method, route=route, status=str(response.status_code)
+        ).observe(time.perf_counter() - start)
+    return response
+
+@app.teardown_appcontext
+def shutdown_session(exception=None):
+    # Kembalikan koneksi ke pool di akhir tiap request
+    db_session.remove()
 
 @app.before_request
 def validate_content_type():
@@ -110,7 +140,7 @@ def register():
         return jsonify({"message": "User registered successfully"}), 201
 
     except Exception as e:
-        print(f"Error in register: {str(e)}")  # Debugging
+        log.exception("Error in register: %s", e)
         db_session.rollback()
         return jsonify({"error": "Server error", "details": str(e)}), 500
 
@@ -139,7 +169,7 @@ def login():
         return jsonify({"token": token, "class_name": user.class_name}), 200
 
     except Exception as e:
-        print(f"Error in login: {str(e)}")  # Debugging
+        log.exception("Error in login: %s", e)
         return jsonify({"error": "Server error", "details": str(e)}), 500
 
 @app.route('/start-lab', methods=['POST'])
@@ -160,37 +190,28 @@ def start_lab():
             return jsonify({"error": "Invalid request data"}), 400
 
         lab_id = data.get("lab_id")
-        scheme_file = os.path.join(SCHEME_PATH, f"{lab_id}.json")
 
         # Periksa apakah file skema lab ada
-        if not os.path.exists(scheme_file):
+        if not schemes_registry.exists(lab_id):
             return jsonify({"error": f"Lab '{lab_id}' not found"}), 404
 
-        from datetime import datetime
-        import pytz
-        wib = pytz.timezone("Asia/Jakarta")
-        start_time = datetime.now(wib)
-
-        # Simpan lab yang aktif untuk token ini
-        ACTIVE_LABS[token] = {"lab_id": lab_id, "status": "active", "start_time": start_time}
+        # Simpan lab yang aktif untuk token ini (dibagi antar worker)
+        lab_sessions.start(token, lab_id)
 
         return jsonify({"message": f"Lab '{lab_id}' started successfully"}), 200
 
     except Exception as e:
-        print(f"Error in start_lab: {str(e)}")  # Debugging
+        log.exception("Error in start_lab: %s", e)
         return jsonify({"error": "Server error", "details": str(e)}), 500
 
 @app.route('/get-scheme-description', methods=['GET'])
 def get_scheme_description():
     lab_id = request.args.get("lab_id")
-    scheme_file = os.path.join(SCHEME_PATH, f"{lab_id}.json")
+    scheme = schemes_registry.get(lab_id)
 
-    if not os.path.exists(scheme_file):
+    if scheme is None:
         return jsonify({"error": "Lab not found"}), 404
 
-    with open(scheme_file, 'r') as f:
-        scheme = json.load(f)
-
     # Format deskripsi skema
     description = {
         "lab_id": lab_id,
@@ -210,14 +231,11 @@ def get_scheme_description():
 @app.route('/get-scheme', methods=['GET'])
 def get_scheme():
     lab_id = request.args.get("lab_id")
-    scheme_file = os.path.join(SCHEME_PATH, f"{lab_id}.json")
+    scheme = schemes_registry.get(lab_id)
 
-    if not os.path.exists(scheme_file):
+    if scheme is None:
         return jsonify({"error": "Lab not found"}), 404
 
-    with open(scheme_file, 'r') as f:
-        scheme = json.load(f)
-
     return jsonify({"scheme": scheme}), 200
 
 from datetime import datetime
@@ -230,7 +248,8 @@ def grade_lab():
         # Ambil token dan body
         token = request.headers.get("Authorization", "").replace("Bearer ", "")
         data = request.get_json()
-        print("FULL DATA POSTED:", data)
+        # Payload lengkap hanya di level DEBUG (dan disampling), bukan tiap request
+        log.debug("Grade request", extra={"payload": data})
 
         if not data:
             return jsonify({"error": "Invalid request data"}), 400
@@ -239,232 +258,405 @@ def grade_lab():
         class_name = data.get("class_name")
         client_data = data.get("client_data", {})
 
-        lab_log_path = f"/var/log/gradingctl/labs/{lab_id}.log"
-        os.makedirs(os.path.dirname(lab_log_path), exist_ok=True)
-
         if not lab_id or not class_name:
             return jsonify({"error": "lab_id and class_name are required"}), 400
 
         # Ambil username dari token
         username = token.split("-")[2]
-        print(f"Username: {username}, Class Name: {class_name}")
+        log.debug("Grade request user", extra={"username": username, "class_name": class_name})
 
         if not isinstance(client_data, dict):
             return jsonify({"error": "Invalid client data format"}), 400
 
-        # Validasi / inisialisasi lab aktif
-        active_lab_map = ACTIVE_LABS.setdefault(token, {})
-        active_lab = active_lab_map.get(lab_id)
-        # Kalau belum ada / beda lab_id, inisialisasi baru
-        if active_lab is None:
-            active_lab = {
-#                "lab_id": lab_id,
-                "start_time": datetime.now(wib)
+        # Baca scheme (dari cache registry)
+        scheme = schemes_registry.get(lab_id)
+        if scheme is None:
+            return jsonify({"error": "Lab not found"}), 404
+
+        # Validasi / inisialisasi lab aktif (start_time dalam UTC)
+        start_time = lab_sessions.get_or_start(token, lab_id)
+        submitted_at = datetime.utcnow()
+
+        # Mode async: langsung balas job_id, hasil diambil lewat /grade-jobs/<job_id>.
+        # Client gradingctl lama tidak mengirim "async" dan tetap sinkron
+        if data.get("async") or request.args.get("async") in ("1", "true"):
+            job_id = grading_jobs.submit(
+                lab_id, username, grade_submission,
+                username, lab_id, scheme, client_data, start_time, submitted_at,
+            )
+            return jsonify({
+                "job_id": job_id,
+                "status": grading_jobs.QUEUED,
+                "poll_url": f"/grade-jobs/{job_id}",
+            }), 202
+
+        result, status_code = grade_submission(username, lab_id, scheme, client_data, start_time, submitted_at)
+        return jsonify(result), status_code
+
+    except json.JSONDecodeError as e:
+        log.warning("JSON decode error: %s", e)
+        return jsonify({"error": "Invalid JSON format", "details": str(e)}), 400
+    except Exception as e:
+        log.exception("Error in grade_lab: %s", e)
+        return jsonify({"error": "Server error", "details": str(e)}), 500
+
+def score_outcomes(username, lab_id, outcomes, start_time, submitted_at):
+    """
+    Hitung nilai, feedback, penalty waktu dan baris log dari hasil
+    grading_engine untuk satu submission. Tidak menyentuh database.
+    """
+    summary = grading_engine.summarize(outcomes)
+
+    log_lines = []  # ditulis sekaligus setelah semua kriteria dinilai
+    for description, msg in summary["failures"]:
+        log.debug("Criterion failed", extra={
+            "lab_id": lab_id, "username": username, "criterion": description, "error": msg,
+        })
+        log_lines.append(f"[{datetime.now(wib)}] CASE: {description} | ERROR: {msg}")
+
+    log.debug("Grading feedback", extra={
+        "lab_id": lab_id, "username": username,
+        "failed": summary["failed"], "passed": summary["passed"], "score": summary["score"],
+    })
+
+    # Hitung durasi sampai saat submit (bukan saat job async selesai)
+    end_time = submitted_at
+    duration = (end_time - start_time).total_seconds() if start_time else None
+    total_score, penalty_messages = grading_engine.apply_time_penalty(summary["score"], duration)
+
+    return {
+        "username": username,
+        "score": total_score,
+        "feedback": summary["feedback"],
+        "criteria": summary["criteria"],
+        "duration": duration,
+        "penalty": penalty_messages,
+        "log_lines": log_lines,
+    }
+
+
+def store_graded(lab_id, entries):
+    """
+    Tambahkan hasil grading ke db_session tanpa commit. entries berisi
+    (graded, client_data, user_info, group_users); tiap entry jadi satu Submission yang
+    di-mapping ke semua anggota grup. Semua baris GradingResult dan
+    CriterionResult ditulis dengan satu INSERT bulk. Return list Submission.
+    """
+    now = datetime.now(wib)
+    submissions = [
+        Submission(
+            username=graded["username"],
+            class_name=user_info.class_name,
+            group_name=user_info.group_name,
+            lab_id=lab_id,
+            score=graded["score"],
+            feedback=", ".join(graded["feedback"]),
+            duration=graded["duration"],
+            status="done",
+            timestamp=now,
+            payload=regrade.pack_payload(client_data)  # untuk re-grade kalau scheme diperbaiki
+        )
+        for graded, client_data, user_info, group_users in entries
+    ]
+    db_session.add_all(submissions)
+    db_session.flush()  # supaya submission.id terisi
+
+    member_rows = []
+    criterion_rows = []
+    for submission, (graded, _, user_info, group_users) in zip(submissions, entries):
+        member_rows.extend(
+            {
+                "submission_id": submission.id,
+                "username": group_user.username,
+                "class_name": submission.class_name,
+                "lab_id": lab_id,
+                "score": submission.score,
+                "timestamp": submission.timestamp,
+            }
+            for group_user in group_users
+        )
+        criterion_rows.extend(
+            {
+                "submission_id": submission.id,
+                "criterion_index": index,
+                "lab_id": lab_id,
+                "class_name": submission.class_name,
+                "type": ctype,
+                "passed": passed,
+                "message": message,
+                "fingerprint": fingerprint,
             }
-            active_lab_map[lab_id] = active_lab
+            for index, ctype, passed, message, fingerprint in graded["criteria"]
+        )
+
+    if member_rows:
+        db_session.execute(insert(GradingResult), member_rows)
+    if criterion_rows:
+        db_session.execute(insert(CriterionResult), criterion_rows)
+
+    # best_results ikut transaksi yang sama
+    best_results.record(db_session, [submission.id for submission in submissions])
+    return submissions
+
+
+def graded_body(graded, lab_id):
+    return {
+        "score": graded["score"] if graded["score"] is not None else 0,
+        "feedback": graded["feedback"] if isinstance(graded["feedback"], list) else [],
+        "log_path": lab_logs.path_for(lab_id, graded["username"]),
+        "duration": graded["duration"] if graded["duration"] is not None else 0,
+        "penalty": graded["penalty"]
+    }
+
+
+def grade_submission(username, lab_id, scheme, client_data, start_time, submitted_at):
+    """
+    Nilai client_data terhadap scheme lalu simpan hasilnya.
+    Dipakai langsung oleh /grade-lab (sinkron) dan dari pool grading_jobs
+    (async). Return (body, http_status).
+    """
+    # Plan di-compile sekali per versi scheme; kriteria GitLab berjalan
+    # paralel di gitlab_executor, hasil tetap urut sesuai scheme
+    plan = grading_engine.get_plan(lab_id, scheme)
+    outcomes = grading_engine.run_plan(plan, client_data, gitlab_executor)
+    graded = score_outcomes(username, lab_id, outcomes, start_time, submitted_at)
+
+    # Satu batch per grading, ditulis oleh thread writer (tidak menunggu disk)
+    lab_logs.write(lab_id, username, graded["log_lines"])
 
-        # Baca scheme
-        scheme_file = os.path.join(SCHEME_PATH, f"{lab_id}.json")
-        if not os.path.exists(scheme_file):
+    try:
+        # Ambil info user dan grup
+        user_info = db_session.query(User).filter_by(username=username).first()
+        if not user_info:
+            return {"error": "User not found"}, 404
+
+        group_users = db_session.query(User).filter_by(
+            class_name=user_info.class_name, group_name=user_info.group_name
+        ).all()
+
+        submission, = store_graded(lab_id, [(graded, client_data, user_info, group_users)])
+        db_session.commit()
+
+        log.info("Submission saved", extra={
+            "submission_id": submission.id, "lab_id": lab_id, "group": user_info.group_name,
+            "members": [u.username for u in group_users], "score": graded["score"],
+            "duration": graded["duration"],
+        })
+
+    except OperationalError as db_error:
+        # Masih terkunci setelah busy_timeout: jangan diam-diam dibuang,
+        # hasil belum tersimpan jadi client harus mengulang
+        log.warning("Database busy, result not saved: %s", db_error)
+        db_session.rollback()
+        return {
+            "error": "Database busy, result not saved. Please retry.",
+            "details": str(db_error)
+        }, 503
+    except Exception as db_error:
+        log.exception("Database Error: %s", db_error)
+        db_session.rollback()
+
+    return graded_body(graded, lab_id), 200
+
+
+@app.route('/grade-lab/batch', methods=['POST'])
+def grade_lab_batch():
+    """
+    Nilai banyak submission untuk satu lab sekaligus (mis. proctor menutup
+    satu kelas lewat gradingctl). Body:
+        {"lab_id": ..., "submissions": [{"token": ..., "client_data": {...}}, ...]}
+    Scheme, user/grup dan sesi lab di-resolve sekali untuk seluruh batch,
+    kriteria GitLab dijalankan sekali dan dipakai bersama, dan semua hasil
+    ditulis dalam satu transaksi. Hasil dikembalikan per submission sesuai
+    urutan input; submission yang tidak valid tidak menggagalkan yang lain.
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "Invalid request data"}), 400
+
+        lab_id = data.get("lab_id")
+        items = data.get("submissions")
+        if not lab_id or not isinstance(items, list) or not items:
+            return jsonify({"error": "lab_id and a non-empty submissions list are required"}), 400
+        if len(items) > BATCH_GRADE_MAX:
+            return jsonify({"error": f"At most {BATCH_GRADE_MAX} submissions per batch"}), 400
+
+        scheme = schemes_registry.get(lab_id)
+        if scheme is None:
             return jsonify({"error": "Lab not found"}), 404
 
-        with open(scheme_file, 'r') as f:
-            scheme = json.load(f)
-
-        total_score = 0
-        feedback_failed = []
-        feedback_success = []
-
-        # ========= LOGIKA PENILAIAN PER KRITERIA =========
-        for criterion in scheme.get("criteria", []):
-            ctype = criterion.get("type")
-            key = criterion.get("key")
-            expected = criterion.get("expected")
-            description = criterion.get("description")
-            score = criterion.get("score", 0)
-
-            actual_value = client_data.get(key, None)
-            failed = False
-
-            if ctype == "gitlab_project":
-                # key berisi path_with_namespace, contoh:
-                # kelompokx-sijax/build-image-kelompokx-sijax
-                ok, msg = check_gitlab_project(key)
-                if not ok:
-                    failed = True
-                    actual_value = msg  # biar kebaca di log
-            elif ctype == "gitlab_pipeline":
-                project_id, msg = get_gitlab_project_id(key)
-                if not project_id:
-                    failed = True
-                    actual_value = msg
-                else:
-                # Khusus QUIZ-010-1: harus 3 job (build, staging, production) sukses
-                    if lab_id == "OSADM-QUIZ-010-1":
-                        # Kamu bisa buat fungsi check_gitlab_pipeline_min_success(project_id, ref, 3) di utils.py
-                        ok, msg = check_gitlab_pipeline_min_success(
-                            project_id=project_id,
-                            ref=criterion.get("ref", "main"),
-                            min_count=3
-                        )
-                    # khusus OSADM-010-2: minimal 2 job (staging+production) sukses
-                    elif lab_id == "OSADM-010-2":
-                        ok, msg = check_gitlab_pipeline_two_success(
-                            project_id=project_id,
-                            ref=criterion.get("ref", "main"),
-                        )
-                    else:
-                        ok, msg = check_gitlab_pipeline(
-                            project_id=project_id,
-                            ref=criterion.get("ref", "main"),
-                        )
-                    actual_value = msg
-                    if not ok:
-                        failed = True
-
-            elif ctype == "command":
-                if str(actual_value) != str(expected):
-                    failed = True
-            elif ctype == "file_exists":
-                if expected != str(actual_value):
-                    failed = True
-            elif ctype == "file_content":
-                contains = criterion.get("contains")
-                if not (contains and contains in str(actual_value)):
-                    failed = True
-            elif ctype == "service":
-                if expected != str(actual_value):
-                    failed = True
-            elif ctype == "directory":
-                if expected != str(actual_value):
-                    failed = True
-            elif ctype == "config_check":
-                if not (expected and str(actual_value) == "correct"):
-                    failed = True
-            elif ctype == "package":
-                if expected != str(actual_value):
-                    failed = True
-            elif ctype == "user":
-                if expected != str(actual_value):
-                    failed = True
-            elif ctype == "group":
-                if expected != str(actual_value):
-                    failed = True
-            elif ctype == "gitlab_runner":
-                ok, msg = check_gitlab_runner(
-                    path_with_namespace=key,
-                    expected_name=expected,
-                    ref="main",
-                )
-                if not ok:
-                    failed = True
-                actual_value = msg
-            elif ctype == "image":
-                if expected != str(actual_value):
-                    failed = True
-
-
-            if not failed:
-                total_score += score
-                feedback_success.append(description)
+        submitted_at = datetime.utcnow()
+        results = [None] * len(items)
+        valid = []  # (posisi di input, token, username, client_data)
+        for pos, item in enumerate(items):
+            token = item.get("token") if isinstance(item, dict) else None
+            client_data = item.get("client_data", {}) if isinstance(item, dict) else None
+            # Token null/angka hanya menggagalkan item ini, bukan seluruh batch
+            token = token.replace("Bearer ", "") if isinstance(token, str) else ""
+            parts = token.split("-")
+            if len(parts) < 3:
+                results[pos] = {"error": "Invalid token", "status": 400}
+            elif not isinstance(client_data, dict):
+                results[pos] = {"error": "Invalid client data format", "status": 400}
+            else:
+                valid.append((pos, token, parts[2], client_data))
+
+        # User dan anggota grup: dua query untuk seluruh batch
+        usernames = {username for _, _, username, _ in valid}
+        users = {
+            u.username: u
+            for u in db_session.query(User).filter(User.username.in_(usernames)).all()
+        } if usernames else {}
+        group_keys = {(u.class_name, u.group_name) for u in users.values()}
+        # ('K', NULL) IN (...) tidak pernah cocok di SQL; group_name NULL
+        # dicari lewat IS NULL, sama seperti filter_by(group_name=None) di /grade-lab
+        named_keys = {key for key in group_keys if key[1] is not None}
+        null_classes = {class_name for class_name, group_name in group_keys if group_name is None}
+        conditions = []
+        if named_keys:
+            conditions.append(tuple_(User.class_name, User.group_name).in_(named_keys))
+        if null_classes:
+            conditions.append(User.group_name.is_(None) & User.class_name.in_(null_classes))
+        groups = {}
+        if conditions:
+            for u in db_session.query(User).filter(or_(*conditions)).all():
+                groups.setdefault((u.class_name, u.group_name), []).append(u)
+
+        pending = []
+        for pos, token, username, client_data in valid:
+            if username not in users:
+                results[pos] = {"username": username, "error": "User not found", "status": 404}
             else:
-                feedback_failed.append(f"{description}: Failed")
+                pending.append((pos, token, username, client_data))
+
+        start_times = lab_sessions.get_or_start_many([token for _, token, _, _ in pending], lab_id)
+
+        plan = grading_engine.get_plan(lab_id, scheme)
+        all_outcomes = grading_engine.run_plan_batch(
+            plan, [client_data for _, _, _, client_data in pending], gitlab_executor
+        )
 
-                #normalisasi pesan error
-                msg = str(actual_value)
-                if msg.startswith("Error: "):
-                    msg = msg[len("Error: "):]
+        entries = []
+        for (pos, token, username, client_data), outcomes in zip(pending, all_outcomes):
+            graded = score_outcomes(username, lab_id, outcomes, start_times.get(token), submitted_at)
+            lab_logs.write(lab_id, username, graded["log_lines"])
+            user_info = users[username]
+            entries.append((pos, graded, client_data, user_info, groups.get((user_info.class_name, user_info.group_name), [user_info])))
+
+        if entries:
+            try:
+                submissions = store_graded(lab_id, [entry[1:] for entry in entries])
+                db_session.commit()
+            except OperationalError as db_error:
+                log.warning("Database busy, batch not saved: %s", db_error)
+                db_session.rollback()
+                return jsonify({
+                    "error": "Database busy, results not saved. Please retry.",
+                    "details": str(db_error)
+                }), 503
+
+            for (pos, graded, *_), submission in zip(entries, submissions):
+                results[pos] = {
+                    "username": graded["username"],
+                    "status": 200,
+                    "submission_id": submission.id,
+                    **graded_body(graded, lab_id),
+                }
+
+        log.info("Batch saved", extra={
+            "lab_id": lab_id, "submissions": len(items), "saved": len(entries),
+        })
+        return jsonify({"lab_id": lab_id, "results": results}), 200
 
-                print("DEBUG LOG WRITE:", lab_log_path, description, msg, flush=True)
+    except Exception as e:
+        db_session.rollback()
+        log.exception("Error in grade_lab_batch: %s", e)
+        return jsonify({"error": "Server error", "details": str(e)}), 500
 
-                now_str = datetime.now(wib).strftime("%Y-%m-%d %H:%M:%S")
+@app.route('/grade-jobs/<job_id>', methods=['GET'])
+def grade_job_status(job_id):
+    """
+    Status/hasil grading async. ?wait=N (detik) untuk long-poll sampai job
+    selesai, dibatasi GRADING_JOB_MAX_WAIT supaya tidak kena timeout worker.
+    """
+    try:
+        token = request.headers.get("Authorization", "").replace("Bearer ", "")
+        try:
+            wait = min(max(float(request.args.get("wait", 0)), 0), GRADING_JOB_MAX_WAIT)
+        except ValueError:
+            return jsonify({"error": "wait must be a number"}), 400
 
-                with open(lab_log_path, 'a') as logfile:
-                    logfile.write(
-                        f"[{datetime.now(wib)}] CASE: {description} | ERROR: {msg}\n"
-                    )
+        job = grading_jobs.wait(job_id, wait) if wait else grading_jobs.get(job_id)
 
-        # Kalau ada minimal 1 failed, nilai 0
-        #if any("Failed" in f for f in feedback_failed):
-        #    total_score = 0
+        # Job hanya bisa dilihat oleh user yang men-submit
+        parts = token.split("-")
+        if job is None or len(parts) < 3 or parts[2] != job["username"]:
+            return jsonify({"error": "Job not found"}), 404
 
-        # Gabungkan: gagal dulu, lalu yang sukses
-        all_feedback = feedback_failed + feedback_success
+        return jsonify({
+            "job_id": job["job_id"],
+            "lab_id": job["lab_id"],
+            "status": job["status"],
+            "http_status": job["http_status"],
+            "result": job["result"],
+        }), 200
+    except Exception as e:
+        log.exception("Error in grade_job_status: %s", e)
+        return jsonify({"error": "Server error", "details": str(e)}), 500
 
-        print("DEBUG feedback_failed:", feedback_failed)
-        print("DEBUG feedback_success:", feedback_success)
-        print("DEBUG all_feedback:", all_feedback)
-        print(f"Total score calculated: {total_score}")
+@app.route('/regrade', methods=['POST'])
+def start_regrade():
+    """
+    Nilai ulang semua attempt satu lab terhadap scheme saat ini (mis.
+    setelah scheme diperbaiki). Body: {"lab_id": ...}. Berjalan di
+    background; progress lewat /regrade/<job_id>.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        lab_id = data.get("lab_id")
+        if not lab_id:
+            return jsonify({"error": "lab_id is required"}), 400
 
-        try:
-            # Hitung durasi
-            start_time = active_lab.get("start_time")
-            end_time = datetime.now(wib)
-            duration = (end_time - start_time).total_seconds() if start_time else None
-
-            # Penalty waktu (min 80, hanya kalau nilai > 0)
-            max_duration = 180   # 3 menit (detik)
-            penalty_percent = 5
-            min_score = 80
-            penalty_messages = []
-            score_awal = total_score
-
-            if total_score > 0 and duration is not None and duration > max_duration:
-                n_penalty = int((duration - max_duration) // max_duration) + 1
-                penalty_total = n_penalty * penalty_percent
-                new_score = score_awal * (100 - penalty_total) / 100
-                if new_score < min_score:
-                    new_score = min_score
-                total_score = new_score
-                penalty_messages.append(
-                    f"Waktu pengerjaan melebihi 3 menit, pengurangan {penalty_percent}% per 3 menit. Nilai akhir: {new_score:.2f}"
-                )
-
-            # Ambil info user dan grup
-            user_info = db_session.query(User).filter_by(username=username).first()
-            if not user_info:
-                return jsonify({"error": "User not found"}), 404
-
-            group_name = user_info.group_name
-            class_name = user_info.class_name
-
-            group_users = db_session.query(User).filter_by(class_name=class_name, group_name=group_name).all()
-
-            # Simpan hasil ke semua anggota grup
-            for group_user in group_users:
-                grading_result = GradingResult(
-                    username=group_user.username,
-                    class_name=class_name,
-                    lab_id=lab_id,
-                    score=total_score,
-                    feedback=", ".join(all_feedback),
-                    duration=duration,
-                    status="done",
-                    timestamp=datetime.now(wib)
-                )
-                db_session.add(grading_result)
+        scheme = schemes_registry.get(lab_id)
+        if scheme is None:
+            return jsonify({"error": "Lab not found"}), 404
 
-            db_session.commit()
+        job_id = regrade.submit(lab_id, scheme)
+        return jsonify({
+            "job_id": job_id,
+            "status": grading_jobs.QUEUED,
+            "poll_url": f"/regrade/{job_id}",
+        }), 202
+    except Exception as e:
+        log.exception("Error in start_regrade: %s", e)
+        return jsonify({"error": "Server error", "details": str(e)}), 500
 
-            print(f"Data saved for group '{group_name}': {[u.username for u in group_users]}, lab: {lab_id}, score: {total_score}")
+@app.route('/regrade/<job_id>', methods=['GET'])
+def regrade_status(job_id):
+    """
+    Status, progress ({done, total}) dan ringkasan job re-grade.
+    ?wait=N untuk long-poll, sama seperti /grade-jobs.
+    """
+    try:
+        try:
+            wait = min(max(float(request.args.get("wait", 0)), 0), GRADING_JOB_MAX_WAIT)
+        except ValueError:
+            return jsonify({"error": "wait must be a number"}), 400
 
-        except Exception as db_error:
-            print(f"Database Error: {str(db_error)}")
-            db_session.rollback()
+        job = grading_jobs.wait(job_id, wait) if wait else grading_jobs.get(job_id)
+        if job is None or job["username"] != regrade.REGRADE_JOB_USER:
+            return jsonify({"error": "Job not found"}), 404
 
         return jsonify({
-            "score": total_score if total_score is not None else 0,
-            "feedback": all_feedback if isinstance(all_feedback, list) else [],
-            "log_path": lab_log_path,
-            "duration": duration if duration is not None else 0,
-            "penalty": penalty_messages
+            "job_id": job["job_id"],
+            "lab_id": job["lab_id"],
+            "status": job["status"],
+            "progress": job["progress"],
+            "result": job["result"],
         }), 200
-
-    except json.JSONDecodeError as e:
-        print(f"JSON Decode Error: {str(e)}")
-        return jsonify({"error": "Invalid JSON format", "details": str(e)}), 400
     except Exception as e:
-        print(f"Error: {str(e)}")
+        log.exception("Error in regrade_status: %s", e)
         return jsonify({"error": "Server error", "details": str(e)}), 500
 
 @app.route('/finish-lab', methods=['POST'])
@@ -484,23 +676,21 @@ def finish_lab():
 
         lab_id = data.get("lab_id")
 
-        # kalau masih tercatat aktif, hapus dari ACTIVE_LABS
-        active_lab = ACTIVE_LABS.get(token)
-        if active_lab and active_lab.get("lab_id") == lab_id:
-            del ACTIVE_LABS[token]
+        # kalau masih tercatat aktif, hapus sesi lab-nya
+        lab_sessions.finish(token, lab_id)
 
         # jalankan cleanup sesuai skema
         run_cleanup_actions(lab_id)
 
-        # hapus log kalau ada
-        lab_log_path = f"/var/log/gradingctl/labs/{lab_id}.log"
-        if os.path.exists(lab_log_path):
-            os.remove(lab_log_path)
+        # hapus log milik user ini saja (user lain di lab yang sama tidak terpengaruh)
+        parts = token.split("-")
+        if len(parts) >= 3:
+            lab_logs.remove(lab_id, parts[2])
 
         return jsonify({"message": f"Lab '{lab_id}' finished successfully"}), 200
 
     except Exception as e:
-        print(f"Error in finish_lab: {str(e)}")
+        log.exception("Error in finish_lab: %s", e)
         return jsonify({"error": "Server error", "details": str(e)}), 500
 
 @app.route('/add-lab', methods=['POST'])
@@ -526,7 +716,7 @@ def add_lab():
         return jsonify({"message": "Lab added successfully"}), 201
 
     except Exception as e:
-        print(f"Error in add-lab: {str(e)}")  # Debugging
+        log.exception("Error in add-lab: %s", e)
         db_session.rollback()
         return jsonify({"error": "Server error", "details": str(e)}), 500
 
@@ -537,7 +727,7 @@ def list_labs():
         lab_list = [{"lab_id": lab.lab_id, "scheme_path": lab.scheme_path} for lab in labs]
         return jsonify({"labs": lab_list}), 200
     except Exception as e:
-        print(f"Error in list-labs: {str(e)}")  # Debugging
+        log.exception("Error in list-labs: %s", e)
         return jsonify({"error": "Server error", "details": str(e)}), 500
 
 @app.route('/delete-lab', methods=['POST'])
@@ -561,36 +751,63 @@ def delete_lab():
         return jsonify({"message": f"Lab '{lab_id}' deleted successfully"}), 200
 
     except Exception as e:
-        print(f"Error in delete-lab: {str(e)}")  # Debugging
+        log.exception("Error in delete-lab: %s", e)
         db_session.rollback()
         return jsonify({"error": "Server error", "details": str(e)}), 500
 
+def get_page_args(default_per_page=None):
+    """
+    page & per_page dari query string (per_page dibatasi MAX_PAGE_SIZE).
+    ValueError kalau salah satunya bukan angka.
+    """
+    page = max(int(request.args.get("page", 1)), 1)
+    per_page = int(request.args.get("per_page", default_per_page or NOT_STARTED_PAGE_SIZE))
+    per_page = min(max(per_page, 1), MAX_PAGE_SIZE)
+    return page, per_page
+
+def users_not_started_query(lab_id=None, class_name=None):
+    """
+    Query username yang belum punya hasil (untuk lab_id, atau lab apa pun),
+    urut username. Anti-join NOT EXISTS ke best_results, memakai primary
+    key best_results (username, ...) untuk tiap user.
+    """
+    started = db_session.query(BestResult.username).filter(BestResult.username == User.username)
+    if lab_id:
+        started = started.filter(BestResult.lab_id == lab_id)
+
+    query = db_session.query(User.username).filter(~started.exists())
+    if class_name:
+        query = query.filter(User.class_name == class_name)
+    return query.order_by(User.username.asc())
+
 @app.route('/users-not-started-lab-filtered', methods=['GET'])
 def users_not_started_lab_filtered():
     try:
         class_name = request.args.get("class_name")
         lab_id = request.args.get("lab_id")
 
-        # Ambil semua user yang sudah memulai lab tertentu
-        users_started_lab = db_session.query(GradingResult.username).filter(GradingResult.lab_id == lab_id).all()
-        users_started_lab = [user[0] for user in users_started_lab]
-
-        # Ambil semua user berdasarkan class_name (jika ada filter class_name)
-        query = db_session.query(User)
-        if class_name:
-            query = query.filter(User.class_name == class_name)
-        all_users = query.all()
-
-        # Filter user yang belum memulai lab
-        users_not_started = [user.username for user in all_users if user.username not in users_started_lab]
+        try:
+            page, per_page = get_page_args()
+        except ValueError:
+            return jsonify({"error": "page and per_page must be integers"}), 400
+
+        # User (opsional per class_name) yang belum punya hasil untuk lab ini
+        query = users_not_started_query(lab_id=lab_id, class_name=class_name)
+        total = query.count()
+        users_not_started = [
+            username for (username,) in query.offset((page - 1) * per_page).limit(per_page)
+        ]
 
         return jsonify({
             "users_not_started": users_not_started,
             "class_name": class_name,
-            "lab_id": lab_id
+            "lab_id": lab_id,
+            "page": page,
+            "per_page": per_page,
+            "total": total
         }), 200
     except Exception as e:
-        print(f"Error in users-not-started-lab-filtered: {str(e)}")
+        log.exception("Error in users-not-started-lab-filtered: %s", e)
         return jsonify({"error": "Failed to fetch users not started lab", "details": str(e)}), 500
 
 @app.route('/users-not-started-lab', methods=['GET'])
@@ -601,20 +818,27 @@ def users_not_started_lab():
         if not lab_id:
             return jsonify({"error": "lab_id is required"}), 400
 
-        # Ambil semua user yang belum memulai lab ini
-        users_started_lab = db_session.query(GradingResult.username).filter(GradingResult.lab_id == lab_id).all()
-        users_started_lab = [user[0] for user in users_started_lab]
-
-        # Ambil semua user yang belum memulai lab
-        all_users = db_session.query(User.username).all()
-        all_users = [user[0] for user in all_users]
+        try:
+            page, per_page = get_page_args()
+        except ValueError:
+            return jsonify({"error": "page and per_page must be integers"}), 400
 
-        users_not_started = list(set(all_users) - set(users_started_lab))
+        # Ambil semua user yang belum memulai lab ini
+        query = users_not_started_query(lab_id=lab_id)
+        total = query.count()
+        users_not_started = [
+            username for (username,) in query.offset((page - 1) * per_page).limit(per_page)
+        ]
 
-        return jsonify({"users_not_started": users_not_started}), 200
+        return jsonify({
+            "users_not_started": users_not_started,
+            "page": page,
+            "per_page": per_page,
+            "total": total
+        }), 200
 
     except Exception as e:
-        print(f"Error in users-not-started-lab: {str(e)}")  # Debugging
+        log.exception("Error in users-not-started-lab: %s", e)
         return jsonify({"error": "Server error", "details": str(e)}), 500
 
 @app.route('/get-users-and-labs', methods=['GET'])
@@ -637,7 +861,7 @@ def get_users_and_labs():
         lab_list = [{"lab_id": lab.lab_id} for lab in labs]
 
         # Ambil semua user yang sudah memulai lab dari tabel grading_results
-        users_started_lab = db_session.query(GradingResult.username).distinct().all()
+        users_started_lab = db_session.query(BestResult.username).distinct().all()
         users_started_lab = [user[0] for user in users_started_lab]
 
         return jsonify({
@@ -646,26 +870,64 @@ def get_users_and_labs():
             "users_started_lab": users_started_lab
         }), 200
     except Exception as e:
-        print(f"Error fetching users and labs: {str(e)}")
+        log.exception("Error fetching users and labs: %s", e)
         return jsonify({"error": "Failed to fetch users and labs", "details": str(e)}), 500
 
+def encode_results_cursor(row):
+    return f"{row.timestamp.isoformat()}|{row.id}"
+
+def decode_results_cursor(cursor):
+    ts, _, result_id = cursor.rpartition("|")
+    return datetime.fromisoformat(ts), int(result_id)
+
+def approximate_results_count(query, cache_key):
+    """
+    Jumlah hasil untuk filter ini, di-cache RESULTS_COUNT_TTL detik per
+    worker; cukup untuk "Page X of Y" tanpa COUNT(*) tiap page view.
+    """
+    now = time.monotonic()
+    with _results_count_lock:
+        cached = _results_count_cache.get(cache_key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    total = query.order_by(None).count()
+    with _results_count_lock:
+        if len(_results_count_cache) > 1000:
+            _results_count_cache.clear()
+        _results_count_cache[cache_key] = (now + RESULTS_COUNT_TTL, total)
+    return total
+
 @app.route('/results', methods=['GET'])
 def show_results():
     try:
         class_name = request.args.get("class_name")
         lab_id = request.args.get("lab_id")
         search_name = request.args.get("search_name")
-        page = int(request.args.get("page", 1))
+        try:
+            page = max(int(request.args.get("page", 1)), 1)
+        except ValueError:
+            return jsonify({"error": "page must be an integer"}), 400
+        after = request.args.get("after")     # cursor halaman berikutnya (lebih lama)
+        before = request.args.get("before")   # cursor halaman sebelumnya (lebih baru)
         per_page = 10
 
-        # Ambil data dari tabel users dan labs
-        users = db_session.query(User).all()
-        labs = db_session.query(Lab).all()
-
-        # Ambil data dari tabel grading_results dengan filter
+        # Hanya kolom yang ditampilkan; nama & grup ikut dari join users
         query = (
-            db_session.query(GradingResult)
+            db_session.query(
+                GradingResult.id,
+                GradingResult.username,
+                User.name,
+                User.group_name,
+                GradingResult.class_name,
+                GradingResult.lab_id,
+                GradingResult.score,
+                GradingResult.timestamp,
+                Submission.duration,
+                Submission.status,
+            )
             .join(User, User.username == GradingResult.username)
+            .join(Submission, Submission.id == GradingResult.submission_id)
         )
 
         if class_name:
@@ -675,35 +937,62 @@ def show_results():
         if search_name:
             query = query.filter(User.name.ilike(f"%{search_name}%"))
 
-        total_results = query.count()
-        results = query.offset((page - 1) * per_page).limit(per_page).all()
+        total_results = approximate_results_count(query, (class_name, lab_id, search_name))
+
+        # Keyset pagination pada (timestamp, id), terbaru dulu
+        key = tuple_(GradingResult.timestamp, GradingResult.id)
+        if before:
+            rows = (
+                query.filter(key > tuple_(*decode_results_cursor(before)))
+                .order_by(GradingResult.timestamp.asc(), GradingResult.id.asc())
+                .limit(per_page + 1)
+                .all()
+            )
+            has_prev = len(rows) > per_page
+            rows = list(reversed(rows[:per_page]))
+            has_next = True
+        else:
+            ordered = query.order_by(GradingResult.timestamp.desc(), GradingResult.id.desc())
+            if after:
+                ordered = ordered.filter(key < tuple_(*decode_results_cursor(after)))
+            elif page > 1:
+                # Link lama tanpa cursor: fallback ke OFFSET
+                ordered = ordered.offset((page - 1) * per_page)
+            rows = ordered.limit(per_page + 1).all()
+            has_next = len(rows) > per_page
+            rows = rows[:per_page]
+            has_prev = page > 1
 
         from datetime import timedelta
-        for result in results:
-            if result.timestamp:
-                result.local_timestamp = result.timestamp + timedelta(hours=7)
+        results = []
+        for row in rows:
+            result = dict(row._mapping)
+            if row.timestamp:
+                result["local_timestamp"] = row.timestamp + timedelta(hours=7)
             else:
-                result.local_timestamp = '-'
+                result["local_timestamp"] = '-'
+            results.append(result)
 
         # Ambil user yang belum memulai lab dengan filter
-        users_started_lab = db_session.query(GradingResult.username).distinct().all()
-        users_started_lab = [user[0] for user in users_started_lab]
-        users_not_started_lab = [user.username for user in users if user.username not in users_started_lab]
+        users_not_started_lab = [
+            username for (username,) in
+            users_not_started_query(lab_id=lab_id, class_name=class_name).limit(NOT_STARTED_PAGE_SIZE)
+        ]
 
         return render_template(
             'results.html',
             results=results,
-            users=users,
-            labs=labs,
             users_not_started_lab=users_not_started_lab,
             class_name=class_name,
             lab_id=lab_id,
             search_name=search_name,
             page=page,
-            total_pages=(total_results + per_page - 1) // per_page
+            total_pages=max((total_results + per_page - 1) // per_page, page),
+            next_cursor=encode_results_cursor(rows[-1]) if has_next and rows else None,
+            prev_cursor=encode_results_cursor(rows[0]) if has_prev and rows else None
         )
     except Exception as e:
-        print("Error:", str(e))
+        log.exception("Error fetching results: %s", e)
         return jsonify({"error": "Failed to fetch results", "details": str(e)}), 500
 
 @app.route('/download-results', methods=['GET'])
@@ -713,81 +1002,93 @@ def download_results():
         lab_id = request.args.get("lab_id", "").strip()
         search_name = request.args.get("search_name", "").strip()  # TAMBAH INI
 
-        query = db_session.query(GradingResult)
+        # Hanya attempt terbaik per (username, class_name, lab_id), dari best_results;
+        # nama & kelompok di-join langsung di SQL
+        query = (
+            db_session.query(
+                GradingResult.username,
+                User.name,
+                GradingResult.class_name,
+                User.group_name,
+                GradingResult.lab_id,
+                GradingResult.score,
+                Submission.feedback,
+                GradingResult.timestamp,
+            )
+            .join(BestResult, BestResult.result_id == GradingResult.id)
+            .join(Submission, Submission.id == GradingResult.submission_id)
+            .outerjoin(User, User.username == GradingResult.username)
+        )
 
         # Filter berdasarkan class_name
         if class_name:
-            query = query.filter(GradingResult.class_name == class_name)
+            query = query.filter(BestResult.class_name == class_name)
 
         # Filter berdasarkan lab_id
         if lab_id:
-            query = query.filter(GradingResult.lab_id == lab_id)
+            query = query.filter(BestResult.lab_id == lab_id)
 
         # TAMBAH: Filter berdasarkan user name (search_name)
         if search_name:
-            # Join dengan User table untuk filter berdasarkan nama
-            query = query.join(User, GradingResult.username == User.username)
             query = query.filter(User.name == search_name)
 
-        results = query.order_by(
-            GradingResult.username.asc(),
-            GradingResult.lab_id.asc(),
-            GradingResult.score.desc()).all()
-
-        print(f"Number of results fetched: {len(results)}")
-
-        users = db_session.query(User).all()
-
-        best_results = {}
-        for result in results:
-            key = (result.username, result.class_name, result.lab_id)
-            if key not in best_results or result.score > best_results[key].score:
-                best_results[key] = result
-
-        final_results = list(best_results.values())
-
-        # Buat file CSV dalam memori
-        output = StringIO()
-        writer = csv.writer(output)
-
-        # Tulis header CSV
-        writer.writerow(['Username', 'Nama', 'Kelas', 'Kelompok', 'Lab ID', 'Score', 'Feedback', 'Timestamp'])
-
-        # Tulis data ke CSV
-        for result in final_results:
-            user = next((u for u in users if u.username == result.username), None)
-            writer.writerow([
-                result.username,
-                user.name if user else '',
-                result.class_name,
-                user.group_name if user else '',
-                result.lab_id,
-                result.score,
-                result.feedback,
-                result.timestamp.strftime('%Y-%m-%d %H:%M:%S')
-            ])
+        query = query.order_by(
+            BestResult.username.asc(),
+            BestResult.lab_id.asc())
+
+        # Eksekusi di sini supaya error query masih bisa dibalas 500;
+        # baris diambil per batch dari cursor selama response di-stream
+        rows = iter(query.yield_per(EXPORT_BATCH_SIZE))
+
+        def generate():
+            output = StringIO()
+            writer = csv.writer(output)
+
+            # Tulis header CSV
+            writer.writerow(['Username', 'Nama', 'Kelas', 'Kelompok', 'Lab ID', 'Score', 'Feedback', 'Timestamp'])
+
+            count = 0
+            for row in rows:
+                writer.writerow([
+                    row.username,
+                    row.name or '',
+                    row.class_name,
+                    row.group_name or '',
+                    row.lab_id,
+                    row.score,
+                    row.feedback,
+                    row.timestamp.strftime('%Y-%m-%d %H:%M:%S') if row.timestamp else ''
+                ])
+                count += 1
+
+                # Kirim per beberapa baris, jangan tampung seluruh file di memori
+                if count % EXPORT_BATCH_SIZE == 0:
+                    yield output.getvalue()
+                    output.seek(0)
+                    output.truncate(0)
+
+            yield output.getvalue()
+            log.info("Results exported", extra={"rows": count, "class_name": class_name, "lab_id": lab_id})
 
         # Siapkan respons untuk mengunduh file CSV
-        output.seek(0)
-        response = make_response(output.getvalue())
+        response = Response(stream_with_context(generate()), mimetype='text/csv')
         response.headers['Content-Disposition'] = 'attachment; filename=grading_results.csv'
-        response.headers['Content-type'] = 'text/csv'
 
         return response
 
     except Exception as e:
-        print(f"Error generating CSV: {str(e)}")
+        log.exception("Error generating CSV: %s", e)
         return jsonify({"error": "Failed to generate CSV", "details": str(e)}), 500
 
 @app.route('/get-filters', methods=['GET'])
 def get_filters():
     try:
         # Ambil daftar class_name yang unik
-        class_names = db_session.query(GradingResult.class_name).distinct().all()
+        class_names = db_session.query(BestResult.class_name).distinct().all()
         class_names = [name[0] for name in class_names]
 
         # Ambil daftar lab_id yang unik
-        lab_ids = db_session.query(GradingResult.lab_id).distinct().all()
+        lab_ids = db_session.query(BestResult.lab_id).distinct().all()
         lab_ids = [lab_id[0] for lab_id in lab_ids]
 
         return jsonify({
@@ -795,9 +1096,59 @@ def get_filters():
             "lab_ids": lab_ids
         }), 200
     except Exception as e:
-        print(f"Error fetching filters: {str(e)}")
+        log.exception("Error fetching filters: %s", e)
         return jsonify({"error": "Failed to fetch filters", "details": str(e)}), 500
 
+@app.route('/criterion-stats', methods=['GET'])
+def criterion_stats():
+    """
+    Pass rate per kriteria per (lab, kelas), dihitung dengan GROUP BY di SQL.
+    Filter opsional: lab_id, class_name.
+    """
+    try:
+        lab_id = request.args.get("lab_id")
+        class_name = request.args.get("class_name")
+
+        query = db_session.query(
+            CriterionResult.lab_id,
+            CriterionResult.class_name,
+            CriterionResult.criterion_index,
+            func.count().label("attempts"),
+            func.sum(case((CriterionResult.passed, 1), else_=0)).label("passed"),
+        )
+        if lab_id:
+            query = query.filter(CriterionResult.lab_id == lab_id)
+        if class_name:
+            query = query.filter(CriterionResult.class_name == class_name)
+        rows = (
+            query.group_by(CriterionResult.lab_id, CriterionResult.class_name, CriterionResult.criterion_index)
+            .order_by(CriterionResult.lab_id, CriterionResult.class_name, CriterionResult.criterion_index)
+            .all()
+        )
+
+        stats = []
+        for row in rows:
+            # Deskripsi diambil dari scheme saat ini (index = urutan kriteria)
+            scheme = schemes_registry.get(row.lab_id) or {}
+            criteria = scheme.get("criteria", [])
+            criterion = criteria[row.criterion_index] if row.criterion_index < len(criteria) else {}
+            stats.append({
+                "lab_id": row.lab_id,
+                "class_name": row.class_name,
+                "criterion_index": row.criterion_index,
+                "type": criterion.get("type"),
+                "description": criterion.get("description"),
+                "attempts": row.attempts,
+                "passed": row.passed,
+                "failed": row.attempts - row.passed,
+                "pass_rate": round(row.passed / row.attempts, 4) if row.attempts else None,
+            })
+
+        return jsonify({"criteria": stats}), 200
+    except Exception as e:
+        log.exception("Error fetching criterion stats: %s", e)
+        return jsonify({"error": "Failed to fetch criterion stats", "details": str(e)}), 500
+
 @app.route('/delete-result', methods=['POST'])
 def delete_result():
     try:
@@ -813,14 +1164,23 @@ def delete_result():
         if not result:
             return jsonify({"error": "Result not found"}), 404
 
-        # Hapus data dari database
+        # Hapus data dari database, lalu hitung ulang attempt terbaiknya;
+        # submission ikut dihapus kalau sudah tidak punya anggota
         db_session.delete(result)
+        db_session.flush()
+        remaining = db_session.query(GradingResult.id).filter(
+            GradingResult.submission_id == result.submission_id).first()
+        if remaining is None:
+            db_session.query(CriterionResult).filter(
+                CriterionResult.submission_id == result.submission_id).delete()
+            db_session.query(Submission).filter(Submission.id == result.submission_id).delete()
+        best_results.recompute(db_session, result.username, result.class_name, result.lab_id)
         db_session.commit()
 
         return jsonify({"message": f"Result with ID {result_id} deleted successfully"}), 200
 
     except Exception as e:
-        print(f"Error deleting result: {str(e)}")  # Debugging
+        log.exception("Error deleting result: %s", e)
         db_session.rollback()
         return jsonify({"error": "Failed to delete result", "details": str(e)}), 500
 
@@ -830,7 +1190,7 @@ def scheme_editor():
         # Render file scheme_editor.html
         return render_template('scheme_editor.html')
     except Exception as e:
-        print(f"Error rendering scheme editor: {str(e)}")  # Debugging
+        log.exception("Error rendering scheme editor: %s", e)
         return jsonify({"error": "Failed to load scheme editor", "details": str(e)}), 500
 
 @app.route('/create_scheme', methods=['GET', 'POST'])
@@ -882,10 +1242,13 @@ def create_scheme():
             "criteria": criteria
         }
 
+        try:
+            grading_engine.compile_scheme(lab_id, scheme)  # tolak scheme yang tidak bisa dinilai
+        except ValueError as e:
+            return jsonify({"error": "Invalid scheme", "details": str(e)}), 400
+
         # Simpan skema ke file
-        scheme_file = os.path.join(SCHEME_PATH, f"{lab_id}.json")
-        with open(scheme_file, 'w') as f:
-            json.dump(scheme, f, indent=4)
+        scheme_file = schemes_registry.write(lab_id, scheme)
 
         # Tambahkan lab ke database jika belum ada
         existing_lab = db_session.query(Lab).filter(Lab.lab_id == lab_id).first()
@@ -897,7 +1260,7 @@ def create_scheme():
         return jsonify({"message": f"Scheme '{lab_id}' created successfully"}), 200
 
     except Exception as e:
-        print(f"Error creating scheme: {str(e)}")  # Debugging
+        log.exception("Error creating scheme: %s", e)
         db_session.rollback()
         return jsonify({"error": "Failed to create scheme", "details": str(e)}), 500
 
@@ -929,10 +1292,13 @@ def edit_scheme():
             "criteria": criteria
         }
 
+        try:
+            grading_engine.compile_scheme(lab_id, scheme)  # tolak scheme yang tidak bisa dinilai
+        except ValueError as e:
+            return jsonify({"error": "Invalid scheme", "details": str(e)}), 400
+
         # Simpan skema ke file
-        scheme_file = os.path.join(SCHEME_PATH, f"{lab_id}.json")
-        with open(scheme_file, 'w') as f:
-            json.dump(scheme, f, indent=4)
+        scheme_file = schemes_registry.write(lab_id, scheme)
 
         # Tambahkan lab ke database jika belum ada
         existing_lab = db_session.query(Lab).filter(Lab.lab_id == lab_id).first()
@@ -941,22 +1307,23 @@ def edit_scheme():
             db_session.add(new_lab)
             db_session.commit()
 
-        return jsonify({"message": f"Scheme '{lab_id}' updated successfully"}), 200
+        response = {"message": f"Scheme '{lab_id}' updated successfully"}
+        # Opsional: nilai ulang attempt yang sudah ada dengan scheme baru
+        if data.get("regrade"):
+            response["regrade_job_id"] = regrade.submit(lab_id, scheme)
+        return jsonify(response), 200
 
     except Exception as e:
-        print(f"Error editing scheme: {str(e)}")  # Debugging
+        log.exception("Error editing scheme: %s", e)
         db_session.rollback()
         return jsonify({"error": "Failed to edit scheme", "details": str(e)}), 500
 
 @app.route('/edit_scheme/<lab_id>', methods=['GET'])
 def edit_scheme_page(lab_id):
-    scheme_file = os.path.join(SCHEME_PATH, f"{lab_id}.json")
-    if not os.path.exists(scheme_file):
+    scheme = schemes_registry.get(lab_id)
+    if scheme is None:
         return "Scheme not found", 404
 
-    with open(scheme_file, "r") as f:
-        scheme = json.load(f)
-
     types = ["command", "file_exists", "file_content", "service", "directory", "config_check", "package", "user", "group", "gitlab_pipeline", "gitlab_project", "gitlab_runner", "image"]
 
     expected = {
@@ -987,15 +1354,20 @@ def edit_scheme_post(lab_id):
             "lab_id": lab_id,
             "criteria": criteria
         }
-        scheme_file = os.path.join(SCHEME_PATH, f"{lab_id}.json")
-        with open(scheme_file, 'w') as f:
-            json.dump(scheme, f, indent=4)
+        try:
+            grading_engine.compile_scheme(lab_id, scheme)  # tolak scheme yang tidak bisa dinilai
+        except ValueError as e:
+            return jsonify({"error": "Invalid scheme", "details": str(e)}), 400
+        scheme_file = schemes_registry.write(lab_id, scheme)
         # --- Update database jika perlu ---
         existing_lab = db_session.query(Lab).filter(Lab.lab_id == lab_id).first()
         if existing_lab:
             existing_lab.scheme_path = scheme_file
             db_session.commit()
-        return jsonify({"message": f"Scheme '{lab_id}' updated successfully"})
+        response = {"message": f"Scheme '{lab_id}' updated successfully"}
+        if data.get("regrade"):
+            response["regrade_job_id"] = regrade.submit(lab_id, scheme)
+        return jsonify(response)
     except Exception as e:
         db_session.rollback()
         return jsonify({"error": "Failed to edit scheme", "details": str(e)}), 500
@@ -1009,13 +1381,12 @@ def delete_scheme():
             return jsonify({"error": "Invalid request data"}), 400
 
         lab_id = data.get("lab_id")
-        scheme_file = os.path.join(SCHEME_PATH, f"{lab_id}.json")
 
-        if not os.path.exists(scheme_file):
+        if not os.path.exists(schemes_registry.path_for(lab_id)):
             return jsonify({"error": f"Scheme '{lab_id}' not found"}), 404
 
         # Hapus file skema
-        os.remove(scheme_file)
+        schemes_registry.delete(lab_id)
 
         # Hapus lab dari database
         lab = db_session.query(Lab).filter(Lab.lab_id == lab_id).first()
@@ -1026,7 +1397,7 @@ def delete_scheme():
         return jsonify({"message": f"Scheme '{lab_id}' deleted successfully"}), 200
 
     except Exception as e:
-        print(f"Error deleting scheme: {str(e)}")  # Debugging
+        log.exception("Error deleting scheme: %s", e)
         db_session.rollback()
         return jsonify({"error": "Failed to delete scheme", "details": str(e)}), 500
 
@@ -1034,25 +1405,22 @@ def delete_scheme():
 def list_schemes():
     try:
         schemes = []
-        for filename in os.listdir(SCHEME_PATH):
-            if filename.endswith(".json"):
-                scheme_file = os.path.join(SCHEME_PATH, filename)
-                with open(scheme_file, 'r') as f:
-                    scheme = json.load(f)
-                    schemes.append(scheme)
-
-                    # Tambahkan lab ke database jika belum ada
-                    lab_id = scheme.get("lab_id")
-                    existing_lab = db_session.query(Lab).filter(Lab.lab_id == lab_id).first()
-                    if not existing_lab:
-                        new_lab = Lab(lab_id=lab_id, scheme_path=scheme_file)
-                        db_session.add(new_lab)
-                        db_session.commit()
+        existing = {lab_id for (lab_id,) in db_session.query(Lab.lab_id).all()}
+        for file_lab_id, scheme in schemes_registry.all():
+            schemes.append(scheme)
+
+            # Tambahkan lab ke database jika belum ada
+            lab_id = scheme.get("lab_id")
+            if lab_id not in existing:
+                new_lab = Lab(lab_id=lab_id, scheme_path=schemes_registry.path_for(file_lab_id))
+                db_session.add(new_lab)
+                db_session.commit()
+                existing.add(lab_id)
 
         return jsonify({"schemes": schemes}), 200
 
     except Exception as e:
-        print(f"Error listing schemes: {str(e)}")  # Debugging
+        log.exception("Error listing schemes: %s", e)
         db_session.rollback()
         return jsonify({"error": "Failed to list schemes", "details": str(e)}), 500
 
@@ -1061,15 +1429,12 @@ def home():
     order_by = request.args.get('order_by', 'name_asc')
 
     schemes = []
-    for filename in os.listdir(SCHEME_PATH):
-        if filename.endswith(".json"):
-            scheme_file = os.path.join(SCHEME_PATH, filename)
-            with open(scheme_file, 'r') as f:
-                scheme = json.load(f)
-
-            # kalau lab_id nggak ada di file, ambil dari nama file
-            scheme.setdefault('lab_id', filename.replace('.json', ''))
-            schemes.append(scheme)
+    for file_lab_id, scheme in schemes_registry.all():
+        # kalau lab_id nggak ada di file, ambil dari nama file
+        # (copy dangkal, objek di registry tidak boleh diubah)
+        scheme = dict(scheme)
+        scheme.setdefault('lab_id', file_lab_id)
+        schemes.append(scheme)
 
     if order_by == 'name_asc':
         schemes.sort(key=lambda s: s.get('lab_id', '').lower())
@@ -1101,42 +1466,133 @@ def add_scheme():
 
 @app.route('/get-log', methods=['GET'])
 def get_log():
+    """
+    Log grading milik user ini untuk lab_id.
+    Tanpa parameter: seluruh isi log (perilaku lama).
+    ?offset=N   hanya isi baru setelah byte N; pakai "offset" dari respons
+                sebelumnya untuk poll berikutnya
+    ?tail=N     N baris terakhir
+    ?follow=1   Server-Sent Events, kirim baris baru begitu ditulis
+    """
     token = request.headers.get("Authorization", "").replace("Bearer ", "")
     lab_id = request.args.get("lab_id")
-    # Validasi token/lab jika perlu, misal: cek user, cek status lab
-    log_path = f"/var/log/gradingctl/labs/{lab_id}.log"
+    # Log per (lab, user); username diambil dari token seperti di grade_lab
+    parts = token.split("-")
+    if not lab_id or len(parts) < 3:
+        return jsonify({"error": "lab_id and a valid token are required"}), 400
+    username = parts[2]
+
+    try:
+        offset = int(request.args.get("offset", 0))
+        tail_lines = request.args.get("tail")
+        tail_lines = int(tail_lines) if tail_lines is not None else None
+    except ValueError:
+        return jsonify({"error": "offset and tail must be integers"}), 400
+    if offset < 0 or (tail_lines is not None and tail_lines < 0):
+        return jsonify({"error": "offset and tail must not be negative"}), 400
+
+    if request.args.get("follow") in ("1", "true"):
+        # EventSource mengirim Last-Event-ID (= offset) saat reconnect
+        last_event_id = request.headers.get("Last-Event-ID", "")
+        if last_event_id.isdigit():
+            offset, tail_lines = int(last_event_id), None
+        return Response(
+            stream_with_context(follow_log(lab_id, username, offset, tail_lines)),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
     try:
-        with open(log_path, "r") as f:
-            content = f.read()
-        return jsonify({"content": content}), 200
+        if tail_lines is not None:
+            chunk = lab_logs.tail(lab_id, username, tail_lines)
+        else:
+            chunk = lab_logs.read(lab_id, username, offset, LOG_READ_MAX_BYTES if offset else None)
+        if chunk is None:
+            return jsonify({"error": "Log not found"}), 404
+        return jsonify(chunk), 200
     except Exception as e:
-        return jsonify({"error": f"Log not found: {str(e)}"}), 404
+        log.exception("Error in get-log: %s", e)
+        return jsonify({"error": "Server error", "details": str(e)}), 500
+
+def follow_log(lab_id, username, offset, tail_lines):
+    """
+    Generator SSE untuk /get-log?follow=1. Ukuran file di-poll tiap
+    LOG_FOLLOW_INTERVAL detik (worker lain juga bisa menulis log ini);
+    stream ditutup setelah LOG_FOLLOW_MAX_SECONDS dan client reconnect
+    dengan Last-Event-ID.
+    """
+    def event(chunk):
+        lines = chunk["content"].splitlines()
+        return f"id: {chunk['offset']}\n" + "".join(f"data: {line}\n" for line in lines) + "\n"
+
+    yield f"retry: {int(LOG_FOLLOW_INTERVAL * 1000)}\n\n"
+    if tail_lines is not None:
+        chunk = lab_logs.tail(lab_id, username, tail_lines)
+        if chunk is not None:
+            offset = chunk["offset"]
+            if chunk["content"]:
+                yield event(chunk)
+
+    deadline = time.monotonic() + LOG_FOLLOW_MAX_SECONDS
+    last_sent = time.monotonic()
+    while time.monotonic() < deadline:
+        chunk = lab_logs.read(lab_id, username, offset, LOG_READ_MAX_BYTES)
+        if chunk is not None and chunk["content"]:
+            offset = chunk["offset"]
+            last_sent = time.monotonic()
+            yield event(chunk)
+            continue
+        if chunk is not None:
+            offset = chunk["offset"]
+        if time.monotonic() - last_sent >= 15:
+            # Komentar SSE sebagai keep-alive untuk proxy
+            last_sent = time.monotonic()
+            yield ": keep-alive\n\n"
+        time.sleep(LOG_FOLLOW_INTERVAL)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    # Format teks Prometheus; dijumlahkan dari semua worker kalau PROMETHEUS_MULTIPROC_DIR diset
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+@app.route('/db-stats', methods=['GET'])
+def worker_db_stats():
+    # Counter statement lambat dan error "database is locked" SQLite hanya
+    # untuk worker yang melayani request ini; total semua worker ada di
+    # /metrics (grading_db_*_total)
+    return jsonify(get_worker_db_stats()), 200
 
 @app.route("/webhook/gitlab", methods=["POST"])
 def gitlab_webhook():
     # 1. Validasi secret token
-    if request.headers.get("X-Gitlab-Token") != GITLAB_SECRET:
+    token = request.headers.get("X-Gitlab-Token", "")
+    if not GITLAB_SECRET or not hmac.compare_digest(token, GITLAB_SECRET):
         return jsonify({"error": "Unauthorized"}), 403
 
-    data = request.json
-
-    # 2. Ambil data penting
-    project_id = data["project"]["id"]
-    pipeline = data["object_attributes"]
+    data = request.json or {}
+    kind = data.get("object_kind")
 
-    pipeline_id = pipeline["id"]
-    status = pipeline["status"]
-    ref = pipeline["ref"]
-    sha = pipeline["sha"]
-
-    # 3. Simpan status (cache / DB)
-    ACTIVE_PIPELINES[(project_id, ref)] = {
-        "pipeline_id": pipeline_id,
-        "status": status,
-        "sha": sha
-    }
+    # 2. Simpan status ke pipeline_store (tabel bersama antar worker)
+    try:
+        if kind == "pipeline":
+            pipeline_store.record_pipeline_event(data)
+            return jsonify({"message": "Pipeline recorded"}), 200
+        elif kind == "build":
+            pipeline_store.record_job_event(data)
+            return jsonify({"message": "Job recorded"}), 200
+        elif data.get("event_name") in PROJECT_EVENTS:
+            # System hook: path -> project_id berubah, jangan tunggu TTL cache
+            for path in {data.get("path_with_namespace"), data.get("old_path_with_namespace")} - {None}:
+                project_cache.invalidate(path)
+            return jsonify({"message": "Project cache invalidated"}), 200
+    except KeyError as e:
+        return jsonify({"error": "Invalid webhook payload", "details": f"missing {e}"}), 400
+    except Exception as e:
+        log.exception("Error in gitlab_webhook: %s", e)
+        return jsonify({"error": "Server error", "details": str(e)}), 500
 
-    return jsonify({"message": "Pipeline recorded"}), 200
+    return jsonify({"message": f"Event '{kind}' ignored"}), 200
 
 
 if __name__ == "__main__":
@@ -0,0 +1,118 @@
+from sqlalchemy import case, delete, select, func, literal, text
+from sqlalchemy.dialects.sqlite import insert
+
+from .models import BestResult, GradingResult
+
+_table = BestResult.__table__
+
+
+def record(session, submission_ids):
+    """
+    Perbarui best_results untuk semua anggota submission baru (satu atau
+    satu batch), dalam satu statement INSERT ... SELECT dari grading_results.
+    Dipanggil sebelum commit, jadi ikut transaksi yang sama.
+    Kalau score sama, attempt yang lebih dulu tetap dipakai (baris diproses
+    urut id, jadi ini juga berlaku di dalam satu batch).
+    """
+    members = GradingResult.__table__
+    stmt = insert(_table).from_select(
+        ["username", "class_name", "lab_id", "result_id", "score", "timestamp", "attempts"],
+        select(
+            members.c.username,
+            members.c.class_name,
+            members.c.lab_id,
+            members.c.id,
+            members.c.score,
+            members.c.timestamp,
+            literal(1),
+        )
+        .where(members.c.submission_id.in_(submission_ids))  # WHERE wajib sebelum ON CONFLICT di SQLite
+        .order_by(members.c.id),
+    )
+    better = stmt.excluded.score > _table.c.score
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[_table.c.username, _table.c.class_name, _table.c.lab_id],
+        set_={
+            "result_id": case((better, stmt.excluded.result_id), else_=_table.c.result_id),
+            "timestamp": case((better, stmt.excluded.timestamp), else_=_table.c.timestamp),
+            "score": case((better, stmt.excluded.score), else_=_table.c.score),
+            "attempts": _table.c.attempts + 1,
+        },
+    ))
+
+
+def recompute(session, username, class_name, lab_id):
+    """
+    Hitung ulang best_results satu (username, class_name, lab_id) dari
+    grading_results, mis. setelah attempt dihapus.
+    """
+    key = (
+        (GradingResult.username == username)
+        & (GradingResult.class_name == class_name)
+        & (GradingResult.lab_id == lab_id)
+    )
+    session.execute(
+        delete(_table).where(
+            _table.c.username == username,
+            _table.c.class_name == class_name,
+            _table.c.lab_id == lab_id,
+        )
+    )
+
+    best = session.execute(
+        select(GradingResult.id, GradingResult.score, GradingResult.timestamp)
+        .where(key)
+        .order_by(GradingResult.score.desc(), GradingResult.id.asc())
+        .limit(1)
+    ).first()
+    if best is None:
+        return
+
+    attempts = session.execute(select(func.count()).select_from(GradingResult).where(key)).scalar()
+    session.execute(insert(_table).values(
+        username=username,
+        class_name=class_name,
+        lab_id=lab_id,
+        result_id=best.id,
+        score=best.score,
+        timestamp=best.timestamp,
+        attempts=attempts,
+    ))
+
+
+# Backfill dari grading_results (dipakai migrations.py)
+BACKFILL_SQL = """
+INSERT INTO best_results (username, class_name, lab_id, result_id, score, timestamp, attempts)
+SELECT username, class_name, lab_id, id, score, timestamp, attempts
+FROM (
+    SELECT id, username, class_name, lab_id, score, timestamp,
+           ROW_NUMBER() OVER (PARTITION BY username, class_name, lab_id ORDER BY score DESC, id ASC) AS rn,
+           COUNT(*) OVER (PARTITION BY username, class_name, lab_id) AS attempts
+    FROM grading_results
+)
+WHERE rn = 1
+"""
+
+# Sama dengan BACKFILL_SQL tapi hanya satu lab (dipakai regrade.py)
+LAB_BACKFILL_SQL = """
+INSERT INTO best_results (username, class_name, lab_id, result_id, score, timestamp, attempts)
+SELECT username, class_name, lab_id, id, score, timestamp, attempts
+FROM (
+    SELECT id, username, class_name, lab_id, score, timestamp,
+           ROW_NUMBER() OVER (PARTITION BY username, class_name ORDER BY score DESC, id ASC) AS rn,
+           COUNT(*) OVER (PARTITION BY username, class_name) AS attempts
+    FROM grading_results
+    WHERE lab_id = :lab_id
+)
+WHERE rn = 1
+"""
+
+
+def rebuild_lab(conn, lab_id):
+    """
+    Bangun ulang best_results satu lab dari grading_results, mis. setelah
+    semua score lab itu diganti. conn boleh Connection atau Session;
+    ikut transaksi pemanggil.
+    """
+    conn.execute(delete(_table).where(_table.c.lab_id == lab_id))
+    conn.execute(text(LAB_BACKFILL_SQL), {"lab_id": lab_id})
@@ -1,15 +1,131 @@
-from sqlalchemy import create_engine, MetaData
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, MetaData, event
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import scoped_session, sessionmaker
 
+from .logging_setup import get_logger
+
+log = get_logger(__name__)
+
 # Konfigurasi database
-DATABASE_URI = 'sqlite:////opt/grading/db.sqlite'
-engine = create_engine(DATABASE_URI)
+DATABASE_URI = os.getenv("DATABASE_URI", 'sqlite:////opt/grading/db.sqlite')
+
+# Tuning SQLite untuk beberapa worker gunicorn yang menulis bersamaan:
+# WAL supaya pembaca tidak memblokir penulis, busy_timeout supaya penulis
+# menunggu lock alih-alih langsung gagal "database is locked"
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+SQLITE_SLOW_MS = float(os.getenv("SQLITE_SLOW_MS", "100"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+IS_SQLITE = DATABASE_URI.startswith("sqlite")
+
+if IS_SQLITE:
+    engine = create_engine(
+        DATABASE_URI,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=False,
+        connect_args={
+            # detik; dipakai sqlite3 sebagai busy handler
+            "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+            # koneksi dipakai juga dari thread pool (gitlab-check, dll.)
+            "check_same_thread": False,
+        },
+    )
+else:
+    engine = create_engine(DATABASE_URI, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
 metadata = MetaData()
 
 # Session factory
 db_session = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
 
+# Counter statement lambat & error lock milik proses worker ini saja (hilang
+# saat worker restart). Total semua worker ada di /metrics: metrics.py
+# mendaftarkan hook di stats_hooks dan meneruskannya ke Counter Prometheus
+_stats_lock = threading.Lock()
+stats_hooks = []  # fn(**deltas), dipanggil setiap counter bertambah
+worker_db_stats = {
+    "statements": 0,
+    # Statement > SQLITE_SLOW_MS. Waktu tunggu busy_timeout ikut terhitung di
+    # sini, tapi sqlite3 tidak memisahkannya dari waktu eksekusi query
+    "slow_statements": 0,
+    "slow_statement_seconds": 0.0,  # total waktu statement lambat
+    "locked_errors": 0,        # "database is locked" setelah busy_timeout habis
+    "errors": 0,
+}
+
+
+def _bump(**deltas):
+    with _stats_lock:
+        for key, value in deltas.items():
+            worker_db_stats[key] += value
+    for hook in stats_hooks:
+        hook(**deltas)
+
+
+def get_worker_db_stats():
+    with _stats_lock:
+        stats = dict(worker_db_stats)
+    stats["scope"] = "worker"
+    stats["pid"] = os.getpid()
+    stats["pool"] = engine.pool.status()
+    return stats
+
+
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_conn, connection_record):
+        cur = dbapi_conn.cursor()
+        cur.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cur.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.close()
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    if elapsed * 1000 >= SQLITE_SLOW_MS:
+        _bump(statements=1, slow_statements=1, slow_statement_seconds=elapsed)
+    else:
+        _bump(statements=1)
+
+
+@event.listens_for(engine, "handle_error")
+def _handle_error(context):
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+    if "database is locked" in str(context.original_exception):
+        _bump(errors=1, locked_errors=1)
+    else:
+        _bump(errors=1)
+
+
 def init_db():
-    import models  # Pastikan ada file models.py
-    models.Base.metadata.create_all(bind=engine)
-    print("Database initialized successfully")  # Debugging
+    from . import models
+    try:
+        models.Base.metadata.create_all(bind=engine)
+    except OperationalError:
+        # Worker gunicorn lain bisa membuat tabel yang sama bersamaan;
+        # cukup ulangi sekali, create_all melewati tabel yang sudah ada
+        models.Base.metadata.create_all(bind=engine)
+
+    # Index/kolom baru untuk database yang sudah ada
+    from .migrations import upgrade
+    upgrade(engine)
+    log.info("Database initialized")
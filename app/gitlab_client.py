@@ -0,0 +1,135 @@
+import os
+import random
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+
+
+class GitLabClient:
+    """
+    Client GitLab API dengan connection pool keep-alive.
+
+    Satu instance per proses worker (lihat get_client()), jadi koneksi
+    TCP+TLS ke GitLab dipakai ulang antar request. Jumlah request paralel
+    ke satu host dibatasi semaphore, dan respons 429/5xx di-retry dengan
+    backoff eksponensial + jitter. Retry-After dari GitLab diikuti sampai
+    retry_after_max detik; kalau lebih lama, respons langsung dikembalikan
+    supaya worker tidak tertahan menunggu.
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, base_url=None, token=None, pool_size=None,
+                 max_concurrency=None, max_retries=None, backoff=None,
+                 timeout=None, retry_after_max=None):
+        self.base_url = (base_url if base_url is not None else os.getenv("GITLAB_URL") or "").rstrip("/")
+        self.token = token if token is not None else os.getenv("GITLAB_TOKEN")
+        self.pool_size = pool_size or int(os.getenv("GITLAB_POOL_SIZE", "10"))
+        self.max_concurrency = max_concurrency or int(os.getenv("GITLAB_MAX_CONCURRENCY", "8"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("GITLAB_MAX_RETRIES", "2"))
+        self.backoff = backoff if backoff is not None else float(os.getenv("GITLAB_RETRY_BACKOFF", "0.5"))
+        self.timeout = timeout or float(os.getenv("GITLAB_TIMEOUT", "10"))
+        self.retry_after_max = (
+            retry_after_max if retry_after_max is not None else float(os.getenv("GITLAB_RETRY_AFTER_MAX", "5"))
+        )
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if self.token:
+            self.session.headers["PRIVATE-TOKEN"] = self.token
+
+        self._host_slots = {}
+        self._host_slots_lock = threading.Lock()
+
+    @property
+    def configured(self):
+        return bool(self.base_url and self.token)
+
+    def api_url(self, path):
+        return f"{self.base_url}/api/v4/{path.lstrip('/')}"
+
+    @staticmethod
+    def project_path(path_with_namespace):
+        """
+        Path endpoint project dari path_with_namespace (di-URL-encode).
+        """
+        return f"projects/{urllib.parse.quote(str(path_with_namespace), safe='')}"
+
+    def _slot(self, url):
+        host = urllib.parse.urlsplit(url).netloc
+        with self._host_slots_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.max_concurrency)
+                self._host_slots[host] = slot
+        return slot
+
+    def _retry_delay(self, attempt, response):
+        """
+        Detik sebelum retry, atau None kalau Retry-After melebihi
+        retry_after_max (jangan retry).
+        """
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+            return delay if delay <= self.retry_after_max else None
+        # Full jitter: 0..backoff*2^attempt, supaya worker tidak retry serempak
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    def get(self, path, params=None, timeout=None, retry_statuses=None):
+        """
+        GET ke GitLab API. Return requests.Response terakhir (setelah retry
+        habis, respons 429/5xx tetap dikembalikan ke pemanggil).
+        Exception jaringan diteruskan ke pemanggil.
+        """
+        url = self.api_url(path)
+        if retry_statuses is None:
+            retry_statuses = self.RETRY_STATUSES
+
+        slot = self._slot(url)
+        attempt = 0
+        while True:
+            with slot:
+                start = time.perf_counter()
+                try:
+                    r = self.session.get(url, params=params, timeout=timeout or self.timeout)
+                except requests.RequestException:
+                    metrics.observe_gitlab(path, "error", time.perf_counter() - start)
+                    raise
+                metrics.observe_gitlab(path, r.status_code, time.perf_counter() - start)
+
+            if r.status_code not in retry_statuses or attempt >= self.max_retries:
+                return r
+
+            delay = self._retry_delay(attempt, r)
+            if delay is None:
+                return r
+            time.sleep(delay)
+            attempt += 1
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Client bersama untuk proses ini. Dibuat ulang setelah fork supaya
+    worker gunicorn tidak berbagi socket dengan master.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = GitLabClient()
+                _client_pid = pid
+    return _client
@@ -0,0 +1,322 @@
+"""
+Engine penilaian: registry evaluator per tipe kriteria + compile scheme
+menjadi plan yang siap dijalankan.
+
+Compile dilakukan sekali per objek scheme (SchemeRegistry mengembalikan
+objek yang sama sampai file-nya berubah). Semua yang bisa ditentukan dari
+scheme saja (evaluator, nilai expected yang sudah dinormalisasi, aturan
+pipeline) di-resolve saat compile, jadi per submission tinggal loop datar
+memanggil callable yang sudah jadi.
+"""
+import hashlib
+import json
+import threading
+import time
+
+from . import metrics
+from .utils import (
+    check_gitlab_project,
+    get_gitlab_project_id,
+    check_gitlab_pipeline,
+    check_gitlab_pipeline_success_count,
+    check_gitlab_runner,
+)
+
+# type -> (factory, remote). factory(criterion) -> fn(client_data) -> (passed, actual_value).
+# remote=True: butuh panggilan jaringan (GitLab), dijalankan paralel di executor
+EVALUATORS = {}
+
+CRITERION_MESSAGE_MAX = 200  # panjang maksimal pesan error per kriteria yang disimpan
+
+# Penalty waktu (min 80, hanya kalau nilai > 0)
+PENALTY_MAX_DURATION = 180   # 3 menit (detik)
+PENALTY_PERCENT = 5
+PENALTY_MIN_SCORE = 80
+
+
+def evaluator(*types, remote=False):
+    """
+    Daftarkan factory evaluator untuk satu atau beberapa tipe kriteria.
+    """
+    def register(factory):
+        for ctype in types:
+            EVALUATORS[ctype] = (factory, remote)
+        return factory
+    return register
+
+
+@evaluator("command")
+def _command(criterion):
+    key, expected = criterion.get("key"), str(criterion.get("expected"))
+    return lambda data: (str(data.get(key)) == expected, data.get(key))
+
+
+@evaluator("file_exists", "service", "directory", "package", "user", "group", "image")
+def _equals(criterion):
+    # expected bukan string tidak pernah cocok (sama seperti perilaku lama)
+    key, expected = criterion.get("key"), criterion.get("expected")
+    return lambda data: (str(data.get(key)) == expected, data.get(key))
+
+
+@evaluator("file_content")
+def _file_content(criterion):
+    key, contains = criterion.get("key"), criterion.get("contains")
+    if not contains:
+        return lambda data: (False, data.get(key))
+    return lambda data: (contains in str(data.get(key)), data.get(key))
+
+
+@evaluator("config_check")
+def _config_check(criterion):
+    key = criterion.get("key")
+    if not criterion.get("expected"):
+        return lambda data: (False, data.get(key))
+    return lambda data: (str(data.get(key)) == "correct", data.get(key))
+
+
+@evaluator("gitlab_project", remote=True)
+def _gitlab_project(criterion):
+    # key berisi path_with_namespace, contoh:
+    # kelompokx-sijax/build-image-kelompokx-sijax
+    key = criterion.get("key")
+    return lambda data: check_gitlab_project(key)  # msg biar kebaca di log
+
+
+@evaluator("gitlab_pipeline", remote=True)
+def _gitlab_pipeline(criterion):
+    """
+    Default: job build-image di pipeline terbaru sukses.
+    Dengan "success_stages" (list) + "min_success" (int) di scheme: minimal
+    sekian job sukses di stage-stage itu.
+    """
+    key = criterion.get("key")
+    ref = criterion.get("ref", "main")
+    stages = criterion.get("success_stages")
+    min_success = criterion.get("min_success")
+
+    if stages is None and min_success is not None:
+        raise ValueError("min_success requires success_stages")
+    if stages is not None:
+        if not isinstance(stages, list) or not stages or not all(isinstance(s, str) for s in stages):
+            raise ValueError("success_stages must be a non-empty list of stage names")
+        stages = tuple(stages)
+        min_success = len(stages) if min_success is None else min_success
+        if not isinstance(min_success, int) or isinstance(min_success, bool) or not 1 <= min_success <= len(stages):
+            raise ValueError(f"min_success must be an integer between 1 and {len(stages)}")
+
+        def check(project_id):
+            return check_gitlab_pipeline_success_count(
+                project_id=project_id, ref=ref, stages=stages, min_count=min_success,
+            )
+    else:
+        def check(project_id):
+            return check_gitlab_pipeline(project_id=project_id, ref=ref)
+
+    def evaluate(data):
+        project_id, msg = get_gitlab_project_id(key)
+        if not project_id:
+            return False, msg
+        return check(project_id)
+    return evaluate
+
+
+@evaluator("gitlab_runner", remote=True)
+def _gitlab_runner(criterion):
+    key, expected = criterion.get("key"), criterion.get("expected")
+    return lambda data: check_gitlab_runner(path_with_namespace=key, expected_name=expected, ref="main")
+
+
+def _unknown(criterion):
+    # Tipe yang tidak dikenal dianggap lulus (sama seperti perilaku lama grade_lab)
+    key = criterion.get("key")
+    return lambda data: (True, data.get(key))
+
+
+def criterion_fingerprint(criterion):
+    """
+    Hash isi kriteria yang menentukan hasil evaluasi (type, key, expected,
+    success_stages, ...). description dan score tidak ikut: mengubahnya
+    tidak mengubah lulus/gagal.
+    """
+    relevant = {k: v for k, v in criterion.items() if k not in ("description", "score")}
+    raw = json.dumps(relevant, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class Step:
+    __slots__ = ("index", "type", "description", "score", "remote", "fn", "fingerprint")
+
+    def __init__(self, index, ctype, description, score, remote, fn, fingerprint=None):
+        self.index = index
+        self.type = ctype
+        self.description = description
+        self.score = score
+        self.remote = remote
+        self.fn = fn
+        self.fingerprint = fingerprint
+
+
+class Outcome:
+    __slots__ = ("index", "type", "description", "score", "passed", "actual_value", "fingerprint")
+
+    def __init__(self, step, passed, actual_value):
+        self.index = step.index
+        self.type = step.type
+        self.description = step.description
+        self.score = step.score
+        self.passed = passed
+        self.actual_value = actual_value
+        self.fingerprint = step.fingerprint
+
+
+def compile_scheme(lab_id, scheme):
+    """
+    Ubah scheme menjadi list Step. Tidak di-cache; pakai get_plan().
+    ValueError kalau ada kriteria yang field-nya tidak valid.
+    """
+    steps = []
+    for index, criterion in enumerate(scheme.get("criteria", [])):
+        ctype = criterion.get("type")
+        factory, remote = EVALUATORS.get(ctype, (_unknown, False))
+        try:
+            fn = factory(criterion)
+        except ValueError as e:
+            raise ValueError(f"Scheme {lab_id}, criterion {index + 1} ({ctype}): {e}") from e
+        steps.append(Step(
+            index, ctype, criterion.get("description"), criterion.get("score", 0),
+            remote, fn, criterion_fingerprint(criterion),
+        ))
+    return steps
+
+
+_plans = {}  # lab_id -> (scheme object, steps)
+_plans_lock = threading.Lock()
+
+
+def get_plan(lab_id, scheme):
+    """
+    Plan untuk scheme ini, di-compile ulang hanya kalau objek scheme berubah
+    (mis. file di-edit dan registry memuat ulang).
+    """
+    with _plans_lock:
+        cached = _plans.get(lab_id)
+    if cached is not None and cached[0] is scheme:
+        return cached[1]
+
+    steps = compile_scheme(lab_id, scheme)
+    with _plans_lock:
+        _plans[lab_id] = (scheme, steps)
+    return steps
+
+
+def _timed(step, data):
+    start = time.perf_counter()
+    try:
+        return step.fn(data)
+    finally:
+        metrics.CRITERION_DURATION.labels(type=step.type or "unknown").observe(time.perf_counter() - start)
+
+
+def run_plan(steps, client_data, executor=None):
+    """
+    Jalankan plan terhadap client_data. Step remote dikirim ke executor dulu
+    supaya berjalan bersamaan, lalu hasil dikumpulkan sesuai urutan scheme.
+    Return list Outcome.
+    """
+    futures = {}
+    if executor is not None:
+        futures = {
+            step.index: executor.submit(_timed, step, client_data)
+            for step in steps if step.remote
+        }
+
+    outcomes = []
+    for step in steps:
+        future = futures.get(step.index)
+        passed, actual_value = future.result() if future is not None else _timed(step, client_data)
+        outcomes.append(Outcome(step, passed, actual_value))
+    return outcomes
+
+
+def summarize(outcomes):
+    """
+    Nilai mentah (sebelum penalty), feedback (gagal dulu, lalu yang sukses),
+    baris criterion_results (index, type, passed, message, fingerprint) dan daftar
+    (description, message) kriteria yang gagal.
+    """
+    total_score = 0
+    feedback_failed = []
+    feedback_success = []
+    criteria = []
+    failures = []
+
+    for outcome in outcomes:
+        description = outcome.description
+
+        if outcome.passed:
+            total_score += outcome.score
+            feedback_success.append(description)
+            criteria.append((outcome.index, outcome.type, True, None, outcome.fingerprint))
+        else:
+            feedback_failed.append(f"{description}: Failed")
+
+            #normalisasi pesan error
+            msg = str(outcome.actual_value)
+            if msg.startswith("Error: "):
+                msg = msg[len("Error: "):]
+            criteria.append((outcome.index, outcome.type, False, msg[:CRITERION_MESSAGE_MAX], outcome.fingerprint))
+            failures.append((description, msg))
+
+    # Kalau ada minimal 1 failed, nilai 0
+    #if any("Failed" in f for f in feedback_failed):
+    #    total_score = 0
+
+    return {
+        "score": total_score,
+        "feedback": feedback_failed + feedback_success,
+        "failed": feedback_failed,
+        "passed": feedback_success,
+        "criteria": criteria,
+        "failures": failures,
+    }
+
+
+def apply_time_penalty(score, duration):
+    """
+    Return (nilai akhir, pesan penalty). duration dalam detik, None kalau
+    sesi lab tidak diketahui.
+    """
+    if score > 0 and duration is not None and duration > PENALTY_MAX_DURATION:
+        n_penalty = int((duration - PENALTY_MAX_DURATION) // PENALTY_MAX_DURATION) + 1
+        penalty_total = n_penalty * PENALTY_PERCENT
+        new_score = score * (100 - penalty_total) / 100
+        if new_score < PENALTY_MIN_SCORE:
+            new_score = PENALTY_MIN_SCORE
+        return new_score, [
+            f"Waktu pengerjaan melebihi 3 menit, pengurangan {PENALTY_PERCENT}% per 3 menit. Nilai akhir: {new_score:.2f}"
+        ]
+    return score, []
+
+
+def run_plan_batch(steps, client_datas, executor=None):
+    """
+    Jalankan plan untuk banyak submission sekaligus (satu lab). Evaluator
+    remote hanya bergantung pada kriteria (key di scheme), bukan client_data,
+    jadi tiap step remote cukup dijalankan sekali per batch dan hasilnya
+    dipakai semua submission. Return list (per client_data) dari list Outcome.
+    """
+    remote_steps = [step for step in steps if step.remote]
+    if executor is not None:
+        futures = {step.index: executor.submit(_timed, step, None) for step in remote_steps}
+        shared = {index: future.result() for index, future in futures.items()}
+    else:
+        shared = {step.index: _timed(step, None) for step in remote_steps}
+
+    results = []
+    for client_data in client_datas:
+        outcomes = []
+        for step in steps:
+            passed, actual_value = shared[step.index] if step.remote else _timed(step, client_data)
+            outcomes.append(Outcome(step, passed, actual_value))
+        results.append(outcomes)
+    return results
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, delete
+
+from .database import engine, db_session
+from .models import GradingJob
+from .logging_setup import get_logger
+
+log = get_logger(__name__)
+
+# Pool lokal per worker gunicorn yang menjalankan grading async; status &
+# hasil disimpan di tabel grading_jobs supaya bisa di-poll dari worker mana saja
+GRADING_JOB_WORKERS = int(os.getenv("GRADING_JOB_WORKERS", "4"))
+GRADING_JOB_TTL = int(os.getenv("GRADING_JOB_TTL", str(24 * 3600)))
+GRADING_JOB_POLL_INTERVAL = float(os.getenv("GRADING_JOB_POLL_INTERVAL", "0.5"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+
+_table = GradingJob.__table__
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+# job_id yang sedang dijalankan thread ini, untuk report_progress()
+_current = threading.local()
+
+
+def _get_executor():
+    # Dibuat ulang setelah fork, thread tidak ikut ke proses anak
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(
+                    max_workers=GRADING_JOB_WORKERS,
+                    thread_name_prefix="grading-job",
+                )
+                _executor_pid = pid
+    return _executor
+
+
+def _set(job_id, **values):
+    values["updated_at"] = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(update(_table).where(_table.c.id == job_id).values(**values))
+
+
+def _run(job_id, fn, args):
+    _set(job_id, status=RUNNING)
+    _current.job_id = job_id
+    try:
+        body, http_status = fn(*args)
+        _set(job_id, status=DONE, http_status=http_status, result=json.dumps(body))
+    except Exception as e:
+        log.exception("Grading job failed", extra={"job_id": job_id})
+        _set(job_id, status=ERROR, http_status=500,
+             result=json.dumps({"error": "Server error", "details": str(e)}))
+    finally:
+        _current.job_id = None
+        # Session thread ini tidak lewat teardown_appcontext
+        db_session.remove()
+
+
+def submit(lab_id, username, fn, *args):
+    """
+    Catat job baru lalu jalankan fn(*args) di pool lokal. fn harus return
+    (body, http_status). Return job_id.
+    """
+    job_id = uuid.uuid4().hex
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(_table.insert().values(
+            id=job_id,
+            lab_id=lab_id,
+            username=username,
+            status=QUEUED,
+            worker_pid=os.getpid(),
+            created_at=now,
+            updated_at=now,
+        ))
+        # Job lama dibersihkan sekalian, supaya tabel tetap kecil
+        conn.execute(delete(_table).where(_table.c.created_at < now - timedelta(seconds=GRADING_JOB_TTL)))
+
+    _get_executor().submit(_run, job_id, fn, args)
+    return job_id
+
+
+def report_progress(**progress):
+    """
+    Simpan progress job yang sedang berjalan (dipanggil dari dalam fn).
+    Di luar job (mis. CLI) tidak melakukan apa-apa.
+    """
+    job_id = getattr(_current, "job_id", None)
+    if job_id is not None:
+        _set(job_id, progress=json.dumps(progress))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def get(job_id):
+    """
+    Status job sebagai dict, atau None kalau tidak ada.
+    """
+    with engine.connect() as conn:
+        row = conn.execute(select(_table).where(_table.c.id == job_id)).first()
+    if row is None:
+        return None
+
+    job = {
+        "job_id": row.id,
+        "lab_id": row.lab_id,
+        "username": row.username,
+        "status": row.status,
+        "http_status": row.http_status,
+        "result": json.loads(row.result) if row.result else None,
+        "progress": json.loads(row.progress) if row.progress else None,
+    }
+
+    # Worker yang memegang job mati (restart/timeout): job tidak akan selesai
+    if row.status in (QUEUED, RUNNING) and not _pid_alive(row.worker_pid):
+        job.update(status=ERROR, http_status=500,
+                   result={"error": "Grading worker exited, please resubmit"})
+        _set(job_id, status=ERROR, http_status=500, result=json.dumps(job["result"]))
+    return job
+
+
+def wait(job_id, timeout):
+    """
+    Long-poll: tunggu sampai job selesai atau timeout (detik) habis.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        job = get(job_id)
+        if job is None or job["status"] in (DONE, ERROR) or time.monotonic() >= deadline:
+            return job
+        time.sleep(GRADING_JOB_POLL_INTERVAL)
@@ -0,0 +1,188 @@
+import atexit
+import os
+import queue
+import re
+import threading
+
+from .logging_setup import get_logger
+
+log = get_logger(__name__)
+
+# Log error grading per (lab, user): <LAB_LOG_DIR>/<lab_id>/<username>.log.
+# Ditulis oleh satu thread writer per worker, jadi grading tidak menunggu disk
+LAB_LOG_DIR = os.getenv("LAB_LOG_DIR", "/var/log/gradingctl/labs")
+LAB_LOG_MAX_BYTES = int(os.getenv("LAB_LOG_MAX_BYTES", str(256 * 1024)))
+LAB_LOG_BACKUPS = int(os.getenv("LAB_LOG_BACKUPS", "1"))
+LAB_LOG_QUEUE_SIZE = int(os.getenv("LAB_LOG_QUEUE_SIZE", "10000"))
+
+_SAFE_NAME = re.compile(r"[^A-Za-z0-9._-]")
+
+_queue = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+# Batch yang dibuang karena queue penuh (disk terlalu lambat)
+dropped = 0
+
+
+def _safe(name):
+    name = _SAFE_NAME.sub("_", str(name))
+    return name if name.strip(".") else "_"
+
+
+def path_for(lab_id, username):
+    return os.path.join(LAB_LOG_DIR, _safe(lab_id), f"{_safe(username)}.log")
+
+
+def _rotate(path):
+    if LAB_LOG_BACKUPS <= 0:
+        os.remove(path)
+        return
+    for i in range(LAB_LOG_BACKUPS - 1, 0, -1):
+        src = f"{path}.{i}"
+        if os.path.exists(src):
+            os.replace(src, f"{path}.{i + 1}")
+    os.replace(path, f"{path}.1")
+
+
+def _append(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        if os.path.getsize(path) + len(text) > LAB_LOG_MAX_BYTES:
+            _rotate(path)
+    except FileNotFoundError:
+        pass
+    # Satu write per batch; O_APPEND supaya worker lain tidak menimpa
+    with open(path, "a") as f:
+        f.write(text)
+
+
+def _remove(path):
+    for candidate in [path] + [f"{path}.{i}" for i in range(1, LAB_LOG_BACKUPS + 1)]:
+        try:
+            os.remove(candidate)
+        except FileNotFoundError:
+            pass
+
+
+def _run(q):
+    while True:
+        op, path, text = q.get()
+        try:
+            if op == "write":
+                _append(path, text)
+            elif op == "remove":
+                _remove(path)
+        except Exception as e:
+            log.warning("Lab log error", extra={"path": path, "error": str(e)})
+        finally:
+            q.task_done()
+
+
+def _get_queue():
+    # Thread writer dibuat ulang setelah fork (thread tidak ikut ke proses anak)
+    global _queue, _writer_pid
+    pid = os.getpid()
+    if _queue is None or _writer_pid != pid:
+        with _writer_lock:
+            if _queue is None or _writer_pid != pid:
+                q = queue.Queue(maxsize=LAB_LOG_QUEUE_SIZE)
+                threading.Thread(target=_run, args=(q,), name="lab-log-writer", daemon=True).start()
+                _queue, _writer_pid = q, pid
+    return _queue
+
+
+def write(lab_id, username, lines):
+    """
+    Antrikan beberapa baris log sekaligus (satu batch per grading).
+    Tidak pernah blocking; kalau queue penuh batch dibuang.
+    """
+    global dropped
+    if not lines:
+        return
+    text = "".join(line if line.endswith("\n") else line + "\n" for line in lines)
+    try:
+        _get_queue().put_nowait(("write", path_for(lab_id, username), text))
+    except queue.Full:
+        dropped += 1
+
+
+def remove(lab_id, username):
+    """
+    Hapus log user ini untuk lab ini (setelah tulisan yang masih antri).
+    """
+    path = path_for(lab_id, username)
+    try:
+        _get_queue().put_nowait(("remove", path, None))
+    except queue.Full:
+        _remove(path)
+
+
+def read(lab_id, username, offset=0, max_bytes=None):
+    """
+    Baca log mulai byte offset. Return dict content/offset/size/rotated,
+    atau None kalau file tidak ada. Kalau offset > ukuran file (file sudah
+    di-rotate/dihapus), baca ulang dari awal dan rotated=True.
+    Untuk offset > 0 content dipotong di akhir baris terakhir yang utuh.
+    """
+    path = path_for(lab_id, username)
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            rotated = offset > size
+            if rotated:
+                offset = 0
+            f.seek(offset)
+            data = f.read(max_bytes if max_bytes else -1)
+    except FileNotFoundError:
+        return None
+
+    if offset or max_bytes:
+        cut = data.rfind(b"\n") + 1
+        data = data[:cut]
+    return {
+        "content": data.decode("utf-8", errors="replace"),
+        "offset": offset + len(data),
+        "size": size,
+        "rotated": rotated,
+    }
+
+
+def tail(lab_id, username, lines, block_size=8192):
+    """
+    N baris terakhir log, dibaca mundur per blok (tidak baca seluruh file).
+    Return dict content/offset/size, atau None kalau file tidak ada.
+    """
+    path = path_for(lab_id, username)
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            end = size
+            data = b""
+            # +1 karena file diakhiri newline
+            while end > 0 and data.count(b"\n") <= lines:
+                start = max(0, end - block_size)
+                f.seek(start)
+                data = f.read(end - start) + data
+                end = start
+    except FileNotFoundError:
+        return None
+
+    data = data[:data.rfind(b"\n") + 1]
+    kept = b"".join(data.splitlines(keepends=True)[-lines:]) if lines > 0 else b""
+    return {
+        "content": kept.decode("utf-8", errors="replace"),
+        "offset": end + len(data),
+        "size": size,
+    }
+
+
+def flush():
+    """
+    Tunggu sampai semua yang antri sudah ditulis.
+    """
+    if _queue is not None and _writer_pid == os.getpid():
+        _queue.join()
+
+
+atexit.register(flush)
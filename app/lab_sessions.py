@@ -0,0 +1,93 @@
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.dialects.sqlite import insert
+
+from .database import engine
+from .models import LabSession
+
+# Sesi lab yang tidak disentuh (start/grade) selama ini dianggap ditinggal
+LAB_SESSION_TTL = int(os.getenv("LAB_SESSION_TTL", str(24 * 3600)))
+
+_table = LabSession.__table__
+
+
+def start(token, lab_id):
+    """
+    Mulai (atau mulai ulang) sesi lab untuk token ini. Return start_time (UTC).
+    """
+    now = datetime.utcnow()
+    stmt = insert(_table).values(token=token, lab_id=lab_id, start_time=now, last_seen=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[_table.c.token, _table.c.lab_id],
+        set_={"start_time": now, "last_seen": now},
+    )
+    with engine.begin() as conn:
+        conn.execute(stmt)
+        # Bersihkan sesi yang ditinggal sekalian, supaya tabel tetap kecil
+        conn.execute(delete(_table).where(_table.c.last_seen < now - timedelta(seconds=LAB_SESSION_TTL)))
+    return now
+
+
+def get_or_start(token, lab_id):
+    """
+    start_time (UTC) sesi lab ini. Kalau belum ada (start-lab tidak
+    dipanggil atau sudah kedaluwarsa), sesi baru dimulai sekarang.
+    """
+    now = datetime.utcnow()
+    min_seen = now - timedelta(seconds=LAB_SESSION_TTL)
+    key = (_table.c.token == token) & (_table.c.lab_id == lab_id)
+
+    with engine.begin() as conn:
+        start_time = conn.execute(
+            select(_table.c.start_time).where(key, _table.c.last_seen >= min_seen)
+        ).scalar()
+        if start_time is not None:
+            conn.execute(update(_table).where(key).values(last_seen=now))
+            return start_time
+
+    return start(token, lab_id)
+
+
+def get_or_start_many(tokens, lab_id):
+    """
+    Versi batch get_or_start: {token: start_time} untuk banyak token dalam
+    satu transaksi. Token tanpa sesi aktif dimulai sekarang.
+    """
+    now = datetime.utcnow()
+    min_seen = now - timedelta(seconds=LAB_SESSION_TTL)
+    tokens = list(set(tokens))
+    if not tokens:
+        return {}
+
+    with engine.begin() as conn:
+        rows = conn.execute(
+            select(_table.c.token, _table.c.start_time).where(
+                _table.c.lab_id == lab_id,
+                _table.c.token.in_(tokens),
+                _table.c.last_seen >= min_seen,
+            )
+        ).all()
+        start_times = {row.token: row.start_time for row in rows}
+
+        stmt = insert(_table)
+        conn.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[_table.c.token, _table.c.lab_id],
+                set_={"start_time": stmt.excluded.start_time, "last_seen": stmt.excluded.last_seen},
+            ),
+            [
+                {"token": token, "lab_id": lab_id,
+                 "start_time": start_times.setdefault(token, now), "last_seen": now}
+                for token in tokens
+            ],
+        )
+    return start_times
+
+
+def finish(token, lab_id):
+    with engine.begin() as conn:
+        conn.execute(
+            delete(_table).where(_table.c.token == token, _table.c.lab_id == lab_id)
+        )
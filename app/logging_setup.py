@@ -0,0 +1,185 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+# Konfigurasi lewat env:
+#   LOG_LEVEL=INFO                         level default logger "app"
+#   LOG_LEVELS=app.utils=DEBUG,app.api=WARNING   level per modul
+#   LOG_FORMAT=json|text
+#   LOG_DEBUG_RATE=5                       maks event DEBUG per detik per pesan
+#   LOG_QUEUE_SIZE=10000                   record dibuang kalau queue penuh
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_DEBUG_RATE = float(os.getenv("LOG_DEBUG_RATE", "5"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Atribut bawaan LogRecord; sisanya (dari extra=) ikut ditulis sebagai field
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+_exc_formatter = logging.Formatter()  # traceback -> teks, lihat DroppingQueueHandler.prepare
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Satu baris JSON per record: ts, level, logger, msg + field dari extra=.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Sudah diformat oleh DroppingQueueHandler.prepare
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = {k: v for k, v in vars(record).items() if k not in _RESERVED and not k.startswith("_")}
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class DebugSampler(logging.Filter):
+    """
+    Rate limit record DEBUG: per (logger, template pesan) paling banyak
+    LOG_DEBUG_RATE per detik (token bucket). Jumlah yang dibuang ditulis
+    sebagai field "suppressed" di record berikutnya yang lolos.
+    Level INFO ke atas selalu lolos.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+        self._buckets = {}  # key -> [tokens, last_refill, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate <= 0:
+            return True
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) > 10000:
+                    self._buckets.clear()
+                bucket = self._buckets[key] = [self.rate, now, 0]
+            bucket[0] = min(self.rate, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler yang tidak pernah blocking: kalau queue penuh record dibuang.
+    """
+
+    dropped = 0
+
+    def prepare(self, record):
+        """
+        QueueHandler.prepare bawaan menggabungkan traceback ke msg. Di sini
+        msg hanya pesannya, traceback disimpan di exc_text supaya formatter
+        menulisnya sebagai field "exc" sendiri.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _exc_formatter.formatException(record.exc_info)
+            record.exc_info = None  # traceback (dan frame-nya) tidak ikut antri
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+_listener = None
+_listener_pid = None
+_setup_lock = threading.Lock()
+
+
+def _parse_levels(spec):
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.strip().partition("=")
+        if name and level:
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging():
+    """
+    Pasang handler queue pada logger "app". Record diformat & ditulis ke
+    stdout oleh thread QueueListener, jadi request tidak menunggu I/O log.
+    Aman dipanggil berkali-kali; dipasang ulang setelah fork.
+    """
+    global _listener, _listener_pid
+    pid = os.getpid()
+    with _setup_lock:
+        if _listener is not None and _listener_pid == pid:
+            return
+
+        root = logging.getLogger("app")
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        handler = DroppingQueueHandler(log_queue)
+        # Sampling sebelum masuk queue, supaya DEBUG yang dibuang tidak ada biayanya
+        handler.addFilter(DebugSampler(LOG_DEBUG_RATE))
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False
+
+        for name, level in _parse_levels(LOG_LEVELS).items():
+            logging.getLogger(name).setLevel(level)
+
+        _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+        _listener.start()
+        _listener_pid = pid
+        # Tulis sisa record di queue sebelum proses keluar
+        atexit.register(_listener.stop)
+
+
+def get_logger(name):
+    return logging.getLogger(name)
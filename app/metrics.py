@@ -0,0 +1,179 @@
+import os
+import re
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from .database import engine, stats_hooks
+from .logging_setup import get_logger
+
+log = get_logger(__name__)
+
+# Dengan beberapa worker gunicorn, set PROMETHEUS_MULTIPROC_DIR (sebelum
+# proses start) supaya tiap worker menulis nilai metric ke direktori itu dan
+# /metrics menjumlahkan semuanya, bukan hanya worker yang kebetulan melayani
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REQUEST_DURATION = Histogram(
+    "grading_http_request_duration_seconds",
+    "Latency request HTTP per route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+CRITERION_DURATION = Histogram(
+    "grading_criterion_duration_seconds",
+    "Waktu evaluasi satu kriteria di grade_lab per tipe",
+    ["type"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+GITLAB_REQUESTS = Counter(
+    "grading_gitlab_requests_total",
+    "Request ke GitLab API (termasuk retry) per endpoint dan status",
+    ["endpoint", "status"],
+)
+GITLAB_DURATION = Histogram(
+    "grading_gitlab_request_duration_seconds",
+    "Latency request ke GitLab API per endpoint",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_COMMIT_DURATION = Histogram(
+    "grading_db_commit_duration_seconds",
+    "Waktu commit session ORM (flush + COMMIT)",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+# Counter yang sama dengan /db-stats, tapi dijumlahkan dari semua worker
+DB_STATEMENTS = Counter("grading_db_statements_total", "Statement SQL yang dijalankan")
+DB_SLOW_STATEMENTS = Counter(
+    "grading_db_slow_statements_total",
+    "Statement SQL lebih lama dari SQLITE_SLOW_MS (termasuk waktu menunggu lock)",
+)
+DB_SLOW_STATEMENT_SECONDS = Counter(
+    "grading_db_slow_statement_seconds_total", "Total waktu statement SQL yang lambat"
+)
+DB_ERRORS = Counter(
+    "grading_db_errors_total",
+    "Error statement SQL; kind=locked untuk \"database is locked\" setelah busy_timeout habis",
+    ["kind"],
+)
+
+_DB_STAT_COUNTERS = {
+    "statements": DB_STATEMENTS,
+    "slow_statements": DB_SLOW_STATEMENTS,
+    "slow_statement_seconds": DB_SLOW_STATEMENT_SECONDS,
+}
+
+
+def observe_db_stats(**deltas):
+    for key, counter in _DB_STAT_COUNTERS.items():
+        if key in deltas:
+            counter.inc(deltas[key])
+    if "errors" in deltas:
+        DB_ERRORS.labels(kind="locked" if deltas.get("locked_errors") else "other").inc(deltas["errors"])
+
+
+stats_hooks.append(observe_db_stats)
+
+_ID_SEGMENT = re.compile(r"^(\d+|.*%2F.*)$", re.IGNORECASE)
+
+
+def gitlab_endpoint(path):
+    """
+    Template path GitLab API untuk label, mis. projects/:id/pipelines
+    (id numerik dan path project di-URL-encode diganti :id).
+    """
+    return "/".join(":id" if _ID_SEGMENT.match(part) else part for part in path.strip("/").split("/"))
+
+
+def observe_gitlab(path, status, seconds):
+    endpoint = gitlab_endpoint(path)
+    GITLAB_REQUESTS.labels(endpoint=endpoint, status=str(status)).inc()
+    GITLAB_DURATION.labels(endpoint=endpoint).observe(seconds)
+
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session):
+    session.info["commit_start"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    start = session.info.pop("commit_start", None)
+    if start is not None:
+        DB_COMMIT_DURATION.observe(time.perf_counter() - start)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("commit_start", None)
+
+
+class StoreSizeCollector:
+    """
+    Ukuran tabel session-store bersama, dihitung saat scrape. Nilainya sama
+    dari worker mana pun, jadi tidak lewat direktori multiprocess.
+    """
+
+    def describe(self):
+        # Jangan query DB saat register
+        return []
+
+    def collect(self):
+        from .models import LabSession, GradingJob, GitLabProjectCache, PipelineStatus, PipelineJob
+
+        sizes = GaugeMetricFamily(
+            "grading_store_rows", "Jumlah baris di tabel session/cache store", labels=["store"]
+        )
+        jobs = GaugeMetricFamily(
+            "grading_jobs_by_status", "Job grading async per status", labels=["status"]
+        )
+        try:
+            with engine.connect() as conn:
+                for name, model in (
+                    ("lab_sessions", LabSession),
+                    ("grading_jobs", GradingJob),
+                    ("gitlab_project_cache", GitLabProjectCache),
+                    ("gitlab_pipelines", PipelineStatus),
+                    ("gitlab_pipeline_jobs", PipelineJob),
+                ):
+                    count = conn.execute(select(func.count()).select_from(model.__table__)).scalar()
+                    sizes.add_metric([name], count)
+
+                table = GradingJob.__table__
+                for status, count in conn.execute(
+                    select(table.c.status, func.count()).group_by(table.c.status)
+                ):
+                    jobs.add_metric([status], count)
+        except Exception as e:
+            log.warning("Store size metrics failed", extra={"error": str(e)})
+            return
+        yield sizes
+        yield jobs
+
+
+_store_collector = StoreSizeCollector()
+if not MULTIPROC_DIR:
+    REGISTRY.register(_store_collector)
+
+
+def render():
+    """
+    (body, content_type) untuk endpoint /metrics.
+    """
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        # Registry baru per scrape, membaca file semua worker (hidup & yang sudah exit)
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_store_collector)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,381 @@
+"""
+Migrasi skema database berversi.
+
+Setiap migrasi punya nomor versi dan dijalankan sekali; versi yang sudah
+jalan dicatat di tabel schema_migrations. Semua migrasi yang tertunda
+dijalankan dalam satu transaksi BEGIN IMMEDIATE, jadi kalau beberapa worker
+gunicorn start bersamaan, hanya satu yang menjalankan dan sisanya menunggu
+lalu melihat versinya sudah tercatat.
+
+Pemakaian:
+    python -m app.migrations status
+    python -m app.migrations upgrade [--explain]
+    python -m app.migrations plans [--check]
+"""
+import sqlite3
+import sys
+from datetime import datetime
+
+from .database import engine
+from .best_results import BACKFILL_SQL
+from .logging_setup import get_logger
+
+log = get_logger(__name__)
+
+
+def _columns(cur, table):
+    return {row[1] for row in cur.execute(f"PRAGMA table_info({table})")}
+
+
+def _grading_results_status_duration(cur):
+    # Pengganti migrate.py lama: tambah kolom status/duration kalau belum ada
+    columns = _columns(cur, "grading_results")
+    if "status" not in columns:
+        cur.execute("ALTER TABLE grading_results ADD COLUMN status VARCHAR DEFAULT 'ongoing'")
+    if "duration" not in columns:
+        cur.execute("ALTER TABLE grading_results ADD COLUMN duration FLOAT")
+
+
+def _reporting_indexes(cur):
+    # Disesuaikan dengan filter/DISTINCT di route laporan (lihat ROUTE_QUERIES)
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_grading_results_username_lab ON grading_results (username, lab_id, score)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_grading_results_lab_class ON grading_results (lab_id, class_name)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_grading_results_class_lab ON grading_results (class_name, lab_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_users_class_group ON users (class_name, group_name)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_users_name ON users (name)")
+    cur.execute("ANALYZE")
+
+
+def _best_results(cur):
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS best_results ("
+        "username VARCHAR NOT NULL, class_name VARCHAR NOT NULL, lab_id VARCHAR NOT NULL, "
+        "result_id INTEGER NOT NULL REFERENCES grading_results (id), score FLOAT NOT NULL, "
+        "timestamp DATETIME, attempts INTEGER NOT NULL, "
+        "PRIMARY KEY (username, class_name, lab_id))"
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_best_results_lab_class ON best_results (lab_id, class_name)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_best_results_class_lab ON best_results (class_name, lab_id)")
+    cur.execute("DELETE FROM best_results")
+    cur.execute(BACKFILL_SQL)
+
+
+def _not_started_indexes(cur):
+    # Daftar "belum mulai" per kelas diurutkan username tanpa temp B-tree
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_users_class_username ON users (class_name, username)")
+
+
+def _results_keyset_indexes(cur):
+    # /results diurutkan (timestamp, id); id ikut otomatis sebagai rowid di index
+    cur.execute("DROP INDEX IF EXISTS ix_grading_results_lab_class")
+    cur.execute("DROP INDEX IF EXISTS ix_grading_results_class_lab")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_grading_results_lab_class_ts ON grading_results (lab_id, class_name, timestamp)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_grading_results_class_ts ON grading_results (class_name, timestamp)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_grading_results_ts ON grading_results (timestamp)")
+    cur.execute("ANALYZE")
+
+
+def _best_results_lab_username(cur):
+    # Anti-join "belum mulai" mencari tepat (lab_id, username), tidak peduli statistik ANALYZE
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_best_results_lab_username ON best_results (lab_id, username)")
+
+
+def _submissions(cur):
+    # Satu baris submissions per attempt; grading_results tinggal mapping ke anggota
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS submissions ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, username VARCHAR REFERENCES users (username), "
+        "class_name VARCHAR NOT NULL, group_name VARCHAR, lab_id VARCHAR NOT NULL REFERENCES labs (lab_id), "
+        "score FLOAT NOT NULL, feedback VARCHAR, timestamp DATETIME, status VARCHAR, duration FLOAT)"
+    )
+    columns = _columns(cur, "grading_results")
+    if "submission_id" not in columns:
+        cur.execute("ALTER TABLE grading_results ADD COLUMN submission_id INTEGER REFERENCES submissions (id)")
+
+    if "feedback" in columns:
+        # Baris lama: grade_lab menulis anggota satu kelompok berurutan dengan
+        # score/feedback/durasi yang sama, jadi baris berurutan dengan nilai
+        # yang sama (dan username belum muncul) digabung jadi satu submission
+        rows = cur.execute(
+            "SELECT g.id, g.username, g.class_name, g.lab_id, g.score, g.feedback, g.timestamp, "
+            "g.status, g.duration, u.group_name "
+            "FROM grading_results g LEFT JOIN users u ON u.username = g.username "
+            "WHERE g.submission_id IS NULL ORDER BY g.id"
+        ).fetchall()
+
+        insert_cur = cur.connection.cursor()
+        assignments = []
+        current_key, current_id, current_members = None, None, set()
+        for (result_id, username, class_name, lab_id, score, feedback,
+             timestamp, status, duration, group_name) in rows:
+            key = (class_name, lab_id, group_name, score, feedback, status, duration)
+            if key != current_key or username in current_members:
+                insert_cur.execute(
+                    "INSERT INTO submissions (username, class_name, group_name, lab_id, score, "
+                    "feedback, timestamp, status, duration) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (username, class_name, group_name, lab_id, score, feedback, timestamp, status, duration),
+                )
+                current_key, current_id, current_members = key, insert_cur.lastrowid, set()
+            current_members.add(username)
+            assignments.append((current_id, result_id))
+
+        cur.executemany("UPDATE grading_results SET submission_id = ? WHERE id = ?", assignments)
+        log.info("Normalized grading_results into submissions", extra={"rows": len(assignments)})
+
+    # Kolom yang sekarang ada di submissions
+    for column in ("feedback", "status", "duration"):
+        if column not in _columns(cur, "grading_results"):
+            continue
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            cur.execute(f"ALTER TABLE grading_results DROP COLUMN {column}")
+        elif column == "feedback":
+            # SQLite lama tidak bisa DROP COLUMN; minimal kosongkan isinya
+            cur.execute("UPDATE grading_results SET feedback = NULL")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_grading_results_submission ON grading_results (submission_id)")
+    if "feedback" in columns:
+        log.warning("Run VACUUM on the database to reclaim the space freed by the old feedback column")
+
+
+def _criterion_results(cur):
+    # Hasil per kriteria hanya tercatat untuk submission baru; feedback lama
+    # berupa teks bebas dan tidak bisa dipetakan balik ke index kriteria
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS criterion_results ("
+        "submission_id INTEGER NOT NULL REFERENCES submissions (id), criterion_index INTEGER NOT NULL, "
+        "lab_id VARCHAR NOT NULL, class_name VARCHAR NOT NULL, type VARCHAR, passed BOOLEAN NOT NULL, "
+        "message VARCHAR, PRIMARY KEY (submission_id, criterion_index))"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS ix_criterion_results_lab_class "
+        "ON criterion_results (lab_id, class_name, criterion_index, passed)"
+    )
+
+
+def _grading_jobs(cur):
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS grading_jobs ("
+        "id VARCHAR PRIMARY KEY, lab_id VARCHAR NOT NULL, username VARCHAR NOT NULL, "
+        "status VARCHAR NOT NULL, http_status INTEGER, result VARCHAR, worker_pid INTEGER, "
+        "created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL)"
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_grading_jobs_created_at ON grading_jobs (created_at)")
+
+
+def _regrade(cur):
+    # Payload client_data terkompresi untuk re-grade, dan progress job
+    if "payload" not in _columns(cur, "submissions"):
+        cur.execute("ALTER TABLE submissions ADD COLUMN payload BLOB")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_submissions_lab ON submissions (lab_id)")
+    if "progress" not in _columns(cur, "grading_jobs"):
+        cur.execute("ALTER TABLE grading_jobs ADD COLUMN progress VARCHAR")
+
+
+def _criterion_fingerprint(cur):
+    # Baris lama tanpa fingerprint tidak dipakai ulang saat re-grade (dicek ulang)
+    if "fingerprint" not in _columns(cur, "criterion_results"):
+        cur.execute("ALTER TABLE criterion_results ADD COLUMN fingerprint VARCHAR")
+
+
+# (versi, nama, fungsi(cursor)); tambahkan di akhir, jangan ubah yang lama
+MIGRATIONS = [
+    (1, "grading_results_status_duration", _grading_results_status_duration),
+    (2, "reporting_indexes", _reporting_indexes),
+    (3, "best_results", _best_results),
+    (4, "not_started_indexes", _not_started_indexes),
+    (5, "results_keyset_indexes", _results_keyset_indexes),
+    (6, "best_results_lab_username", _best_results_lab_username),
+    (7, "submissions", _submissions),
+    (8, "criterion_results", _criterion_results),
+    (9, "grading_jobs", _grading_jobs),
+    (10, "regrade", _regrade),
+    (11, "criterion_fingerprint", _criterion_fingerprint),
+]
+
+
+# Bentuk query tiap route laporan, untuk cek EXPLAIN QUERY PLAN
+ROUTE_QUERIES = [
+    ("show_results (count, cached)",
+     "SELECT count(*) FROM grading_results JOIN users ON users.username = grading_results.username "
+     "WHERE grading_results.class_name = :class_name AND grading_results.lab_id = :lab_id"),
+    ("show_results (page)",
+     "SELECT grading_results.id, grading_results.username, users.name, users.group_name, "
+     "grading_results.class_name, grading_results.lab_id, grading_results.score, grading_results.timestamp, "
+     "submissions.duration, submissions.status "
+     "FROM grading_results JOIN users ON users.username = grading_results.username "
+     "JOIN submissions ON submissions.id = grading_results.submission_id "
+     "WHERE grading_results.class_name = :class_name AND grading_results.lab_id = :lab_id "
+     "AND (grading_results.timestamp, grading_results.id) < (:timestamp, :id) "
+     "ORDER BY grading_results.timestamp DESC, grading_results.id DESC LIMIT 11"),
+    ("show_results (page, unfiltered)",
+     "SELECT grading_results.id, users.name FROM grading_results JOIN users ON users.username = grading_results.username "
+     "WHERE (grading_results.timestamp, grading_results.id) < (:timestamp, :id) "
+     "ORDER BY grading_results.timestamp DESC, grading_results.id DESC LIMIT 11"),
+    ("show_results (not started)",
+     "SELECT users.username FROM users WHERE NOT (EXISTS (SELECT best_results.username FROM best_results "
+     "WHERE best_results.username = users.username AND best_results.lab_id = :lab_id)) "
+     "AND users.class_name = :class_name ORDER BY users.username ASC LIMIT 100"),
+    ("download_results",
+     "SELECT grading_results.*, submissions.feedback, users.name, users.group_name FROM grading_results "
+     "JOIN best_results ON best_results.result_id = grading_results.id "
+     "JOIN submissions ON submissions.id = grading_results.submission_id "
+     "LEFT OUTER JOIN users ON users.username = grading_results.username "
+     "WHERE best_results.class_name = :class_name AND best_results.lab_id = :lab_id "
+     "ORDER BY best_results.username ASC, best_results.lab_id ASC"),
+    ("users_not_started_lab_filtered",
+     "SELECT users.username FROM users WHERE NOT (EXISTS (SELECT best_results.username FROM best_results "
+     "WHERE best_results.username = users.username AND best_results.lab_id = :lab_id)) "
+     "AND users.class_name = :class_name ORDER BY users.username ASC LIMIT 100 OFFSET 0"),
+    ("users_not_started_lab",
+     "SELECT users.username FROM users WHERE NOT (EXISTS (SELECT best_results.username FROM best_results "
+     "WHERE best_results.username = users.username AND best_results.lab_id = :lab_id)) "
+     "ORDER BY users.username ASC LIMIT 100 OFFSET 0"),
+    ("criterion_stats",
+     "SELECT criterion_results.lab_id, criterion_results.class_name, criterion_results.criterion_index, "
+     "count(*), sum(CASE WHEN criterion_results.passed THEN 1 ELSE 0 END) FROM criterion_results "
+     "WHERE criterion_results.lab_id = :lab_id AND criterion_results.class_name = :class_name "
+     "GROUP BY criterion_results.lab_id, criterion_results.class_name, criterion_results.criterion_index"),
+    ("get_filters (class_names)",
+     "SELECT DISTINCT best_results.class_name FROM best_results"),
+    ("get_filters (lab_ids)",
+     "SELECT DISTINCT best_results.lab_id FROM best_results"),
+    ("get_users_and_labs (started)",
+     "SELECT DISTINCT best_results.username FROM best_results"),
+    ("grade_lab (group)",
+     "SELECT * FROM users WHERE users.class_name = :class_name AND users.group_name = :group_name"),
+]
+
+SAMPLE_PARAMS = {
+    "class_name": "XI_SIJA1",
+    "lab_id": "OSADM-001-2",
+    "group_name": "kelompok1",
+    "username": "student",
+    "timestamp": "2100-01-01 00:00:00.000000",
+    "id": 2 ** 62,
+}
+
+
+def _ensure_table(cur):
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at DATETIME NOT NULL)"
+    )
+
+
+def applied_versions(cur):
+    _ensure_table(cur)
+    return {row[0] for row in cur.execute("SELECT version FROM schema_migrations")}
+
+
+def upgrade(bind=None):
+    """
+    Jalankan migrasi yang belum tercatat. Return list nama migrasi yang dijalankan.
+    """
+    bind = bind or engine
+    raw = bind.raw_connection()
+    dbapi_conn = raw.driver_connection
+    old_isolation = dbapi_conn.isolation_level
+    dbapi_conn.isolation_level = None  # transaksi dikontrol manual
+    applied = []
+    try:
+        cur = dbapi_conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            done = applied_versions(cur)
+            for version, name, migrate in MIGRATIONS:
+                if version in done:
+                    continue
+                migrate(cur)
+                cur.execute(
+                    "INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)",
+                    (version, name, datetime.utcnow().isoformat(" ")),
+                )
+                applied.append(name)
+            cur.execute("COMMIT")
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+    finally:
+        dbapi_conn.isolation_level = old_isolation
+        raw.close()
+
+    if applied:
+        log.info("Migrations applied", extra={"migrations": applied})
+    return applied
+
+
+def query_plans(bind=None):
+    """
+    EXPLAIN QUERY PLAN untuk tiap query di ROUTE_QUERIES.
+    Return list (route, [detail, ...]).
+    """
+    bind = bind or engine
+    plans = []
+    with bind.connect() as conn:
+        for route, sql in ROUTE_QUERIES:
+            rows = conn.exec_driver_sql(
+                f"EXPLAIN QUERY PLAN {sql}",
+                {k: v for k, v in SAMPLE_PARAMS.items() if f":{k}" in sql},
+            ).all()
+            plans.append((route, [row[-1] for row in rows]))
+    return plans
+
+
+def full_scans(plans, table="grading_results"):
+    """
+    Route yang masih full table scan (SCAN tanpa index) pada tabel ini.
+    """
+    return [
+        route for route, details in plans
+        if any(d == f"SCAN {table}" or d.startswith(f"SCAN {table} ") and "INDEX" not in d
+               for d in details)
+    ]
+
+
+def print_plans(plans):
+    for route, details in plans:
+        print(f"{route}:")
+        for detail in details:
+            print(f"    {detail}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "upgrade"
+
+    if command == "status":
+        with engine.connect() as conn:
+            cur = conn.connection.cursor()
+            done = applied_versions(cur)
+            conn.commit()
+        for version, name, _ in MIGRATIONS:
+            print(f"{version:4d} {name:40s} {'applied' if version in done else 'pending'}")
+        return 0
+
+    if command == "upgrade":
+        explain = "--explain" in argv
+        if explain:
+            print("== Query plans before ==")
+            print_plans(query_plans())
+        applied = upgrade()
+        print(f"{len(applied)} migration(s) applied" + (f": {', '.join(applied)}" if applied else ""))
+        if explain:
+            print("== Query plans after ==")
+            print_plans(query_plans())
+        return 0
+
+    if command == "plans":
+        plans = query_plans()
+        print_plans(plans)
+        scans = full_scans(plans)
+        if scans:
+            print(f"Full scan on grading_results: {', '.join(scans)}")
+            if "--check" in argv:
+                return 1
+        return 0
+
+    print(__doc__)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -12,19 +12,148 @@ class User(Base):
     group_name = Column(String)
     class_name = Column(String, nullable=False)  # Nama kelas (enum: 10_sija1, 10_sija2, dll.)
 
+    # Index dibuat juga lewat migrations.py untuk database yang sudah ada
+    __table_args__ = (
+        Index('ix_users_class_group', 'class_name', 'group_name'),
+        Index('ix_users_name', 'name'),
+        Index('ix_users_class_username', 'class_name', 'username'),
+    )
+
 class Lab(Base):
     __tablename__ = 'labs'
     lab_id = Column(String, primary_key=True)    # ID lab sebagai primary key
     scheme_path = Column(String, nullable=False) # Path ke file skema lab
 
+class Submission(Base):
+    # Satu baris per attempt grading (per kelompok); feedback disimpan sekali di sini
+    __tablename__ = 'submissions'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    username = Column(String, ForeignKey('users.username'))  # user yang submit
+    class_name = Column(String, nullable=False)
+    group_name = Column(String)
+    lab_id = Column(String, ForeignKey('labs.lab_id'), nullable=False)
+    score = Column(Float, nullable=False)
+    feedback = Column(String, nullable=True)
+    timestamp = Column(DateTime, default=datetime.utcnow)
+    status = Column(String, default="ongoing")
+    duration = Column(Float)
+    payload = Column(LargeBinary)  # client_data (JSON, zlib) untuk re-grade, lihat regrade.py
+
+    __table_args__ = (
+        Index('ix_submissions_lab', 'lab_id'),
+    )
+
+class CriterionResult(Base):
+    # Hasil tiap kriteria per submission, untuk statistik pass rate (GROUP BY)
+    __tablename__ = 'criterion_results'
+    submission_id = Column(Integer, ForeignKey('submissions.id'), primary_key=True)
+    criterion_index = Column(Integer, primary_key=True)  # urutan di scheme
+    lab_id = Column(String, nullable=False)
+    class_name = Column(String, nullable=False)
+    type = Column(String)
+    passed = Column(Boolean, nullable=False)
+    message = Column(String)  # pesan error singkat, NULL kalau lulus
+    fingerprint = Column(String)  # grading_engine.criterion_fingerprint saat dinilai
+
+    __table_args__ = (
+        Index('ix_criterion_results_lab_class', 'lab_id', 'class_name', 'criterion_index', 'passed'),
+    )
+
 class GradingResult(Base):
+    # Mapping submission -> anggota kelompok. Kolom score/timestamp/kelas/lab
+    # ikut disalin supaya filter & urutan laporan tetap dari index tabel ini
     __tablename__ = 'grading_results'
     id = Column(Integer, primary_key=True, autoincrement=True)
+    submission_id = Column(Integer, ForeignKey('submissions.id'), nullable=False)
     username = Column(String, ForeignKey('users.username'), nullable=False)
     class_name = Column(String, nullable=False)  # Tambahkan ini
     lab_id = Column(String, ForeignKey('labs.lab_id'), nullable=False)
     score = Column(Float, nullable=False)
-    feedback = Column(String, nullable=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
-    status = Column(String, default="ongoing")  # Tambahkan kolom status
-    duration = Column(Float)
+
+    # Index dibuat juga lewat migrations.py untuk database yang sudah ada
+    __table_args__ = (
+        Index('ix_grading_results_username_lab', 'username', 'lab_id', 'score'),
+        Index('ix_grading_results_lab_class_ts', 'lab_id', 'class_name', 'timestamp'),
+        Index('ix_grading_results_class_ts', 'class_name', 'timestamp'),
+        Index('ix_grading_results_ts', 'timestamp'),
+        Index('ix_grading_results_submission', 'submission_id'),
+    )
+
+class BestResult(Base):
+    # Satu baris per (username, class_name, lab_id): attempt dengan score tertinggi.
+    # Diperbarui di transaksi yang sama dengan insert submission (lihat best_results.py)
+    __tablename__ = 'best_results'
+    username = Column(String, primary_key=True)
+    class_name = Column(String, primary_key=True)
+    lab_id = Column(String, primary_key=True)
+    result_id = Column(Integer, ForeignKey('grading_results.id'), nullable=False)
+    score = Column(Float, nullable=False)
+    timestamp = Column(DateTime)
+    attempts = Column(Integer, nullable=False, default=1)
+
+    __table_args__ = (
+        Index('ix_best_results_lab_class', 'lab_id', 'class_name'),
+        Index('ix_best_results_class_lab', 'class_name', 'lab_id'),
+        Index('ix_best_results_lab_username', 'lab_id', 'username'),
+    )
+
+class GitLabProjectCache(Base):
+    __tablename__ = 'gitlab_project_cache'
+    path_with_namespace = Column(String, primary_key=True)
+    project_id = Column(Integer, nullable=True)  # NULL = project tidak ditemukan (negative cache)
+    message = Column(String)
+    expires_at = Column(DateTime, nullable=False)
+
+class PipelineStatus(Base):
+    __tablename__ = 'gitlab_pipelines'
+    project_id = Column(Integer, primary_key=True)
+    ref = Column(String, primary_key=True)
+    pipeline_id = Column(Integer, nullable=False)  # pipeline terbaru untuk ref ini
+    status = Column(String)
+    sha = Column(String)
+    updated_at = Column(DateTime, nullable=False)
+
+class PipelineJob(Base):
+    __tablename__ = 'gitlab_pipeline_jobs'
+    project_id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, primary_key=True)
+    pipeline_id = Column(Integer, nullable=False)
+    name = Column(String)
+    stage = Column(String)
+    status = Column(String)
+    runner_description = Column(String)
+    updated_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('ix_gitlab_pipeline_jobs_pipeline', 'project_id', 'pipeline_id'),
+    )
+
+class LabSession(Base):
+    __tablename__ = 'lab_sessions'
+    token = Column(String, primary_key=True)
+    lab_id = Column(String, primary_key=True)
+    start_time = Column(DateTime, nullable=False)  # UTC
+    last_seen = Column(DateTime, nullable=False)   # UTC, untuk eviction TTL
+
+    __table_args__ = (
+        Index('ix_lab_sessions_last_seen', 'last_seen'),
+    )
+
+class GradingJob(Base):
+    # Grading async (/grade-lab dengan "async": true), lihat grading_jobs.py
+    __tablename__ = 'grading_jobs'
+    id = Column(String, primary_key=True)  # uuid4 hex
+    lab_id = Column(String, nullable=False)
+    username = Column(String, nullable=False)
+    status = Column(String, nullable=False)  # queued / running / done / error
+    http_status = Column(Integer)
+    result = Column(String)  # body respons grading (JSON)
+    worker_pid = Column(Integer)  # worker gunicorn yang menjalankan
+    progress = Column(String)  # progress job panjang (JSON), mis. re-grade
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('ix_grading_jobs_created_at', 'created_at'),
+    )
@@ -0,0 +1,176 @@
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.dialects.sqlite import insert
+
+from .database import engine
+from .models import PipelineStatus, PipelineJob
+from .logging_setup import get_logger
+
+log = get_logger(__name__)
+
+# Data webhook dianggap segar selama ini (detik); lebih lama dari itu
+# check pipeline kembali polling ke GitLab API
+PIPELINE_STORE_MAX_AGE = int(os.getenv("PIPELINE_STORE_MAX_AGE", "300"))
+
+_pipelines = PipelineStatus.__table__
+_jobs = PipelineJob.__table__
+
+
+def _upsert_job(conn, project_id, pipeline_id, job_id, name, stage, status, runner, now):
+    runner = runner or {}
+    stmt = insert(_jobs).values(
+        project_id=project_id,
+        job_id=job_id,
+        pipeline_id=pipeline_id,
+        name=name,
+        stage=stage,
+        status=status,
+        runner_description=runner.get("description"),
+        updated_at=now,
+    )
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=[_jobs.c.project_id, _jobs.c.job_id],
+        set_={
+            "pipeline_id": stmt.excluded.pipeline_id,
+            "name": stmt.excluded.name,
+            "stage": stmt.excluded.stage,
+            "status": stmt.excluded.status,
+            "runner_description": stmt.excluded.runner_description,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    ))
+
+
+def record_pipeline_event(data):
+    """
+    Simpan event webhook 'pipeline' (status pipeline + daftar builds-nya).
+    Event untuk pipeline yang lebih lama dari yang tersimpan diabaikan.
+    """
+    project_id = data["project"]["id"]
+    attrs = data["object_attributes"]
+    pipeline_id = attrs["id"]
+    ref = attrs["ref"]
+    now = datetime.utcnow()
+
+    with engine.begin() as conn:
+        old_pipeline_id = conn.execute(
+            select(_pipelines.c.pipeline_id)
+            .where(_pipelines.c.project_id == project_id, _pipelines.c.ref == ref)
+        ).scalar()
+        if old_pipeline_id is not None and old_pipeline_id > pipeline_id:
+            return False
+
+        stmt = insert(_pipelines).values(
+            project_id=project_id,
+            ref=ref,
+            pipeline_id=pipeline_id,
+            status=attrs.get("status"),
+            sha=attrs.get("sha"),
+            updated_at=now,
+        )
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=[_pipelines.c.project_id, _pipelines.c.ref],
+            set_={
+                "pipeline_id": stmt.excluded.pipeline_id,
+                "status": stmt.excluded.status,
+                "sha": stmt.excluded.sha,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        ))
+
+        # Job milik pipeline lama untuk ref ini sudah tidak dipakai
+        if old_pipeline_id is not None and old_pipeline_id != pipeline_id:
+            conn.execute(
+                delete(_jobs).where(
+                    _jobs.c.project_id == project_id,
+                    _jobs.c.pipeline_id == old_pipeline_id,
+                )
+            )
+
+        for build in data.get("builds") or []:
+            _upsert_job(
+                conn, project_id, pipeline_id, build["id"],
+                build.get("name"), build.get("stage"), build.get("status"),
+                build.get("runner"), now,
+            )
+
+    return True
+
+
+def record_job_event(data):
+    """
+    Simpan event webhook 'build' (perubahan status satu job).
+    """
+    project_id = data["project_id"]
+    pipeline_id = data["pipeline_id"]
+    now = datetime.utcnow()
+
+    with engine.begin() as conn:
+        _upsert_job(
+            conn, project_id, pipeline_id, data["build_id"],
+            data.get("build_name"), data.get("build_stage"), data.get("build_status"),
+            data.get("runner"), now,
+        )
+        # Pipeline-nya ikut dianggap segar kalau masih pipeline terbaru
+        conn.execute(
+            update(_pipelines)
+            .where(_pipelines.c.project_id == project_id,
+                   _pipelines.c.pipeline_id == pipeline_id)
+            .values(updated_at=now)
+        )
+
+    return True
+
+
+def get_latest_pipeline(project_id, ref="main", max_age=None):
+    """
+    Pipeline terbaru + jobs untuk (project_id, ref) dari data webhook,
+    dengan bentuk yang sama seperti respons GitLab API.
+    Return (pipeline, jobs), atau None kalau tidak ada data yang segar.
+    """
+    if max_age is None:
+        max_age = PIPELINE_STORE_MAX_AGE
+    min_updated = datetime.utcnow() - timedelta(seconds=max_age)
+
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(
+                select(_pipelines)
+                .where(_pipelines.c.project_id == project_id, _pipelines.c.ref == ref)
+            ).first()
+            if not row or row.updated_at < min_updated:
+                return None
+
+            job_rows = conn.execute(
+                select(_jobs)
+                .where(_jobs.c.project_id == project_id,
+                       _jobs.c.pipeline_id == row.pipeline_id)
+                .order_by(_jobs.c.job_id.desc())
+            ).all()
+    except Exception as e:
+        log.warning("Pipeline store lookup error", extra={"project_id": project_id, "ref": ref, "error": str(e)})
+        return None
+
+    if not job_rows:
+        return None
+
+    pipeline = {
+        "id": row.pipeline_id,
+        "project_id": row.project_id,
+        "ref": row.ref,
+        "sha": row.sha,
+        "status": row.status,
+    }
+    jobs = [
+        {
+            "id": job.job_id,
+            "name": job.name,
+            "stage": job.stage,
+            "status": job.status,
+            "runner": {"description": job.runner_description} if job.runner_description is not None else None,
+        }
+        for job in job_rows
+    ]
+    return pipeline, jobs
@@ -0,0 +1,114 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.sqlite import insert
+
+from .database import engine
+from .models import GitLabProjectCache
+from .logging_setup import get_logger
+
+log = get_logger(__name__)
+
+# path_with_namespace -> project_id tidak pernah berubah, jadi hit disimpan lama;
+# "not found" disimpan sebentar supaya project yang baru dibuat cepat terlihat
+PROJECT_ID_TTL = int(os.getenv("GITLAB_PROJECT_ID_TTL", "86400"))
+PROJECT_NOT_FOUND_TTL = int(os.getenv("GITLAB_PROJECT_NOT_FOUND_TTL", "15"))
+# Cache lokal hanya dipercaya sebentar: invalidate() dari webhook hanya
+# menghapus cache lokal worker yang menerimanya, worker lain ikut lewat tabel
+PROJECT_LOCAL_TTL = int(os.getenv("GITLAB_PROJECT_LOCAL_TTL", "60"))
+PROJECT_LOCAL_MAX = int(os.getenv("GITLAB_PROJECT_LOCAL_MAX", "5000"))
+
+_table = GitLabProjectCache.__table__
+
+# Cache lokal proses untuk hit positif, di depan tabel bersama
+_local = {}
+_local_lock = threading.Lock()
+
+
+def _remember(path_with_namespace, project_id, expires_at):
+    expires_at = min(expires_at, datetime.utcnow() + timedelta(seconds=PROJECT_LOCAL_TTL))
+    with _local_lock:
+        if len(_local) >= PROJECT_LOCAL_MAX and path_with_namespace not in _local:
+            _local.clear()
+        _local[path_with_namespace] = (project_id, expires_at)
+
+
+def lookup(path_with_namespace):
+    """
+    Return (project_id, message) dari cache, atau None kalau tidak ada /
+    sudah kedaluwarsa. project_id None berarti negative cache.
+    """
+    now = datetime.utcnow()
+    with _local_lock:
+        entry = _local.get(path_with_namespace)
+    if entry and entry[1] > now:
+        return entry[0], "ok"
+
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(
+                select(_table.c.project_id, _table.c.message, _table.c.expires_at)
+                .where(_table.c.path_with_namespace == path_with_namespace)
+            ).first()
+    except Exception as e:
+        log.warning("Project cache lookup error", extra={"project": path_with_namespace, "error": str(e)})
+        return None
+
+    if not row or row.expires_at <= now:
+        return None
+
+    if row.project_id is not None:
+        _remember(path_with_namespace, row.project_id, row.expires_at)
+        return row.project_id, "ok"
+    return None, row.message
+
+
+def store(path_with_namespace, project_id, message="ok"):
+    """
+    Simpan hasil resolusi. project_id None = project tidak ditemukan.
+    """
+    ttl = PROJECT_ID_TTL if project_id is not None else PROJECT_NOT_FOUND_TTL
+    expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+
+    if project_id is not None:
+        _remember(path_with_namespace, project_id, expires_at)
+
+    stmt = insert(_table).values(
+        path_with_namespace=path_with_namespace,
+        project_id=project_id,
+        message=message,
+        expires_at=expires_at,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[_table.c.path_with_namespace],
+        set_={
+            "project_id": stmt.excluded.project_id,
+            "message": stmt.excluded.message,
+            "expires_at": stmt.excluded.expires_at,
+        },
+    )
+    try:
+        with engine.begin() as conn:
+            conn.execute(stmt)
+    except Exception as e:
+        log.warning("Project cache store error", extra={"project": path_with_namespace, "error": str(e)})
+
+
+def invalidate(path_with_namespace=None):
+    """
+    Hapus entry cache satu project (atau semua), mis. setelah project
+    dibuat, dihapus, di-rename atau dipindah namespace.
+    """
+    with _local_lock:
+        if path_with_namespace is None:
+            _local.clear()
+        else:
+            _local.pop(path_with_namespace, None)
+
+    stmt = delete(_table)
+    if path_with_namespace is not None:
+        stmt = stmt.where(_table.c.path_with_namespace == path_with_namespace)
+    with engine.begin() as conn:
+        conn.execute(stmt)
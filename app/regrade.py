@@ -0,0 +1,297 @@
+"""
+Re-grade semua attempt satu lab terhadap scheme terbaru (mis. setelah
+scheme diperbaiki lewat edit_scheme).
+
+client_data tiap submission disimpan terkompresi di submissions.payload.
+Submission dibaca per chunk (keyset by id) dan dinilai ulang di process pool;
+kriteria lokal dihitung ulang dari payload, sedangkan kriteria GitLab
+memakai hasil yang tersimpan di criterion_results saat submit (state GitLab
+sekarang bukan state saat itu). Hasil tersimpan hanya dipakai kalau
+fingerprint kriterianya (grading_engine.criterion_fingerprint) sama dengan
+kriteria di scheme baru; kriteria GitLab yang baru ditambahkan atau diubah
+(key, expected, success_stages, ...) dicek sekali dan hasilnya dipakai
+bersama.
+
+Hasil baru baru ditulis di akhir, dalam satu transaksi: score/feedback
+submission, score grading_results, criterion_results dan best_results lab
+itu. Kalau job gagal di tengah jalan, database tidak berubah.
+
+CLI: python -m app.regrade <lab_id> [scheme_dir]
+"""
+import json
+import multiprocessing
+import os
+import sys
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from sqlalchemy import bindparam, delete, func, insert, select, update
+
+from . import best_results, grading_engine, grading_jobs
+from .database import engine
+from .logging_setup import get_logger
+from .models import CriterionResult, GradingResult, Submission
+
+log = get_logger(__name__)
+
+REGRADE_WORKERS = int(os.getenv("REGRADE_WORKERS", str(min(4, os.cpu_count() or 1))))
+REGRADE_CHUNK_SIZE = int(os.getenv("REGRADE_CHUNK_SIZE", "500"))
+PAYLOAD_COMPRESS_LEVEL = 6
+REGRADE_JOB_USER = "regrade"  # username di grading_jobs untuk job re-grade
+SWAP_BATCH_SIZE = 1000
+
+_submissions = Submission.__table__
+_members = GradingResult.__table__
+_criteria = CriterionResult.__table__
+
+
+def pack_payload(client_data):
+    """
+    client_data -> bytes (JSON kompak, zlib) untuk submissions.payload.
+    """
+    raw = json.dumps(client_data, separators=(",", ":"), sort_keys=True, default=str)
+    return zlib.compress(raw.encode("utf-8"), PAYLOAD_COMPRESS_LEVEL)
+
+
+def unpack_payload(payload):
+    if not payload:
+        return None
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+
+def _score_chunk(lab_id, scheme, rows, shared_remote):
+    """
+    Jalan di proses pool: nilai ulang satu chunk. Tidak menyentuh database.
+    rows: (submission_id, class_name, payload, duration, score lama,
+    {criterion_index: (fingerprint, passed, message)} kriteria GitLab tersimpan).
+    """
+    plan = grading_engine.compile_scheme(lab_id, scheme)
+    scored = []
+    for submission_id, class_name, payload, duration, old_score, stored in rows:
+        client_data = unpack_payload(payload)
+        outcomes = []
+        for step in plan:
+            previous = stored.get(step.index) if step.remote else None
+            if previous is not None and previous[0] == step.fingerprint:
+                passed, actual_value = previous[1], previous[2]
+            elif step.remote:
+                passed, actual_value = shared_remote[step.index]
+            else:
+                passed, actual_value = step.fn(client_data)
+            outcomes.append(grading_engine.Outcome(step, passed, actual_value))
+
+        summary = grading_engine.summarize(outcomes)
+        score, _ = grading_engine.apply_time_penalty(summary["score"], duration)
+        scored.append({
+            "id": submission_id,
+            "class_name": class_name,
+            "score": score,
+            "old_score": old_score,
+            "feedback": ", ".join(summary["feedback"]),
+            "criteria": summary["criteria"],
+        })
+    return scored
+
+
+def _chunks(lab_id, max_id, chunk_size, remote_indexes):
+    """
+    Submission lab ini yang punya payload, per chunk urut id (keyset).
+    """
+    last_id = 0
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(
+                    _submissions.c.id, _submissions.c.class_name, _submissions.c.payload,
+                    _submissions.c.duration, _submissions.c.score,
+                )
+                .where(
+                    _submissions.c.lab_id == lab_id,
+                    _submissions.c.payload.isnot(None),
+                    _submissions.c.id > last_id,
+                    _submissions.c.id <= max_id,
+                )
+                .order_by(_submissions.c.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                return
+
+            stored = {}
+            if remote_indexes:
+                for row in conn.execute(
+                    select(
+                        _criteria.c.submission_id, _criteria.c.criterion_index,
+                        _criteria.c.fingerprint, _criteria.c.passed, _criteria.c.message,
+                    ).where(
+                        _criteria.c.submission_id.in_([row.id for row in rows]),
+                        _criteria.c.criterion_index.in_(remote_indexes),
+                    )
+                ):
+                    stored.setdefault(row.submission_id, {})[row.criterion_index] = (
+                        row.fingerprint, row.passed, row.message,
+                    )
+
+        yield [
+            (row.id, row.class_name, row.payload, row.duration, row.score, stored.get(row.id, {}))
+            for row in rows
+        ]
+        last_id = rows[-1].id
+
+
+def _batched(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _swap(lab_id, scored):
+    """
+    Tulis semua hasil baru dalam satu transaksi.
+    """
+    with engine.begin() as conn:
+        for batch in _batched(scored, SWAP_BATCH_SIZE):
+            params = [
+                {"b_id": item["id"], "b_score": item["score"], "b_feedback": item["feedback"]}
+                for item in batch
+            ]
+            conn.execute(
+                update(_submissions)
+                .where(_submissions.c.id == bindparam("b_id"))
+                .values(score=bindparam("b_score"), feedback=bindparam("b_feedback")),
+                params,
+            )
+            conn.execute(
+                update(_members)
+                .where(_members.c.submission_id == bindparam("b_id"))
+                .values(score=bindparam("b_score")),
+                params,
+            )
+
+            conn.execute(delete(_criteria).where(_criteria.c.submission_id.in_([item["id"] for item in batch])))
+            criterion_rows = [
+                {
+                    "submission_id": item["id"],
+                    "criterion_index": index,
+                    "lab_id": lab_id,
+                    "class_name": item["class_name"],
+                    "type": ctype,
+                    "passed": passed,
+                    "message": message,
+                    "fingerprint": fingerprint,
+                }
+                for item in batch
+                for index, ctype, passed, message, fingerprint in item["criteria"]
+            ]
+            if criterion_rows:
+                conn.execute(insert(_criteria), criterion_rows)
+
+        # Attempt yang masuk selama re-grade sudah dinilai dengan scheme baru,
+        # jadi best_results bisa dibangun ulang dari seluruh grading_results
+        best_results.rebuild_lab(conn, lab_id)
+
+
+def regrade_lab(lab_id, scheme, progress=None, workers=None, chunk_size=None):
+    """
+    Nilai ulang semua submission lab_id terhadap scheme. progress(done, total)
+    dipanggil setiap satu chunk selesai. Return ringkasan (dict).
+    """
+    workers = workers or REGRADE_WORKERS
+    chunk_size = chunk_size or REGRADE_CHUNK_SIZE
+
+    plan = grading_engine.compile_scheme(lab_id, scheme)
+    remote_steps = {step.index: step for step in plan if step.remote}
+
+    # Snapshot: attempt setelah ini sudah memakai scheme baru
+    with engine.connect() as conn:
+        lab_filter = _submissions.c.lab_id == lab_id
+        max_id = conn.execute(select(func.max(_submissions.c.id)).where(lab_filter)).scalar() or 0
+        total = conn.execute(
+            select(func.count()).where(lab_filter, _submissions.c.id <= max_id, _submissions.c.payload.isnot(None))
+        ).scalar()
+        skipped = conn.execute(
+            select(func.count()).where(lab_filter, _submissions.c.id <= max_id, _submissions.c.payload.is_(None))
+        ).scalar()
+
+    log.info("Regrade started", extra={"lab_id": lab_id, "submissions": total, "skipped": skipped})
+
+    scored = []
+    shared_remote = {}
+    done = 0
+
+    def collect(futures):
+        nonlocal done
+        for future in futures:
+            chunk = future.result()
+            scored.extend(chunk)
+            done += len(chunk)
+        if progress is not None:
+            progress(done, total)
+
+    if progress is not None:
+        progress(0, total)
+
+    # spawn: jangan fork worker gunicorn yang punya thread & koneksi DB
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = set()
+        for rows in _chunks(lab_id, max_id, chunk_size, list(remote_steps)):
+            missing = {
+                index
+                for *_, stored in rows
+                for index, step in remote_steps.items()
+                if stored.get(index, (None,))[0] != step.fingerprint
+            }
+            for index in missing - shared_remote.keys():
+                shared_remote[index] = remote_steps[index].fn(None)
+
+            pending.add(pool.submit(_score_chunk, lab_id, scheme, rows, dict(shared_remote)))
+            # Batasi chunk yang antri supaya memori tidak ikut besar
+            if len(pending) >= workers * 2:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+        finished, _ = wait(pending)
+        collect(finished)
+
+    _swap(lab_id, scored)
+
+    changed = sum(1 for item in scored if item["score"] != item["old_score"])
+    summary = {"lab_id": lab_id, "regraded": len(scored), "changed": changed, "skipped": skipped}
+    log.info("Regrade finished", extra=summary)
+    return summary
+
+
+def _job(lab_id, scheme):
+    summary = regrade_lab(
+        lab_id, scheme,
+        progress=lambda done, total: grading_jobs.report_progress(done=done, total=total),
+    )
+    return summary, 200
+
+
+def submit(lab_id, scheme):
+    """
+    Jalankan re-grade di pool grading_jobs. Return job_id.
+    """
+    return grading_jobs.submit(lab_id, REGRADE_JOB_USER, _job, lab_id, scheme)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("usage: python -m app.regrade <lab_id> [scheme_dir]")
+        return 2
+
+    lab_id = argv[0]
+    scheme_dir = argv[1] if len(argv) > 1 else os.getenv("SCHEME_PATH", "/opt/grading/app/schemes/")
+    with open(os.path.join(scheme_dir, f"{lab_id}.json")) as f:
+        scheme = json.load(f)
+
+    def progress(done, total):
+        print(f"{done}/{total}", flush=True)
+
+    print(json.dumps(regrade_lab(lab_id, scheme, progress=progress)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import os
+import json
+import threading
+
+from .logging_setup import get_logger
+
+log = get_logger(__name__)
+
+
+class SchemeRegistry:
+    """
+    Cache skema lab (file JSON di scheme_path) per proses.
+
+    Setiap file hanya di-parse sekali; entry dianggap basi kalau mtime/size
+    file berubah, atau kalau di-invalidate manual setelah create/edit/delete.
+    Objek yang dikembalikan dipakai bersama, jadi jangan diubah di tempat.
+    """
+
+    def __init__(self, scheme_path):
+        self.scheme_path = scheme_path
+        self._lock = threading.Lock()
+        self._entries = {}       # lab_id -> (mtime_ns, size, scheme)
+        self._listing = None     # (dir_mtime_ns, [lab_id, ...])
+
+    def path_for(self, lab_id):
+        return os.path.join(self.scheme_path, f"{lab_id}.json")
+
+    def get(self, lab_id):
+        """
+        Ambil skema lab_id, atau None kalau file tidak ada.
+        """
+        if not lab_id:
+            return None
+
+        path = self.path_for(lab_id)
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.invalidate(lab_id)
+            return None
+
+        with self._lock:
+            entry = self._entries.get(lab_id)
+        if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            return entry[2]
+
+        with open(path, "r") as f:
+            scheme = json.load(f)
+
+        with self._lock:
+            self._entries[lab_id] = (st.st_mtime_ns, st.st_size, scheme)
+        return scheme
+
+    def exists(self, lab_id):
+        return self.get(lab_id) is not None
+
+    def lab_ids(self):
+        """
+        Daftar lab_id (nama file tanpa .json); listing direktori di-cache
+        selama mtime direktori tidak berubah.
+        """
+        try:
+            dir_mtime = os.stat(self.scheme_path).st_mtime_ns
+        except OSError:
+            return []
+
+        with self._lock:
+            if self._listing and self._listing[0] == dir_mtime:
+                return list(self._listing[1])
+
+        lab_ids = sorted(
+            filename[:-len(".json")]
+            for filename in os.listdir(self.scheme_path)
+            if filename.endswith(".json")
+        )
+        with self._lock:
+            self._listing = (dir_mtime, lab_ids)
+        return list(lab_ids)
+
+    def all(self):
+        """
+        List (lab_id, scheme) untuk semua file skema.
+        """
+        items = []
+        for lab_id in self.lab_ids():
+            try:
+                scheme = self.get(lab_id)
+            except (OSError, ValueError) as e:
+                log.warning("Error loading scheme", extra={"lab_id": lab_id, "error": str(e)})
+                continue
+            if scheme is not None:
+                items.append((lab_id, scheme))
+        return items
+
+    def write(self, lab_id, scheme):
+        """
+        Tulis skema ke file lalu segarkan cache.
+        """
+        path = self.path_for(lab_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(scheme, f, indent=4)
+        os.replace(tmp_path, path)
+        self.invalidate(lab_id)
+        return path
+
+    def delete(self, lab_id):
+        os.remove(self.path_for(lab_id))
+        self.invalidate(lab_id)
+
+    def invalidate(self, lab_id=None):
+        with self._lock:
+            if lab_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(lab_id, None)
+            self._listing = None
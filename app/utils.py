@@ -1,127 +1,105 @@
-import subprocess
+import logging
 import os
-import requests
-import urllib.parse
+import threading
+import time
+from concurrent.futures import Future
 
-GITLAB_URL = os.getenv("GITLAB_URL")
-GITLAB_TOKEN = os.getenv("GITLAB_TOKEN")
+from .gitlab_client import get_client
+from .logging_setup import get_logger
+from . import project_cache, pipeline_store
 
+log = get_logger(__name__)
 
-def check_gitlab_project(path_with_namespace: str):
+PIPELINE_FETCH_TTL = float(os.getenv("PIPELINE_FETCH_TTL", "5"))
+
+# Single-flight + cache singkat untuk get_latest_pipeline_and_jobs
+_pipeline_fetch_lock = threading.Lock()
+_pipeline_inflight = {}   # (project_id, ref) -> Future
+_pipeline_recent = {}     # (project_id, ref) -> (expires_monotonic, result)
+
+
+def resolve_gitlab_project(path_with_namespace: str):
     """
-    Cek apakah project dengan path_with_namespace tertentu ada di GitLab.
-    Contoh path_with_namespace: 'kelompokx-sijax/build-image-kelompokx-sijax'
+    Resolusi path_with_namespace -> project_id dengan satu GET, lewat
+    project_cache (dibagi antar worker). Return (project_id, msg);
+    project_id None kalau project tidak ada atau terjadi error.
     """
-    gitlab_url = os.getenv("GITLAB_URL")
-    gitlab_token = os.getenv("GITLAB_TOKEN")
+    cached = project_cache.lookup(path_with_namespace)
+    if cached is not None:
+        return cached
 
-    if not gitlab_token or not gitlab_url:
-        return False, "GitLab env not set"
+    client = get_client()
+    if not client.configured:
+        return None, "GitLab env not set"
 
-    headers = {"PRIVATE-TOKEN": gitlab_token}
-
-    encoded = urllib.parse.quote(path_with_namespace, safe="")
-    url = f"{gitlab_url.rstrip('/')}/api/v4/projects/{encoded}"
+    path = client.project_path(path_with_namespace)
 
     try:
-        r = requests.get(url, headers=headers, timeout=10)
-        print(
-            "DEBUG check_gitlab_project:",
-            "url=", url,
-            "status=", r.status_code,
-            "text=", r.text[:200],
-            flush=True
-        )
+        # 500 dari endpoint ini persisten (bug GitLab), jadi tidak di-retry
+        # dan langsung pakai fallback search di bawah
+        r = client.get(path, retry_statuses=(429, 502, 503, 504))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("GitLab project lookup", extra={
+                "url": r.url, "status": r.status_code, "body": r.text[:200],
+            })
 
         if r.status_code == 200:
-            return True, "project_exists"
+            project_id = r.json().get("id")
+            project_cache.store(path_with_namespace, project_id)
+            return project_id, "ok"
         elif r.status_code == 404:
-            return False, "project_not_found"
+            project_cache.store(path_with_namespace, None, "project_not_found")
+            return None, "project_not_found"
         elif r.status_code == 500:
             # Workaround: fallback pakai search
-            search_url = f"{gitlab_url.rstrip('/')}/api/v4/projects"
             ns, _, name = path_with_namespace.partition("/")
             params = {"search": name}
-            r2 = requests.get(search_url, headers=headers, params=params, timeout=10)
-            print(
-                "DEBUG fallback search:",
-                "url=", search_url,
-                "status=", r2.status_code,
-                "text=", r2.text[:200],
-                flush=True
-            )
+            r2 = client.get("projects", params=params)
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("GitLab project search fallback", extra={
+                    "url": r2.url, "status": r2.status_code, "body": r2.text[:200],
+                })
 
             if r2.status_code != 200:
-                return False, f"GitLab API error {r2.status_code}"
+                return None, f"GitLab API error {r2.status_code}"
 
             for proj in r2.json():
                 if proj.get("path_with_namespace") == path_with_namespace:
-                    return True, "project_exists"
+                    project_cache.store(path_with_namespace, proj.get("id"))
+                    return proj.get("id"), "ok"
 
-            return False, "project_not_found"
+            project_cache.store(path_with_namespace, None, "project_not_found")
+            return None, "project_not_found"
         else:
-            return False, f"GitLab API error {r.status_code}"
+            return None, f"GitLab API error {r.status_code}"
     except Exception as e:
-        return False, str(e)
+        log.warning("GitLab project lookup failed", extra={"project": path_with_namespace, "error": str(e)})
+        return None, str(e)
 
 
-def get_gitlab_project_id(path_with_namespace: str):
+def check_gitlab_project(path_with_namespace: str):
     """
-    Ambil project_id dari path_with_namespace.
+    Cek apakah project dengan path_with_namespace tertentu ada di GitLab.
+    Contoh path_with_namespace: 'kelompokx-sijax/build-image-kelompokx-sijax'
     """
-    ok, msg = check_gitlab_project(path_with_namespace)
-    if not ok:
-        return None, msg
-
-    gitlab_url = os.getenv("GITLAB_URL")
-    gitlab_token = os.getenv("GITLAB_TOKEN")
-    headers = {"PRIVATE-TOKEN": gitlab_token}
+    project_id, msg = resolve_gitlab_project(path_with_namespace)
+    if project_id is None:
+        return False, msg
+    return True, "project_exists"
 
-    encoded = urllib.parse.quote(path_with_namespace, safe="")
-    url = f"{gitlab_url.rstrip('/')}/api/v4/projects/{encoded}"
 
-    try:
-        r = requests.get(url, headers=headers, timeout=10)
-        if r.status_code != 200:
-            return None, f"GitLab API error {r.status_code}"
-        return r.json().get("id"), "ok"
-    except Exception as e:
-        return None, str(e)
+def get_gitlab_project_id(path_with_namespace: str):
+    """
+    Ambil project_id dari path_with_namespace.
+    """
+    return resolve_gitlab_project(path_with_namespace)
 
 
 def check_gitlab_pipeline(project_id, ref="main"):
-    if not GITLAB_TOKEN or not GITLAB_URL:
-        return False, "GitLab env not set"
-
-    base = GITLAB_URL.rstrip('/')
-    headers = {"PRIVATE-TOKEN": GITLAB_TOKEN}
-
-    # pipeline terbaru
-    r = requests.get(
-        f"{base}/api/v4/projects/{project_id}/pipelines",
-        headers=headers,
-        params={"ref": ref, "per_page": 1},
-        timeout=10,
-    )
-    if r.status_code != 200:
-        return False, f"GitLab API error {r.status_code}"
-
-    data = r.json()
-    if not data:
-        return False, "No pipeline found"
-
-    pipeline_id = data[0]["id"]
-
-    # jobs di pipeline itu
-    r2 = requests.get(
-        f"{base}/api/v4/projects/{project_id}/pipelines/{pipeline_id}/jobs",
-        headers=headers,
-        timeout=10,
-    )
-    if r2.status_code != 200:
-        return False, f"GitLab API error {r2.status_code} (jobs)"
+    pipeline, jobs, msg = get_latest_pipeline_and_jobs(project_id, ref=ref)
+    if jobs is None:
+        return False, msg
 
-    jobs = r2.json()
     for job in jobs:
         if job.get("name") == "build-image":
             status = job.get("status")
@@ -132,19 +110,65 @@ def check_gitlab_pipeline(project_id, ref="main"):
 def get_latest_pipeline_and_jobs(project_id, ref="main"):
     """
     Ambil pipeline terbaru + list jobs-nya.
+
+    Request bersamaan untuk (project_id, ref) yang sama digabung jadi satu
+    fetch (single-flight), dan hasil yang berhasil dipakai ulang selama
+    PIPELINE_FETCH_TTL detik, jadi semua kriteria dalam satu grade dan
+    anggota grup yang submit bersamaan berbagi satu hasil.
+    Return (pipeline, jobs, msg); jangan ubah objek yang dikembalikan.
     """
-    if not GITLAB_TOKEN or not GITLAB_URL:
-        return None, None, "GitLab env not set"
+    key = (str(project_id), ref)
+    with _pipeline_fetch_lock:
+        recent = _pipeline_recent.get(key)
+        if recent and recent[0] > time.monotonic():
+            return recent[1]
+        future = _pipeline_inflight.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _pipeline_inflight[key] = future
+
+    if not owner:
+        return future.result()
 
-    base = GITLAB_URL.rstrip('/')
-    headers = {"PRIVATE-TOKEN": GITLAB_TOKEN}
+    try:
+        result = _fetch_latest_pipeline_and_jobs(project_id, ref)
+    except BaseException as e:
+        with _pipeline_fetch_lock:
+            _pipeline_inflight.pop(key, None)
+        future.set_exception(e)
+        raise
+
+    with _pipeline_fetch_lock:
+        _pipeline_inflight.pop(key, None)
+        now = time.monotonic()
+        for k in [k for k, (expires, _) in _pipeline_recent.items() if expires <= now]:
+            del _pipeline_recent[k]
+        # Error API tidak di-cache, supaya grade berikutnya langsung retry
+        pipeline, jobs, msg = result
+        if msg in ("ok", "No pipeline found"):
+            _pipeline_recent[key] = (now + PIPELINE_FETCH_TTL, result)
+    future.set_result(result)
+    return result
+
+def _fetch_latest_pipeline_and_jobs(project_id, ref):
+    """
+    Data webhook di pipeline_store dipakai dulu; GitLab API hanya dipolling
+    kalau store tidak punya data yang segar.
+    """
+    stored = pipeline_store.get_latest_pipeline(project_id, ref=ref)
+    if stored is not None:
+        pipeline, jobs = stored
+        return pipeline, jobs, "ok"
+
+    client = get_client()
+    if not client.configured:
+        return None, None, "GitLab env not set"
 
     # pipeline terbaru
-    r = requests.get(
-        f"{base}/api/v4/projects/{project_id}/pipelines",
-        headers=headers,
+    r = client.get(
+        f"projects/{project_id}/pipelines",
         params={"ref": ref, "per_page": 1},
-        timeout=10
     )
     if r.status_code != 200:
         return None, None, f"GitLab API error {r.status_code} (pipelines)"
@@ -157,11 +181,7 @@ def get_latest_pipeline_and_jobs(project_id, ref="main"):
     pipeline_id = pipeline["id"]
 
     # jobs di pipeline itu
-    r2 = requests.get(
-        f"{base}/api/v4/projects/{project_id}/pipelines/{pipeline_id}/jobs",
-        headers=headers,
-        timeout=10
-    )
+    r2 = client.get(f"projects/{project_id}/pipelines/{pipeline_id}/jobs")
     if r2.status_code != 200:
         return pipeline, None, f"GitLab API error {r2.status_code} (jobs)"
 
@@ -192,131 +212,39 @@ def check_gitlab_runner(path_with_namespace: str, expected_name: str, ref="main"
 
     return False, "job_not_found"
 
-def check_gitlab_pipeline_two_success(project_id, ref="main"):
-    if not GITLAB_TOKEN or not GITLAB_URL:
-        return False, "GitLab env not set"
-
-    base = GITLAB_URL.rstrip('/')
-    headers = {"PRIVATE-TOKEN": GITLAB_TOKEN}
-
-    r = requests.get(
-        f"{base}/api/v4/projects/{project_id}/pipelines",
-        headers=headers,
-        params={"ref": ref, "per_page": 1},
-        timeout=10,
-    )
-    if r.status_code != 200:
-        return False, f"GitLab API error {r.status_code}"
-
-    data = r.json()
-    if not data:
-        return False, "No pipeline found"
-
-    pipeline_id = data[0]["id"]
-
-    r2 = requests.get(
-        f"{base}/api/v4/projects/{project_id}/pipelines/{pipeline_id}/jobs",
-        headers=headers,
-        timeout=10,
-    )
-    if r2.status_code != 200:
-        return False, f"GitLab API error {r2.status_code} (jobs)"
-
-    jobs = r2.json()
-    success_jobs = [
-        j for j in jobs
-        if j.get("status") == "success" and j.get("stage") in ("staging", "production")
-    ]
-    count = len(success_jobs)
-
-    return count >= 2, f"success_jobs={count}"
-
-def check_gitlab_pipeline_min_success(project_id, ref="main", min_count=3):
-    if not GITLAB_TOKEN or not GITLAB_URL:
-        return False, "GitLab env not set"
-
-    base = GITLAB_URL.rstrip('/')
-    headers = {"PRIVATE-TOKEN": GITLAB_TOKEN}
-
-    r = requests.get(
-        f"{base}/api/v4/projects/{project_id}/pipelines",
-        headers=headers,
-        params={"ref": ref, "per_page": 1},
-        timeout=10,
-    )
-    if r.status_code != 200:
-        return False, f"GitLab API error {r.status_code}"
-
-    data = r.json()
-    if not data:
-        return False, "No pipeline found"
-
-    pipeline_id = data[0]["id"]
-
-    r2 = requests.get(
-        f"{base}/api/v4/projects/{project_id}/pipelines/{pipeline_id}/jobs",
-        headers=headers,
-        timeout=10,
-    )
-    if r2.status_code != 200:
-        return False, f"GitLab API error {r2.status_code} (jobs)"
+def check_gitlab_pipeline_success_count(project_id, ref="main", stages=("build", "staging", "production"), min_count=3):
+    """
+    Minimal min_count job sukses di stage-stage tertentu pada pipeline terbaru.
+    Aturannya diambil dari field success_stages/min_success di scheme.
+    """
+    pipeline, jobs, msg = get_latest_pipeline_and_jobs(project_id, ref=ref)
+    if jobs is None:
+        return False, msg
 
-    jobs = r2.json()
-    # Filter job yang sukses di stage build, staging, atau production
     success_jobs = [
         j for j in jobs
-        if j.get("status") == "success" and j.get("stage") in ("build", "staging", "production")
+        if j.get("status") == "success" and j.get("stage") in stages
     ]
     count = len(success_jobs)
 
     return count >= min_count, f"success_jobs={count}"
 
 def validate_results(scheme, user_results):
+    """
+    Nilai user_results terhadap scheme dengan engine yang sama seperti
+    /grade-lab. Return (total_score, feedback kriteria yang gagal).
+    """
+    from .grading_engine import get_plan, run_plan
+
     total_score = 0
     feedback = []
 
-    for criterion in scheme["criteria"]:
-        ctype = criterion["type"]
-
-        if ctype == "command":
-            output = subprocess.getoutput(criterion["command"])
-            if criterion["expected"] in output:
-                total_score += criterion["score"]
-            else:
-                feedback.append(criterion["description"])
-
-        elif ctype == "file":
-            try:
-                with open(criterion["path"], "r") as f:
-                    content = f.read()
-                    if criterion["contains"] in content:
-                        total_score += criterion["score"]
-                    else:
-                        feedback.append(criterion["description"])
-            except FileNotFoundError:
-                feedback.append(f"File {criterion['path']} not found")
-
-        elif ctype == "gitlab_project":
-            ok, msg = check_gitlab_project(criterion["key"])
-            if ok:
-                total_score += criterion["score"]
-            else:
-                feedback.append(f"{criterion['description']} ({msg})")
-
-        elif ctype == "gitlab_pipeline":
-            # pakai 'key' = path_with_namespace, bukan project_id manual
-            project_id, msg = get_gitlab_project_id(criterion["key"])
-            if not project_id:
-                feedback.append(f"{criterion['description']} ({msg})")
-                continue
-
-            ok, msg2 = check_gitlab_pipeline(
-                project_id=project_id,
-                ref=criterion.get("ref", "main"),
-            )
-            if ok:
-                total_score += criterion["score"]
-            else:
-                feedback.append(f"{criterion['description']} ({msg2})")
+    for outcome in run_plan(get_plan(scheme.get("lab_id"), scheme), user_results or {}):
+        if outcome.passed:
+            total_score += outcome.score
+        elif outcome.type and outcome.type.startswith("gitlab_"):
+            feedback.append(f"{outcome.description} ({outcome.actual_value})")
+        else:
+            feedback.append(outcome.description)
 
     return total_score, feedback
@@ -0,0 +1,218 @@
+"""
+GitLab API palsu untuk benchmark offline.
+
+Melayani bentuk respons yang dipakai app/utils.py:
+    GET /api/v4/projects/<id atau path URL-encoded>
+    GET /api/v4/projects?search=<nama>
+    GET /api/v4/projects/<id>/pipelines?ref=...&per_page=1
+    GET /api/v4/projects/<id>/pipelines/<pipeline_id>/jobs
+Latency dan error rate bisa diatur. Jumlah request per endpoint ada di
+GET /_stats.
+
+Jalan sendiri: python -m bench.fake_gitlab --port 8929 --latency-ms 80 --error-rate 0.02
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def project_id_for(path_with_namespace):
+    # Stabil antar run, supaya cache project di DB tetap konsisten
+    return zlib.crc32(path_with_namespace.encode("utf-8")) % 1000000 + 1
+
+
+class FakeGitLab:
+    """
+    Server GitLab palsu di thread background.
+
+    latency_ms/jitter_ms: delay tiap respons (jitter uniform 0..jitter_ms).
+    error_rate: peluang respons error_status (default 503, ikut di-retry client).
+    job_fail_rate: peluang satu job pipeline berstatus "failed".
+    missing_rate: peluang project tidak ada (404), ditentukan per path.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=50, jitter_ms=20,
+                 error_rate=0.0, error_status=503, job_fail_rate=0.1,
+                 missing_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.job_fail_rate = job_fail_rate
+        self.missing_rate = missing_rate
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self._paths = {}  # project_id -> path_with_namespace
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                status, body = fake.handle(self.path)
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-gitlab", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _roll(self, probability):
+        with self._random_lock:
+            return self._random.random() < probability
+
+    def _delay(self):
+        with self._random_lock:
+            jitter = self._random.uniform(0, self.jitter_ms) if self.jitter_ms else 0
+        if self.latency_ms or jitter:
+            time.sleep((self.latency_ms + jitter) / 1000)
+
+    def _count(self, endpoint, status):
+        key = f"{endpoint} {status}"
+        with self._stats_lock:
+            self._stats[key] = self._stats.get(key, 0) + 1
+
+    def _project(self, ref):
+        path = urllib.parse.unquote(ref)
+        if path.isdigit():
+            project_id = int(path)
+            path = self._paths.get(project_id, f"project-{project_id}")
+        else:
+            project_id = project_id_for(path)
+            self._paths[project_id] = path
+        # Project "hilang" ditentukan dari path, jadi konsisten antar request
+        if self.missing_rate and (zlib.crc32(path.encode("utf-8")) % 10000) / 10000 < self.missing_rate:
+            return None
+        return {"id": project_id, "path_with_namespace": path, "name": path.rsplit("/", 1)[-1]}
+
+    def _jobs(self, project_id):
+        namespace = self._paths.get(project_id, "").split("/", 1)[0]
+        jobs = []
+        for job_id, (name, stage) in enumerate(
+            (("build-image", "build"), ("deploy-staging", "staging"), ("deploy-production", "production")), 1
+        ):
+            jobs.append({
+                "id": project_id * 10 + job_id,
+                "name": name,
+                "stage": stage,
+                "status": "failed" if self._roll(self.job_fail_rate) else "success",
+                "runner": {"description": f"runner-{namespace}"},
+            })
+        return jobs
+
+    def handle(self, raw_path):
+        """
+        (status, body JSON) untuk satu GET.
+        """
+        parsed = urllib.parse.urlsplit(raw_path)
+        query = urllib.parse.parse_qs(parsed.query)
+        # Path project masih URL-encoded di sini, jadi "/" di dalamnya tidak ikut terpecah
+        parts = parsed.path.strip("/").split("/")
+
+        if parts == ["_stats"]:
+            return 200, self.stats()
+        if parts[:2] != ["api", "v4"] or len(parts) < 3 or parts[2] != "projects":
+            self._count("other", 404)
+            return 404, {"message": "404 Not Found"}
+        parts = parts[3:]
+
+        if not parts:
+            endpoint = "projects"
+        elif len(parts) == 1:
+            endpoint = "projects/:id"
+        elif len(parts) == 2 and parts[1] == "pipelines":
+            endpoint = "projects/:id/pipelines"
+        elif len(parts) == 4 and parts[1] == "pipelines" and parts[3] == "jobs":
+            endpoint = "projects/:id/pipelines/:id/jobs"
+        else:
+            self._count("other", 404)
+            return 404, {"message": "404 Not Found"}
+
+        self._delay()
+        if self.error_rate and self._roll(self.error_rate):
+            self._count(endpoint, self.error_status)
+            return self.error_status, {"message": "injected error"}
+
+        if endpoint == "projects":
+            name = (query.get("search") or [""])[0]
+            projects = [
+                project for project in (self._project(path) for path in list(self._paths.values()))
+                if project and name in project["name"]
+            ]
+            status, body = 200, projects
+        elif endpoint == "projects/:id":
+            project = self._project(parts[0])
+            status, body = (200, project) if project else (404, {"message": "404 Project Not Found"})
+        elif endpoint == "projects/:id/pipelines":
+            project_id = int(parts[0]) if parts[0].isdigit() else project_id_for(urllib.parse.unquote(parts[0]))
+            ref = (query.get("ref") or ["main"])[0]
+            status, body = 200, [{"id": project_id * 100 + 1, "status": "success", "ref": ref}]
+        else:
+            project_id = int(parts[0]) if parts[0].isdigit() else project_id_for(urllib.parse.unquote(parts[0]))
+            status, body = 200, self._jobs(project_id)
+
+        self._count(endpoint, status)
+        return status, body
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GitLab API palsu untuk benchmark offline")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8929)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--job-fail-rate", type=float, default=0.1)
+    parser.add_argument("--missing-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    fake = FakeGitLab(
+        host=args.host, port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, error_status=args.error_status,
+        job_fail_rate=args.job_fail_rate, missing_rate=args.missing_rate,
+    )
+    print(f"Fake GitLab on {fake.url} (GITLAB_URL={fake.url})", flush=True)
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""
+Isi database scratch dengan data satu semester sintetis, untuk benchmark
+route laporan (bench/query_bench.py).
+
+Distribusi:
+  - kelas ~36 siswa (X/XI/XII_SIJA<n>), grup 3-4 orang per kelas
+  - tiap kelas mengerjakan sebagian besar lab (scheme ID yang ada di
+    app/schemes), satu sesi per lab per kelas, tersebar selama semester
+  - tidak semua grup submit; jumlah attempt per grup per lab geometrik
+    (rata-rata 2.5, ekor panjang sampai --max-attempts)
+  - nilai naik seiring attempt (kriteria lulus makin banyak), durasi
+    lognormal sekitar 10 menit
+  - satu submission per attempt grup, satu baris grading_results per anggota
+best_results dibangun ulang dari grading_results di akhir.
+
+Contoh (~20 ribu user, ~1.2 juta grading_results, ~35 detik):
+  python -m bench.gen_data --db /tmp/semester.sqlite --users 20000
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEME_DIR = os.path.join(ROOT, "app", "schemes")
+CLASS_SIZE = 36
+INSERT_BATCH = 20000
+TS_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def create_schema(db_path):
+    """
+    Tabel + index lewat init_db dan migrasi, persis seperti server.
+    """
+    os.environ["DATABASE_URI"] = f"sqlite:///{db_path}"
+    from app.database import init_db, engine
+    from app import migrations
+
+    init_db()
+    migrations.upgrade()
+    engine.dispose()
+
+
+def load_labs(pattern):
+    labs = []
+    for name in sorted(os.listdir(SCHEME_DIR)):
+        if not name.endswith(".json") or not name.startswith(pattern):
+            continue
+        with open(os.path.join(SCHEME_DIR, name)) as f:
+            scheme = json.load(f)
+        criteria = scheme.get("criteria", [])
+        labs.append((name[:-5], [c.get("score", 0) for c in criteria], [c.get("type") for c in criteria]))
+    return labs
+
+
+def make_users(count, rng):
+    """
+    [(username, name, class_name, group_name)]
+    """
+    users = []
+    n_classes = max(1, math.ceil(count / CLASS_SIZE))
+    for c in range(n_classes):
+        class_name = f"{('X', 'XI', 'XII')[c % 3]}_SIJA{c // 3 + 1}"
+        size = min(CLASS_SIZE, count - len(users))
+        group, left = 1, rng.choice((3, 4))
+        for _ in range(size):
+            i = len(users)
+            users.append((f"s{i:06d}", f"Siswa {i}", class_name, f"kelompok{group}"))
+            left -= 1
+            if left == 0:
+                group, left = group + 1, rng.choice((3, 4))
+    return users
+
+
+def attempts_for(rng, max_attempts):
+    # Geometrik: P(attempt berikutnya) = 0.6, rata-rata 2.5 attempt
+    n = 1
+    while n < max_attempts and rng.random() < 0.6:
+        n += 1
+    return n
+
+
+def generate(conn, users, labs, args, rng):
+    groups = {}  # class_name -> {group_name: [username]}
+    for username, _, class_name, group_name in users:
+        groups.setdefault(class_name, {}).setdefault(group_name, []).append(username)
+    classes = sorted(groups)
+
+    semester_start = datetime(2025, 7, 14, 7, 0)
+    submission_id = (conn.execute("SELECT max(id) FROM submissions").fetchone()[0] or 0) + 1
+    member_id = (conn.execute("SELECT max(id) FROM grading_results").fetchone()[0] or 0) + 1
+
+    submissions, members, criteria_rows = [], [], []
+    totals = {"submissions": 0, "grading_results": 0, "criterion_results": 0}
+
+    def flush():
+        conn.executemany(
+            "INSERT INTO submissions (id, username, class_name, group_name, lab_id, score, feedback, "
+            "timestamp, status, duration) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'done', ?)", submissions)
+        conn.executemany(
+            "INSERT INTO grading_results (id, submission_id, username, class_name, lab_id, score, timestamp) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", members)
+        if criteria_rows:
+            conn.executemany(
+                "INSERT INTO criterion_results (submission_id, criterion_index, lab_id, class_name, type, "
+                "passed, message) VALUES (?, ?, ?, ?, ?, ?, ?)", criteria_rows)
+        totals["submissions"] += len(submissions)
+        totals["grading_results"] += len(members)
+        totals["criterion_results"] += len(criteria_rows)
+        submissions.clear()
+        members.clear()
+        criteria_rows.clear()
+
+    for class_index, class_name in enumerate(classes):
+        # Tiap kelas mengerjakan sebagian besar lab, urut seperti kurikulum
+        class_labs = [lab for lab in labs if rng.random() < args.lab_coverage]
+        for lab_index, (lab_id, scores, types) in enumerate(class_labs):
+            session = (
+                semester_start
+                + timedelta(days=7 * lab_index * 18 / max(len(labs), 1) + class_index % 5)
+                + timedelta(minutes=rng.randrange(0, 8 * 60))
+            )
+            for group_name, names in groups[class_name].items():
+                if rng.random() >= args.participation:
+                    continue
+                skill = rng.betavariate(4, 2)
+                ts = session + timedelta(minutes=rng.uniform(5, 60))
+                for attempt in range(attempts_for(rng, args.max_attempts)):
+                    p = min(0.98, skill + attempt * 0.12)
+                    passed = [rng.random() < p for _ in scores]
+                    score = float(sum(s for s, ok in zip(scores, passed) if ok))
+                    duration = rng.lognormvariate(math.log(600), 0.6)
+                    feedback = ", ".join(f"Kriteria {i + 1}: Failed" for i, ok in enumerate(passed) if not ok)
+                    stamp = ts.strftime(TS_FORMAT)
+
+                    submissions.append((submission_id, rng.choice(names), class_name, group_name,
+                                        lab_id, score, feedback, stamp, duration))
+                    for username in names:
+                        members.append((member_id, submission_id, username, class_name, lab_id, score, stamp))
+                        member_id += 1
+                    if args.criterion_results:
+                        criteria_rows.extend(
+                            (submission_id, i, lab_id, class_name, types[i], ok, None if ok else "mismatch")
+                            for i, ok in enumerate(passed)
+                        )
+                    submission_id += 1
+                    ts += timedelta(minutes=rng.uniform(2, 15))
+
+                if len(members) >= INSERT_BATCH:
+                    flush()
+        print(f"  {class_index + 1}/{len(classes)} classes, {totals['grading_results'] + len(members)} grading_results",
+              end="\r", flush=True)
+    flush()
+    print()
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generator data semester sintetis (database scratch)")
+    parser.add_argument("--db", required=True, help="path database SQLite yang akan dibuat")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--labs", default="OSADM-", help="prefix scheme ID yang dipakai")
+    parser.add_argument("--lab-coverage", type=float, default=0.85, help="peluang kelas mengerjakan satu lab")
+    parser.add_argument("--participation", type=float, default=0.9, help="peluang grup submit di lab itu")
+    parser.add_argument("--max-attempts", type=int, default=25)
+    parser.add_argument("--criterion-results", action="store_true", help="isi criterion_results juga")
+    parser.add_argument("--analyze", action="store_true", help="jalankan ANALYZE di akhir")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--force", action="store_true", help="timpa file --db yang sudah ada")
+    args = parser.parse_args(argv)
+
+    db_path = os.path.abspath(args.db)
+    if os.path.exists(db_path):
+        if not args.force:
+            print(f"{db_path} already exists (use --force to overwrite)")
+            return 2
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+    rng = random.Random(args.seed)
+    labs = load_labs(args.labs)
+    if not labs:
+        print(f"No schemes matching {args.labs!r} in {SCHEME_DIR}")
+        return 2
+
+    start = time.perf_counter()
+    create_schema(db_path)
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    # Load massal: durability tidak penting untuk database scratch
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-200000")
+    conn.execute("BEGIN")
+
+    users = make_users(args.users, rng)
+    conn.executemany(
+        "INSERT INTO users (username, password, name, class_name, group_name) VALUES (?, 'bench', ?, ?, ?)",
+        [(username, name, class_name, group_name) for username, name, class_name, group_name in users],
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO labs (lab_id, scheme_path) VALUES (?, ?)",
+        [(lab_id, os.path.join(SCHEME_DIR, f"{lab_id}.json")) for lab_id, _, _ in labs],
+    )
+    print(f"{len(users)} users, {len(labs)} labs; generating attempts...")
+    totals = generate(conn, users, labs, args, rng)
+
+    from app.best_results import BACKFILL_SQL
+    conn.execute("DELETE FROM best_results")
+    conn.execute(BACKFILL_SQL)
+    conn.execute("COMMIT")
+    if args.analyze:
+        conn.execute("ANALYZE")
+    conn.close()
+
+    size_mb = os.path.getsize(db_path) / 1024 / 1024
+    print(f"{totals['submissions']} submissions, {totals['grading_results']} grading_results, "
+          f"{totals['criterion_results']} criterion_results in {time.perf_counter() - start:.1f}s "
+          f"({size_mb:.0f} MB) -> {db_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
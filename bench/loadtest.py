@@ -0,0 +1,297 @@
+"""
+Load test /start-lab, /grade-lab dan /results tanpa GitLab sungguhan.
+
+Yang dilakukan:
+  1. Siapkan direktori scratch: database SQLite baru (init_db + migrasi),
+     N user dalam grup per kelas, direktori log lab.
+  2. Jalankan GitLab palsu (bench/fake_gitlab.py) dan gunicorn app.api:app
+     yang diarahkan ke GitLab palsu dan database scratch.
+  3. N siswa simulasi (dibatasi --concurrency thread) masing-masing:
+     start-lab -> grade-lab (--attempts kali) -> results kelasnya.
+  4. Cetak throughput dan p50/p95/p99 per route, opsional JSON (--json).
+
+Contoh:
+  python -m bench.loadtest --students 120 --workers 3 --threads 4
+  python -m bench.loadtest --students 120 --workers 1 --json bench_output.txt
+  python -m bench.loadtest --latency-ms 300 --error-rate 0.05
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .fake_gitlab import FakeGitLab
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEME_DIR = os.path.join(ROOT, "app", "schemes")
+ROUTES = ("start-lab", "grade-lab", "results")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank
+    if not sorted_values:
+        return None
+    rank = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def prepare_database(env, students, group_size, classes, lab_id):
+    """
+    Buat database scratch di proses terpisah (env DATABASE_URI harus sudah
+    terpasang sebelum modul app di-import). Return list (username, class_name).
+    """
+    users = []
+    for i in range(students):
+        class_name = f"BENCH_{i % classes + 1}"
+        group = f"kelompok{i // (group_size * classes) + 1}"
+        users.append((f"bench{i:05d}", class_name, group))
+
+    script = (
+        "import json, sys\n"
+        "from app.database import init_db, engine\n"
+        "from app import migrations\n"
+        "from app.models import User, Lab\n"
+        "init_db()\n"
+        "migrations.upgrade()\n"
+        "users, lab_id, scheme_path = json.load(sys.stdin)\n"
+        "with engine.begin() as conn:\n"
+        "    conn.execute(User.__table__.insert(), [\n"
+        "        {'username': u, 'password': 'bench', 'name': u, 'class_name': c, 'group_name': g}\n"
+        "        for u, c, g in users])\n"
+        "    conn.execute(Lab.__table__.insert(), [{'lab_id': lab_id, 'scheme_path': scheme_path}])\n"
+    )
+    subprocess.run(
+        [sys.executable, "-c", script],
+        input=json.dumps([users, lab_id, os.path.join(SCHEME_DIR, f"{lab_id}.json")]),
+        text=True, env=env, cwd=ROOT, check=True, stdout=subprocess.DEVNULL,
+    )
+    return [(username, class_name) for username, class_name, _ in users]
+
+
+def client_data_for(scheme, pass_rate, rng):
+    """
+    client_data seperti yang dikirim gradingctl: tiap kriteria lokal lulus
+    dengan peluang pass_rate.
+    """
+    data = {}
+    for criterion in scheme.get("criteria", []):
+        key, ctype = criterion.get("key"), criterion.get("type")
+        if not key or (ctype or "").startswith("gitlab_"):
+            continue
+        if rng.random() >= pass_rate:
+            data[key] = "wrong"
+        elif ctype == "file_content":
+            data[key] = f"... {criterion.get('contains', '')} ..."
+        elif ctype == "config_check":
+            data[key] = "correct"
+        else:
+            data[key] = str(criterion.get("expected"))
+    return data
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {route: [] for route in ROUTES}  # (detik, status)
+
+    def add(self, route, seconds, status):
+        with self._lock:
+            self.samples[route].append((seconds, status))
+
+    def report(self, wall_seconds):
+        routes = {}
+        total = 0
+        for route, samples in self.samples.items():
+            latencies = sorted(seconds for seconds, _ in samples)
+            errors = sum(1 for _, status in samples if not (200 <= status < 300))
+            total += len(samples)
+            routes[route] = {
+                "count": len(samples),
+                "errors": errors,
+                "rps": round(len(samples) / wall_seconds, 2) if wall_seconds else None,
+                "p50_ms": _ms(percentile(latencies, 50)),
+                "p95_ms": _ms(percentile(latencies, 95)),
+                "p99_ms": _ms(percentile(latencies, 99)),
+                "max_ms": _ms(latencies[-1] if latencies else None),
+            }
+        return {
+            "wall_seconds": round(wall_seconds, 3),
+            "requests": total,
+            "throughput_rps": round(total / wall_seconds, 2) if wall_seconds else None,
+            "routes": routes,
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def run_student(base_url, username, class_name, lab_id, scheme, args, recorder, rng):
+    session = requests.Session()
+    token = f"dummy-token-{username}-{class_name}"
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def call(route, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            r = session.request(method, base_url + url, timeout=args.timeout, **kwargs)
+            status = r.status_code
+        except requests.RequestException:
+            status = 599
+        recorder.add(route, time.perf_counter() - start, status)
+
+    call("start-lab", "POST", "/start-lab", headers=headers, json={"lab_id": lab_id})
+    for _ in range(args.attempts):
+        if args.think_ms:
+            time.sleep(rng.uniform(0, args.think_ms) / 1000)
+        call("grade-lab", "POST", "/grade-lab", headers=headers, json={
+            "lab_id": lab_id,
+            "class_name": class_name,
+            "client_data": client_data_for(scheme, args.pass_rate, rng),
+        })
+    call("results", "GET", "/results", params={"class_name": class_name, "lab_id": lab_id})
+
+
+def start_server(env, port, args, log_file):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn",
+         "--workers", str(args.workers), "--threads", str(args.threads),
+         "--bind", f"127.0.0.1:{port}", "--timeout", "60", "app.api:app"],
+        cwd=ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {server.returncode}, see {log_file.name}")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/list-labs", timeout=1)
+            return server
+        except requests.RequestException:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("gunicorn did not start within 30s")
+
+
+def print_report(report, fake_stats):
+    print(f"\n{report['requests']} requests in {report['wall_seconds']}s "
+          f"({report['throughput_rps']} req/s)")
+    print(f"{'route':<10} {'count':>6} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for route, row in report["routes"].items():
+        print(f"{route:<10} {row['count']:>6} {row['errors']:>6} {row['rps'] or 0:>8} "
+              f"{row['p50_ms'] or 0:>8} {row['p95_ms'] or 0:>8} {row['p99_ms'] or 0:>8} {row['max_ms'] or 0:>8}")
+    if fake_stats:
+        print("\nFake GitLab requests:")
+        for key, count in sorted(fake_stats.items()):
+            print(f"  {key:<45} {count}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test grading API dengan GitLab palsu")
+    parser.add_argument("--students", type=int, default=60)
+    parser.add_argument("--group-size", type=int, default=3)
+    parser.add_argument("--classes", type=int, default=2)
+    parser.add_argument("--attempts", type=int, default=2, help="grade-lab per siswa")
+    parser.add_argument("--concurrency", type=int, default=20, help="siswa yang berjalan bersamaan")
+    parser.add_argument("--think-ms", type=float, default=0, help="jeda acak sebelum tiap grade-lab")
+    parser.add_argument("--pass-rate", type=float, default=0.7)
+    parser.add_argument("--lab", default="OSADM-010-2")
+    parser.add_argument("--workers", type=int, default=3, help="worker gunicorn")
+    parser.add_argument("--threads", type=int, default=4, help="thread per worker gunicorn")
+    parser.add_argument("--timeout", type=float, default=60, help="timeout request client (detik)")
+    parser.add_argument("--latency-ms", type=float, default=50, help="latency GitLab palsu")
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="peluang 503 dari GitLab palsu")
+    parser.add_argument("--job-fail-rate", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", metavar="PATH", help="tulis hasil sebagai JSON")
+    parser.add_argument("--keep", action="store_true", help="jangan hapus direktori scratch")
+    args = parser.parse_args(argv)
+
+    with open(os.path.join(SCHEME_DIR, f"{args.lab}.json")) as f:
+        scheme = json.load(f)
+
+    scratch = tempfile.mkdtemp(prefix="grading-bench-")
+    fake = FakeGitLab(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        job_fail_rate=args.job_fail_rate, seed=args.seed,
+    ).start()
+    port = _free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URI=f"sqlite:///{os.path.join(scratch, 'bench.sqlite')}",
+        SCHEME_PATH=SCHEME_DIR + os.sep,
+        LAB_LOG_DIR=os.path.join(scratch, "labs"),
+        PROMETHEUS_MULTIPROC_DIR=os.path.join(scratch, "prometheus"),
+        GITLAB_URL=fake.url,
+        GITLAB_TOKEN="bench",
+        LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"),
+        PYTHONPATH=ROOT,
+    )
+
+    server = None
+    log_path = os.path.join(scratch, "server.log")
+    try:
+        users = prepare_database(env, args.students, args.group_size, args.classes, args.lab)
+        with open(log_path, "w") as log_file:
+            server = start_server(env, port, args, log_file)
+            print(f"Scratch {scratch}; {len(users)} students, {args.workers} worker(s) x "
+                  f"{args.threads} thread(s), GitLab latency {args.latency_ms}ms "
+                  f"error rate {args.error_rate}", flush=True)
+
+            recorder = Recorder()
+            base_url = f"http://127.0.0.1:{port}"
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                futures = [
+                    pool.submit(run_student, base_url, username, class_name, args.lab, scheme,
+                                args, recorder, random.Random(args.seed + i))
+                    for i, (username, class_name) in enumerate(users)
+                ]
+                for future in futures:
+                    future.result()
+            wall = time.perf_counter() - start
+
+        report = recorder.report(wall)
+        report["config"] = {
+            key: getattr(args, key) for key in (
+                "students", "group_size", "classes", "attempts", "concurrency", "think_ms",
+                "pass_rate", "lab", "workers", "threads", "latency_ms", "jitter_ms",
+                "error_rate", "job_fail_rate", "seed",
+            )
+        }
+        report["gitlab_requests"] = fake.stats()
+        print_report(report, report["gitlab_requests"])
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"\nWrote {args.json}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        fake.stop()
+        if args.keep:
+            print(f"Scratch kept at {scratch}")
+        else:
+            shutil.rmtree(scratch, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""
+Benchmark route laporan terhadap database besar (mis. hasil bench/gen_data.py).
+
+Tiap route dipanggil lewat Flask test client (handler, query dan
+serialisasi yang sama seperti di server, tanpa jaringan): satu kali
+pemanasan, lalu --runs kali diukur. Untuk tiap route dicatat latency
+(min/p50/p95/mean/max), jumlah & waktu statement SQL, ukuran respons, dan
+EXPLAIN QUERY PLAN dari statement yang benar-benar dijalankan, termasuk
+tanda kalau ada full scan tanpa index.
+
+Hasil bisa ditulis sebagai JSON (--json) dan dibandingkan dengan hasil run
+sebelumnya (--baseline); exit code 1 kalau ada route yang p50-nya lebih
+lambat dari --max-regression kali baseline.
+
+Contoh:
+  python -m bench.gen_data --db /tmp/semester.sqlite --users 20000
+  python -m bench.query_bench --db /tmp/semester.sqlite --json base.json
+  (ubah query / index)
+  python -m bench.query_bench --db /tmp/semester.sqlite --baseline base.json
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEME_DIR = os.path.join(ROOT, "app", "schemes")
+TABLES = ("users", "labs", "submissions", "grading_results", "best_results", "criterion_results")
+
+
+def pick_params(db_path):
+    """
+    Filter yang realistis: kombinasi (kelas, lab) dengan hasil terbanyak.
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        row = conn.execute(
+            "SELECT class_name, lab_id FROM best_results GROUP BY class_name, lab_id "
+            "ORDER BY count(*) DESC LIMIT 1"
+        ).fetchone()
+        if row is None:
+            row = conn.execute("SELECT class_name, (SELECT lab_id FROM labs LIMIT 1) FROM users LIMIT 1").fetchone()
+        name = conn.execute("SELECT name FROM users WHERE class_name = ? LIMIT 1", (row[0],)).fetchone()
+    finally:
+        conn.close()
+    return {"class_name": row[0], "lab_id": row[1], "search_name": name[0] if name else "a"}
+
+
+def route_cases(params):
+    """
+    (nama, url) yang diukur.
+    """
+    class_lab = f"class_name={params['class_name']}&lab_id={params['lab_id']}"
+    return [
+        ("show_results", f"/results?{class_lab}"),
+        ("show_results (search)", f"/results?{class_lab}&search_name={params['search_name']}"),
+        ("show_results (unfiltered)", "/results"),
+        ("download_results", f"/download-results?{class_lab}"),
+        ("users_not_started_lab_filtered", f"/users-not-started-lab-filtered?{class_lab}"),
+        ("users_not_started_lab", f"/users-not-started-lab?lab_id={params['lab_id']}"),
+        ("get_filters", "/get-filters"),
+        ("get_users_and_labs", "/get-users-and-labs"),
+    ]
+
+
+def table_counts(db_path):
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        counts = {}
+        for table in TABLES:
+            try:
+                counts[table] = conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+            except sqlite3.OperationalError:
+                counts[table] = None
+        return counts
+    finally:
+        conn.close()
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10,
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank
+    rank = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def full_scans(details):
+    """
+    Baris plan yang membaca seluruh tabel tanpa index (subquery/CTE
+    hasil materialisasi, mis. "SCAN anon_1", tidak dihitung).
+    """
+    return [
+        d for d in details
+        if d.startswith("SCAN ") and "INDEX" not in d
+        and not d.startswith(("SCAN CONSTANT ROW", "SCAN anon_", "SCAN (subquery"))
+    ]
+
+
+class StatementCapture:
+    """
+    Catat statement SQL (beserta parameter dan waktunya) lewat event engine.
+    """
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.active = False
+        self.statements = []  # (sql, parameters, detik)
+        self._pending = {}
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active:
+            self._pending[id(cursor)] = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        start = self._pending.pop(id(cursor), None)
+        if self.active and start is not None:
+            self.statements.append((statement, parameters, time.perf_counter() - start))
+
+    def reset(self):
+        self.statements = []
+        self._pending.clear()
+
+
+def explain(engine, statements):
+    """
+    EXPLAIN QUERY PLAN untuk statement SELECT yang unik.
+    """
+    plans = []
+    seen = set()
+    with engine.connect() as conn:
+        for sql, parameters, _ in statements:
+            if sql in seen or not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+                continue
+            seen.add(sql)
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", parameters).all()
+            details = [row[-1] for row in rows]
+            plans.append({"sql": " ".join(sql.split()), "plan": details, "full_scans": full_scans(details)})
+    return plans
+
+
+def run(args):
+    # Env harus terpasang sebelum modul app di-import
+    db_path = os.path.abspath(args.db)
+    os.environ["DATABASE_URI"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("SCHEME_PATH", SCHEME_DIR + os.sep)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("LAB_LOG_DIR", os.path.join(os.path.dirname(db_path), "bench-labs"))
+    if not args.count_cache:
+        # Tanpa cache COUNT(*) /results, supaya tiap run mengukur query sebenarnya
+        os.environ["RESULTS_COUNT_TTL"] = "0"
+
+    from app.api import app
+    from app.database import engine
+
+    params = pick_params(db_path)
+    client = app.test_client()
+    capture = StatementCapture(engine)
+
+    routes = {}
+    for name, url in route_cases(params):
+        if args.only and not any(part in name for part in args.only):
+            continue
+        client.get(url).get_data()  # pemanasan (cache halaman SQLite, plan cache)
+
+        timings, sql_counts, sql_seconds = [], [], []
+        status = size = None
+        for _ in range(args.runs):
+            capture.reset()
+            capture.active = True
+            start = time.perf_counter()
+            response = client.get(url)
+            body = response.get_data()  # termasuk respons streaming (CSV)
+            timings.append(time.perf_counter() - start)
+            capture.active = False
+            status, size = response.status_code, len(body)
+            sql_counts.append(len(capture.statements))
+            sql_seconds.append(sum(seconds for _, _, seconds in capture.statements))
+
+        timings.sort()
+        routes[name] = {
+            "url": url,
+            "status": status,
+            "response_bytes": size,
+            "runs": args.runs,
+            "min_ms": round(timings[0] * 1000, 2),
+            "p50_ms": round(percentile(timings, 50) * 1000, 2),
+            "p95_ms": round(percentile(timings, 95) * 1000, 2),
+            "mean_ms": round(sum(timings) / len(timings) * 1000, 2),
+            "max_ms": round(timings[-1] * 1000, 2),
+            "sql_statements": max(sql_counts),
+            "sql_ms": round(sorted(sql_seconds)[len(sql_seconds) // 2] * 1000, 2),
+            "plans": explain(engine, capture.statements),
+        }
+        print(f"{name:<32} p50 {routes[name]['p50_ms']:>9.2f} ms  p95 {routes[name]['p95_ms']:>9.2f} ms  "
+              f"sql {routes[name]['sql_statements']:>3}  {size} bytes", flush=True)
+
+    return {
+        "meta": {
+            "db": db_path,
+            "db_bytes": os.path.getsize(db_path),
+            "rows": table_counts(db_path),
+            "params": params,
+            "sqlite_version": sqlite3.sqlite_version,
+            "python": platform.python_version(),
+            "git": git_revision(),
+            "count_cache": args.count_cache,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "routes": routes,
+    }
+
+
+def compare(result, baseline, max_regression):
+    """
+    Cetak perbandingan p50 dengan baseline. Return list route yang regresi.
+    """
+    regressions = []
+    print(f"\n{'route':<32} {'base p50':>10} {'p50':>10} {'ratio':>7}")
+    for name, row in result["routes"].items():
+        base = baseline.get("routes", {}).get(name)
+        if not base:
+            print(f"{name:<32} {'-':>10} {row['p50_ms']:>10.2f} {'new':>7}")
+            continue
+        ratio = row["p50_ms"] / base["p50_ms"] if base["p50_ms"] else float("inf")
+        flag = ""
+        if ratio > max_regression:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<32} {base['p50_ms']:>10.2f} {row['p50_ms']:>10.2f} {ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark query route laporan")
+    parser.add_argument("--db", required=True, help="database SQLite (mis. dari bench.gen_data)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--only", nargs="*", help="hanya route yang namanya mengandung teks ini")
+    parser.add_argument("--count-cache", action="store_true", help="pakai cache COUNT(*) /results seperti di server")
+    parser.add_argument("--plans", action="store_true", help="cetak query plan tiap route")
+    parser.add_argument("--json", metavar="PATH", help="tulis hasil sebagai JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="JSON hasil run sebelumnya untuk dibandingkan")
+    parser.add_argument("--max-regression", type=float, default=1.5, help="rasio p50 maksimal terhadap baseline")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"{args.db} not found (generate one with python -m bench.gen_data)")
+        return 2
+
+    result = run(args)
+
+    if args.plans:
+        for name, row in result["routes"].items():
+            print(f"\n{name}:")
+            for plan in row["plans"]:
+                print(f"  {plan['sql'][:120]}")
+                for detail in plan["plan"]:
+                    print(f"      {detail}")
+
+    scans = {
+        name: sorted({scan for plan in row["plans"] for scan in plan["full_scans"]})
+        for name, row in result["routes"].items()
+    }
+    for name, tables in scans.items():
+        if tables:
+            print(f"Full scan in {name}: {', '.join(tables)}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Wrote {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
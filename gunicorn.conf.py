@@ -0,0 +1,18 @@
+# Dibaca otomatis oleh gunicorn dari working directory
+import os
+import shutil
+
+
+def on_starting(server):
+    # Metric dari run sebelumnya jangan ikut dijumlahkan
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Gauge "live" milik worker yang sudah exit dibuang dari agregasi /metrics
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,35 @@
+"""
+Env harus terpasang sebelum modul app di-import: engine dibuat saat import
+app.database. Semua test memakai satu database SQLite sementara.
+"""
+import os
+import tempfile
+
+_scratch = tempfile.mkdtemp(prefix="grading-tests-")
+os.environ["DATABASE_URI"] = f"sqlite:///{os.path.join(_scratch, 'test.sqlite')}"
+os.environ["LAB_LOG_DIR"] = os.path.join(_scratch, "labs")
+os.environ["SCHEME_PATH"] = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "schemes") + os.sep
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+import pytest
+from sqlalchemy import text
+
+from app.database import engine, init_db
+
+init_db()
+
+DATA_TABLES = (
+    "best_results", "criterion_results", "grading_results", "submissions",
+    "lab_sessions", "grading_jobs", "gitlab_project_cache", "users", "labs",
+)
+
+
+@pytest.fixture
+def db():
+    """
+    Database kosong per test.
+    """
+    with engine.begin() as conn:
+        for table in DATA_TABLES:
+            conn.execute(text(f"DELETE FROM {table}"))
+    yield engine
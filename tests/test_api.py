@@ -0,0 +1,85 @@
+import pytest
+from sqlalchemy import insert, select
+
+from app.api import app
+from app.models import GradingResult, Lab, User
+
+
+@pytest.fixture
+def client(db):
+    with db.begin() as conn:
+        conn.execute(insert(User.__table__), [
+            {"username": f"u{i:03d}", "password": "x", "name": f"U{i}", "class_name": "K1", "group_name": "g1"}
+            for i in range(120)
+        ])
+        conn.execute(insert(Lab.__table__).values(lab_id="TEST-001", scheme_path="/dev/null"))
+    return app.test_client()
+
+
+@pytest.mark.parametrize("query", ["page=abc", "per_page=x", "page=1.5"])
+@pytest.mark.parametrize("route", ["/users-not-started-lab?lab_id=TEST-001", "/users-not-started-lab-filtered?lab_id=TEST-001"])
+def test_not_started_bad_page_args_are_400(client, route, query):
+    response = client.get(f"{route}&{query}")
+    assert response.status_code == 400
+
+
+def test_results_bad_page_is_400(client):
+    assert client.get("/results?page=abc").status_code == 400
+
+
+def test_not_started_default_page_size(client):
+    body = client.get("/users-not-started-lab?lab_id=TEST-001").get_json()
+    assert (len(body["users_not_started"]), body["total"], body["per_page"]) == (100, 120, 100)
+
+    body = client.get("/users-not-started-lab?lab_id=TEST-001&page=2").get_json()
+    assert body["users_not_started"] == [f"u{i:03d}" for i in range(100, 120)]
+
+
+def test_batch_rejects_bad_tokens_per_item(client):
+    response = client.post("/grade-lab/batch", json={
+        "lab_id": "OSADM-001-2",
+        "submissions": [
+            {"token": None}, {"token": 5}, {"token": "x"}, "not-a-dict",
+            {"token": "Bearer dummy-token-u000-K1", "client_data": {}},
+        ],
+    })
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [item["status"] for item in results] == [400, 400, 400, 400, 200]
+    assert results[0]["error"] == "Invalid token"
+
+
+def test_batch_user_without_group(client, db):
+    with db.begin() as conn:
+        conn.execute(insert(User.__table__), [
+            {"username": name, "password": "x", "name": name, "class_name": "K2", "group_name": None}
+            for name in ("n1", "n2")
+        ])
+
+    response = client.post("/grade-lab/batch", json={
+        "lab_id": "OSADM-001-2",
+        "submissions": [
+            {"token": "Bearer dummy-token-n1-K2", "client_data": {}},
+            {"token": "Bearer dummy-token-u000-K1", "client_data": {}},
+        ],
+    })
+
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [(item["username"], item["status"]) for item in results] == [("n1", 200), ("u000", 200)]
+    with db.connect() as conn:
+        members = conn.execute(
+            select(GradingResult.__table__.c.username)
+            .where(GradingResult.__table__.c.submission_id == results[0]["submission_id"])
+        ).scalars().all()
+    # Sama seperti /grade-lab: user tanpa grup sekelas dianggap satu grup
+    assert sorted(members) == ["n1", "n2"]
+
+
+def test_edit_scheme_rejects_invalid_pipeline_fields(client, monkeypatch):
+    monkeypatch.setattr("app.api.schemes_registry.write", lambda *args: pytest.fail("scheme written"))
+    response = client.post("/edit_scheme/TEST-001", json={"criteria": [
+        {"type": "gitlab_pipeline", "key": "g1/app", "description": "CI", "score": 100, "min_success": 2},
+    ]})
+    assert response.status_code == 400
+    assert "success_stages" in response.get_json()["details"]
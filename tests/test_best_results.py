@@ -0,0 +1,88 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import delete, insert, select
+
+from app import best_results
+from app.models import BestResult, GradingResult, Lab, Submission, User
+
+LAB = "TEST-001"
+_best = BestResult.__table__
+_members = GradingResult.__table__
+
+
+@pytest.fixture
+def conn(db):
+    with db.begin() as conn:
+        conn.execute(insert(User.__table__), [
+            {"username": name, "password": "x", "name": name, "class_name": "K1", "group_name": "g1"}
+            for name in ("a", "b")
+        ])
+        conn.execute(insert(Lab.__table__).values(lab_id=LAB, scheme_path="/dev/null"))
+        yield conn
+
+
+def attempt(conn, score, members=("a", "b")):
+    """
+    Submission + grading_results tanpa record(); return (submission_id, [result_id]).
+    """
+    submission_id = conn.execute(insert(Submission.__table__).values(
+        username=members[0], class_name="K1", lab_id=LAB, score=score, timestamp=datetime(2025, 8, 1),
+    )).inserted_primary_key[0]
+    result_ids = [
+        conn.execute(insert(_members).values(
+            submission_id=submission_id, username=name, class_name="K1", lab_id=LAB, score=score,
+            timestamp=datetime(2025, 8, 1),
+        )).inserted_primary_key[0]
+        for name in members
+    ]
+    return submission_id, result_ids
+
+
+def best(conn):
+    return {
+        row.username: (row.score, row.result_id, row.attempts)
+        for row in conn.execute(select(_best).where(_best.c.lab_id == LAB))
+    }
+
+
+def test_record_keeps_highest_and_counts_attempts(conn):
+    first, first_ids = attempt(conn, 50)
+    best_results.record(conn, [first])
+    assert best(conn) == {"a": (50, first_ids[0], 1), "b": (50, first_ids[1], 1)}
+
+    lower, _ = attempt(conn, 20)
+    higher, higher_ids = attempt(conn, 80, members=("a",))
+    best_results.record(conn, [lower, higher])
+    assert best(conn) == {"a": (80, higher_ids[0], 3), "b": (50, first_ids[1], 2)}
+
+
+def test_record_batch_tie_keeps_earlier_attempt(conn):
+    first, first_ids = attempt(conn, 70)
+    second, _ = attempt(conn, 70)
+    best_results.record(conn, [second, first])
+    assert best(conn) == {"a": (70, first_ids[0], 2), "b": (70, first_ids[1], 2)}
+
+
+def test_recompute_after_deleting_best_attempt(conn):
+    low, low_ids = attempt(conn, 40)
+    high, high_ids = attempt(conn, 90)
+    best_results.record(conn, [low, high])
+
+    conn.execute(delete(_members).where(_members.c.id == high_ids[0]))
+    best_results.recompute(conn, "a", "K1", LAB)
+    assert best(conn)["a"] == (40, low_ids[0], 1)
+
+    conn.execute(delete(_members).where(_members.c.id == low_ids[0]))
+    best_results.recompute(conn, "a", "K1", LAB)
+    assert "a" not in best(conn)
+    assert best(conn)["b"] == (90, high_ids[1], 2)
+
+
+def test_rebuild_lab_matches_incremental_record(conn):
+    ids = [attempt(conn, score)[0] for score in (30, 60, 60, 10)]
+    best_results.record(conn, ids)
+    incremental = best(conn)
+
+    best_results.rebuild_lab(conn, LAB)
+    assert best(conn) == incremental
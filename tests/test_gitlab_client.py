@@ -0,0 +1,53 @@
+import pytest
+
+from app import gitlab_client
+from app.gitlab_client import GitLabClient
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(gitlab_client.time, "sleep", slept.append)
+    return slept
+
+
+def make_client(responses, **kwargs):
+    client = GitLabClient(base_url="http://gitlab.test", token="t", max_retries=2, backoff=0.01, **kwargs)
+    client.session = FakeSession(responses)
+    return client
+
+
+def test_retry_after_within_cap_is_honoured(sleeps):
+    client = make_client([FakeResponse(429, {"Retry-After": "2"}), FakeResponse(200)], retry_after_max=5)
+    assert client.get("projects/1").status_code == 200
+    assert sleeps == [2.0]
+
+
+def test_retry_after_over_cap_returns_429(sleeps):
+    client = make_client([FakeResponse(429, {"Retry-After": "3600"}), FakeResponse(200)], retry_after_max=5)
+    assert client.get("projects/1").status_code == 429
+    assert client.session.calls == 1
+    assert sleeps == []
+
+
+def test_retries_stop_after_max_retries(sleeps):
+    client = make_client([FakeResponse(503)] * 3)
+    assert client.get("projects/1").status_code == 503
+    assert client.session.calls == 3
+    assert len(sleeps) == 2
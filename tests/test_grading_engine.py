@@ -0,0 +1,146 @@
+import glob
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import grading_engine
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEME_FILES = sorted(glob.glob(os.path.join(ROOT, "app", "schemes", "*.json")))
+
+
+def load(path):
+    with open(path) as f:
+        return os.path.basename(path)[:-5], json.load(f)
+
+
+def correct_data(scheme):
+    """
+    client_data yang lulus semua kriteria lokal (seperti bench/loadtest.py).
+    """
+    data = {}
+    for criterion in scheme.get("criteria", []):
+        key, ctype = criterion.get("key"), criterion.get("type")
+        if ctype == "file_content":
+            data[key] = f"... {criterion['contains']} ..."
+        elif ctype == "config_check":
+            data[key] = "correct"
+        else:
+            data[key] = str(criterion.get("expected"))
+    return data
+
+
+@pytest.fixture
+def gitlab_calls(monkeypatch):
+    """
+    Ganti panggilan GitLab dengan stub yang selalu lulus; catat panggilannya.
+    """
+    calls = []
+    lock = threading.Lock()
+
+    def stub(name, result):
+        def fn(*args, **kwargs):
+            with lock:
+                calls.append((name, args, kwargs))
+            return result
+        monkeypatch.setattr(grading_engine, name, fn)
+
+    stub("check_gitlab_project", (True, "ok"))
+    stub("get_gitlab_project_id", (1, "ok"))
+    stub("check_gitlab_pipeline", (True, "success"))
+    stub("check_gitlab_pipeline_success_count", (True, "2 success"))
+    stub("check_gitlab_runner", (True, "runner"))
+    return calls
+
+
+def test_shipped_schemes_found():
+    assert len(SCHEME_FILES) > 10
+
+
+@pytest.mark.parametrize("path", SCHEME_FILES, ids=os.path.basename)
+def test_shipped_scheme_full_marks(path, gitlab_calls):
+    lab_id, scheme = load(path)
+    criteria = scheme["criteria"]
+    plan = grading_engine.compile_scheme(lab_id, scheme)
+    assert [step.index for step in plan] == list(range(len(criteria)))
+    assert [step.type for step in plan] == [c.get("type") for c in criteria]
+    assert all(step.remote == step.type.startswith("gitlab_") for step in plan if step.type in grading_engine.EVALUATORS)
+
+    outcomes = grading_engine.run_plan(plan, correct_data(scheme))
+    summary = grading_engine.summarize(outcomes)
+    assert summary["failed"] == []
+    assert summary["score"] == sum(c.get("score", 0) for c in criteria)
+    assert [row[0] for row in summary["criteria"]] == list(range(len(criteria)))
+
+
+@pytest.mark.parametrize("path", SCHEME_FILES, ids=os.path.basename)
+def test_shipped_scheme_empty_submission(path, gitlab_calls):
+    lab_id, scheme = load(path)
+    plan = grading_engine.compile_scheme(lab_id, scheme)
+    outcomes = grading_engine.run_plan(plan, {})
+    for outcome in outcomes:
+        # Tipe tidak dikenal dianggap lulus, kriteria GitLab lulus lewat stub
+        expected = outcome.type not in grading_engine.EVALUATORS or outcome.type.startswith("gitlab_")
+        assert outcome.passed == expected, outcome.description
+
+
+def test_run_plan_keeps_scheme_order_with_executor(gitlab_calls):
+    lab_id, scheme = load(os.path.join(ROOT, "app", "schemes", "OSADM-010-2.json"))
+    plan = grading_engine.compile_scheme(lab_id, scheme)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        outcomes = grading_engine.run_plan(plan, correct_data(scheme), executor)
+    assert [outcome.index for outcome in outcomes] == list(range(len(plan)))
+    assert all(outcome.passed for outcome in outcomes)
+
+
+def test_pipeline_rules_come_from_scheme_fields(gitlab_calls):
+    criterion = {"type": "gitlab_pipeline", "key": "g1/app", "description": "CI", "score": 100}
+    staged = {**criterion, "success_stages": ["staging", "production"], "min_success": 2}
+    grading_engine.run_plan(grading_engine.compile_scheme("OTHER", {"criteria": [staged]}), {})
+    name, _, kwargs = gitlab_calls[-1]
+    assert name == "check_gitlab_pipeline_success_count"
+    assert kwargs["stages"] == ("staging", "production") and kwargs["min_count"] == 2
+
+    # Tanpa success_stages: cek job build-image saja, lab ID tidak berpengaruh
+    for lab_id in ("OTHER", "OSADM-010-2", "OSADM-QUIZ-010-1"):
+        grading_engine.run_plan(grading_engine.compile_scheme(lab_id, {"criteria": [criterion]}), {})
+        assert gitlab_calls[-1][0] == "check_gitlab_pipeline"
+
+
+@pytest.mark.parametrize("fields", [
+    {"min_success": 2},
+    {"success_stages": "production"},
+    {"success_stages": []},
+    {"success_stages": ["staging"], "min_success": 2},
+    {"success_stages": ["staging"], "min_success": "1"},
+])
+def test_invalid_pipeline_fields_rejected(fields):
+    criterion = {"type": "gitlab_pipeline", "key": "g1/app", "description": "CI", "score": 100, **fields}
+    with pytest.raises(ValueError, match="Scheme OTHER, criterion 1 \\(gitlab_pipeline\\)"):
+        grading_engine.compile_scheme("OTHER", {"criteria": [criterion]})
+
+
+def test_run_plan_batch_checks_gitlab_once(gitlab_calls):
+    lab_id, scheme = load(os.path.join(ROOT, "app", "schemes", "OSADM-010-2.json"))
+    plan = grading_engine.compile_scheme(lab_id, scheme)
+    remote = sum(1 for step in plan if step.remote)
+    assert remote
+
+    results = grading_engine.run_plan_batch(plan, [correct_data(scheme), {}, correct_data(scheme)])
+    assert len(results) == 3
+    checks = [call for call in gitlab_calls if call[0] != "get_gitlab_project_id"]
+    assert len(checks) == remote
+    assert grading_engine.summarize(results[0])["failed"] == []
+    assert grading_engine.summarize(results[1])["failed"]
+
+
+def test_time_penalty():
+    assert grading_engine.apply_time_penalty(100, 60) == (100, [])
+    assert grading_engine.apply_time_penalty(100, None) == (100, [])
+    score, messages = grading_engine.apply_time_penalty(100, 400)  # 2 x 3 menit lewat
+    assert score == 90 and messages
+    assert grading_engine.apply_time_penalty(100, 3600)[0] == grading_engine.PENALTY_MIN_SCORE
+    assert grading_engine.apply_time_penalty(0, 3600) == (0, [])
@@ -0,0 +1,77 @@
+import pytest
+
+from app import api, lab_logs
+
+LAB = "TEST-001"
+TOKEN = {"Authorization": "Bearer dummy-token-u1-K1"}
+
+
+@pytest.fixture
+def log_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(lab_logs, "LAB_LOG_DIR", str(tmp_path))
+    return tmp_path
+
+
+def write(lines):
+    lab_logs.write(LAB, "u1", lines)
+    lab_logs.flush()
+
+
+def test_read_from_offset(log_dir):
+    write(["one", "two"])
+    first = lab_logs.read(LAB, "u1")
+    assert first["content"] == "one\ntwo\n"
+    assert first["offset"] == first["size"] == 8
+
+    write(["three"])
+    second = lab_logs.read(LAB, "u1", first["offset"])
+    assert second["content"] == "three\n"
+    assert second["offset"] == 14
+    assert not second["rotated"]
+
+
+def test_read_from_offset_stops_at_last_full_line(log_dir):
+    write(["one"])
+    with open(lab_logs.path_for(LAB, "u1"), "a") as f:
+        f.write("partial")
+    chunk = lab_logs.read(LAB, "u1", 2)
+    assert chunk["content"] == "e\n"
+    assert chunk["offset"] == 4  # baris "partial" dibaca lagi di poll berikutnya
+
+
+def test_read_offset_past_end_restarts(log_dir):
+    write(["one"])
+    chunk = lab_logs.read(LAB, "u1", 100)
+    assert chunk["rotated"]
+    assert chunk["content"] == "one\n"
+
+
+def test_read_missing_log(log_dir):
+    assert lab_logs.read(LAB, "nobody") is None
+    assert lab_logs.tail(LAB, "nobody", 5) is None
+
+
+def test_tail_across_blocks(log_dir):
+    write([f"line {i}" for i in range(100)])
+    chunk = lab_logs.tail(LAB, "u1", 3, block_size=16)
+    assert chunk["content"] == "line 97\nline 98\nline 99\n"
+    assert chunk["offset"] == chunk["size"]
+    assert lab_logs.tail(LAB, "u1", 0, block_size=16)["content"] == ""
+    assert lab_logs.tail(LAB, "u1", 1000)["content"].count("\n") == 100
+
+
+def test_get_log_route(log_dir, monkeypatch):
+    client = api.app.test_client()
+    assert client.get(f"/get-log?lab_id={LAB}", headers=TOKEN).status_code == 404
+
+    write(["one", "two"])
+    body = client.get(f"/get-log?lab_id={LAB}&tail=1", headers=TOKEN).get_json()
+    assert body["content"] == "two\n"
+    body = client.get(f"/get-log?lab_id={LAB}&offset=4", headers=TOKEN).get_json()
+    assert body["content"] == "two\n"
+
+    def broken(*args, **kwargs):
+        raise PermissionError("denied")
+
+    monkeypatch.setattr(lab_logs, "read", broken)
+    assert client.get(f"/get-log?lab_id={LAB}", headers=TOKEN).status_code == 500
@@ -0,0 +1,54 @@
+import io
+import json
+import logging
+import queue
+
+from app.logging_setup import DroppingQueueHandler, JsonFormatter, TextFormatter
+
+
+def emit_through_queue(formatter, exc=True):
+    """
+    Record lewat DroppingQueueHandler seperti di server, lalu diformat di
+    sisi listener. Return teks yang ditulis.
+    """
+    log_queue = queue.Queue()
+    logger = logging.getLogger("tests.logging_setup")
+    logger.propagate = False
+    handler = DroppingQueueHandler(log_queue)
+    logger.addHandler(handler)
+    try:
+        if exc:
+            try:
+                raise RuntimeError("boom")
+            except RuntimeError:
+                logger.exception("Grading job failed: %s", "job-1", extra={"job_id": "job-1"})
+        else:
+            logger.warning("Plain %s", "message")
+    finally:
+        logger.removeHandler(handler)
+
+    out = io.StringIO()
+    stream = logging.StreamHandler(out)
+    stream.setFormatter(formatter)
+    stream.handle(log_queue.get_nowait())
+    return out.getvalue()
+
+
+def test_json_exception_in_own_field():
+    entry = json.loads(emit_through_queue(JsonFormatter()))
+    assert entry["msg"] == "Grading job failed: job-1"
+    assert entry["job_id"] == "job-1"
+    assert entry["exc"].startswith("Traceback (most recent call last):")
+    assert "RuntimeError: boom" in entry["exc"]
+
+
+def test_json_without_exception():
+    entry = json.loads(emit_through_queue(JsonFormatter(), exc=False))
+    assert entry["msg"] == "Plain message"
+    assert "exc" not in entry
+
+
+def test_text_format_keeps_traceback():
+    text = emit_through_queue(TextFormatter())
+    assert "Grading job failed: job-1" in text
+    assert "RuntimeError: boom" in text
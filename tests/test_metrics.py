@@ -0,0 +1,32 @@
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+
+from app import database, metrics  # noqa: F401 (metrics mendaftarkan hook db stats)
+from app.database import engine, get_worker_db_stats
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_db_stats_are_exported_as_counters(db, monkeypatch):
+    monkeypatch.setattr(database, "SQLITE_SLOW_MS", 0)  # semua statement dianggap lambat
+    before = (sample("grading_db_statements_total"), sample("grading_db_slow_statements_total"),
+              sample("grading_db_errors_total", kind="other"))
+    worker_before = get_worker_db_stats()
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        try:
+            conn.execute(text("SELECT * FROM no_such_table"))
+        except Exception:
+            pass
+
+    assert sample("grading_db_statements_total") - before[0] >= 1
+    assert sample("grading_db_slow_statements_total") - before[1] >= 1
+    assert sample("grading_db_slow_statement_seconds_total") > 0
+    assert sample("grading_db_errors_total", kind="other") - before[2] == 1
+
+    worker = get_worker_db_stats()
+    assert worker["scope"] == "worker"
+    assert worker["errors"] - worker_before["errors"] == 1
@@ -0,0 +1,98 @@
+import logging
+import sqlite3
+
+from sqlalchemy import create_engine
+
+from app import migrations
+
+# Skema sebelum migrasi berversi: feedback/status/duration disalin ke tiap anggota
+OLD_SCHEMA = """
+CREATE TABLE users (username VARCHAR PRIMARY KEY, password VARCHAR NOT NULL, name VARCHAR,
+                    group_name VARCHAR, class_name VARCHAR NOT NULL);
+CREATE TABLE labs (lab_id VARCHAR PRIMARY KEY, scheme_path VARCHAR NOT NULL);
+CREATE TABLE grading_results (id INTEGER PRIMARY KEY AUTOINCREMENT, username VARCHAR NOT NULL,
+                              class_name VARCHAR NOT NULL, lab_id VARCHAR NOT NULL, score FLOAT NOT NULL,
+                              feedback VARCHAR, timestamp DATETIME, status VARCHAR, duration FLOAT);
+"""
+
+USERS = [("a", "g1"), ("b", "g1"), ("c", "g1"), ("d", "g2"), ("e", "g2")]
+# (username, score, feedback, duration); urutan id seperti yang ditulis grade_lab lama
+ROWS = [
+    ("a", 50, "K2: Failed", 120), ("b", 50, "K2: Failed", 120), ("c", 50, "K2: Failed", 120),
+    # Attempt kedua grup yang sama dengan hasil persis sama: dipisah karena username berulang
+    ("a", 50, "K2: Failed", 120), ("b", 50, "K2: Failed", 120), ("c", 50, "K2: Failed", 120),
+    ("d", 100, "K1, K2", 90), ("e", 100, "K1, K2", 90),
+    ("a", 100, "K1, K2", 60),
+]
+
+
+def make_old_database(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(OLD_SCHEMA)
+    conn.executemany(
+        "INSERT INTO users VALUES (?, 'x', ?, ?, 'K1')", [(name, name, group) for name, group in USERS]
+    )
+    conn.execute("INSERT INTO labs VALUES ('TEST-001', '/dev/null')")
+    conn.executemany(
+        "INSERT INTO grading_results (username, class_name, lab_id, score, feedback, timestamp, status, duration) "
+        "VALUES (?, 'K1', 'TEST-001', ?, ?, ?, 'done', ?)",
+        [(name, score, feedback, f"2025-08-01 10:00:{i:02d}", duration)
+         for i, (name, score, feedback, duration) in enumerate(ROWS)],
+    )
+    conn.commit()
+    conn.close()
+
+
+class Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_upgrade_normalizes_grading_results(tmp_path, capsys):
+    path = tmp_path / "old.sqlite"
+    make_old_database(path)
+    bind = create_engine(f"sqlite:///{path}")
+
+    handler = Collect()
+    migrations.log.addHandler(handler)
+    migrations.log.setLevel(logging.INFO)
+    try:
+        applied = migrations.upgrade(bind)
+        assert migrations.upgrade(bind) == []
+    finally:
+        migrations.log.removeHandler(handler)
+        migrations.log.setLevel(logging.NOTSET)
+    bind.dispose()
+    assert applied == [name for _, name, _ in migrations.MIGRATIONS]
+
+    # Dipanggil dari init_db tiap worker: lewat logger, bukan print ke stdout
+    assert capsys.readouterr().out == ""
+    messages = {record.getMessage(): record for record in handler.records}
+    assert messages["Normalized grading_results into submissions"].rows == len(ROWS)
+    assert messages["Migrations applied"].migrations == applied
+
+    conn = sqlite3.connect(path)
+    submissions = conn.execute(
+        "SELECT id, username, group_name, score, feedback, status, duration FROM submissions ORDER BY id"
+    ).fetchall()
+    assert [row[1:] for row in submissions] == [
+        ("a", "g1", 50, "K2: Failed", "done", 120),
+        ("a", "g1", 50, "K2: Failed", "done", 120),
+        ("d", "g2", 100, "K1, K2", "done", 90),
+        ("a", "g1", 100, "K1, K2", "done", 60),
+    ]
+    ids = [row[0] for row in submissions]
+    mapping = conn.execute("SELECT id, submission_id FROM grading_results ORDER BY id").fetchall()
+    assert [submission_id for _, submission_id in mapping] == [ids[0]] * 3 + [ids[1]] * 3 + [ids[2]] * 2 + [ids[3]]
+
+    columns = migrations._columns(conn.cursor(), "grading_results")
+    if sqlite3.sqlite_version_info >= (3, 35, 0):
+        assert not columns & {"feedback", "status", "duration"}
+
+    best = conn.execute("SELECT username, score, attempts FROM best_results ORDER BY username").fetchall()
+    assert best == [("a", 100, 3), ("b", 50, 2), ("c", 50, 2), ("d", 100, 1), ("e", 100, 1)]
+    conn.close()
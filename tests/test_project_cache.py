@@ -0,0 +1,43 @@
+import pytest
+
+from app import api, project_cache
+
+
+@pytest.fixture
+def cache(db, monkeypatch):
+    monkeypatch.setattr(project_cache, "_local", {})
+    return project_cache
+
+
+def test_store_and_lookup(cache):
+    cache.store("g1/app", 42)
+    cache.store("g1/missing", None, "project_not_found")
+    assert cache.lookup("g1/app") == (42, "ok")
+    assert cache.lookup("g1/missing") == (None, "project_not_found")
+    assert cache.lookup("g1/other") is None
+
+
+def test_local_cache_is_bounded(cache, monkeypatch):
+    monkeypatch.setattr(project_cache, "PROJECT_LOCAL_MAX", 3)
+    for i in range(10):
+        cache.store(f"g1/app{i}", i)
+        assert len(cache._local) <= 3
+    # Yang sudah keluar dari cache lokal tetap ada di tabel
+    assert cache.lookup("g1/app0") == (0, "ok")
+
+
+def test_webhook_project_event_invalidates(cache, monkeypatch):
+    monkeypatch.setattr(api, "GITLAB_SECRET", "s3cret")
+    cache.store("g1/old-name", 42)
+    cache.store("g1/new-name", None, "project_not_found")
+
+    response = api.app.test_client().post(
+        "/webhook/gitlab",
+        headers={"X-Gitlab-Token": "s3cret"},
+        json={"event_name": "project_rename", "path_with_namespace": "g1/new-name",
+              "old_path_with_namespace": "g1/old-name", "project_id": 42},
+    )
+
+    assert response.status_code == 200
+    assert cache.lookup("g1/old-name") is None
+    assert cache.lookup("g1/new-name") is None
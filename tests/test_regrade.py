@@ -0,0 +1,139 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert, select
+
+from app import best_results, grading_engine, regrade
+from app.models import BestResult, CriterionResult, GradingResult, Lab, Submission, User
+
+LAB = "TEST-001"
+SCHEME = {
+    "criteria": [
+        {"type": "command", "key": "k1", "expected": "ok", "description": "Kriteria 1", "score": 50},
+        {"type": "command", "key": "k2", "expected": "ok", "description": "Kriteria 2", "score": 50},
+    ]
+}
+
+
+def add_submission(conn, username, score, client_data, group=("a", "b")):
+    """
+    Satu attempt grup: submission + grading_results tiap anggota.
+    client_data None = submission lama tanpa payload.
+    """
+    submission_id = conn.execute(insert(Submission.__table__).values(
+        username=username, class_name="K1", group_name="g1", lab_id=LAB, score=score,
+        feedback="", timestamp=datetime(2025, 8, 1), status="done", duration=60,
+        payload=regrade.pack_payload(client_data) if client_data is not None else None,
+    )).inserted_primary_key[0]
+    conn.execute(insert(GradingResult.__table__), [
+        {"submission_id": submission_id, "username": member, "class_name": "K1", "lab_id": LAB,
+         "score": score, "timestamp": datetime(2025, 8, 1)}
+        for member in group
+    ])
+    best_results.record(conn, [submission_id])
+    return submission_id
+
+
+@pytest.fixture
+def lab(db):
+    with db.begin() as conn:
+        conn.execute(insert(User.__table__), [
+            {"username": name, "password": "x", "name": name, "class_name": "K1", "group_name": "g1"}
+            for name in ("a", "b")
+        ])
+        conn.execute(insert(Lab.__table__).values(lab_id=LAB, scheme_path="/dev/null"))
+    return db
+
+
+def scores(conn, table):
+    return {row.id: row.score for row in conn.execute(select(table.c.id, table.c.score))}
+
+
+def test_payload_round_trip():
+    client_data = {"k1": "ok", "nested": {"x": [1, 2]}, "unicode": "ñ"}
+    payload = regrade.pack_payload(client_data)
+    assert isinstance(payload, bytes)
+    assert regrade.unpack_payload(payload) == client_data
+    assert regrade.unpack_payload(None) is None
+
+
+def test_regrade_skips_rows_without_payload(lab):
+    with lab.begin() as conn:
+        old = add_submission(conn, "a", 0, None)
+        new = add_submission(conn, "a", 0, {"k1": "ok", "k2": "ok"})
+
+    summary = regrade.regrade_lab(LAB, SCHEME, workers=1)
+
+    assert summary == {"lab_id": LAB, "regraded": 1, "changed": 1, "skipped": 1}
+    with lab.connect() as conn:
+        assert scores(conn, Submission.__table__) == {old: 0, new: 100}
+
+
+def test_regrade_rebuilds_best_results(lab):
+    with lab.begin() as conn:
+        first = add_submission(conn, "a", 100, {"k1": "ok", "k2": "wrong"})
+        add_submission(conn, "a", 50, {"k1": "ok", "k2": "ok"})
+
+    # Scheme baru: k2 sekarang dianggap benar kalau "wrong" (mis. expected diperbaiki)
+    scheme = {"criteria": [SCHEME["criteria"][0], {**SCHEME["criteria"][1], "expected": "wrong"}]}
+    regrade.regrade_lab(LAB, scheme, workers=1)
+
+    with lab.connect() as conn:
+        rows = conn.execute(select(BestResult.__table__)).all()
+        result_ids = {
+            row.id for row in conn.execute(
+                select(GradingResult.__table__.c.id).where(GradingResult.__table__.c.submission_id == first)
+            )
+        }
+        criteria = conn.execute(
+            select(CriterionResult.__table__).where(CriterionResult.__table__.c.submission_id == first)
+        ).all()
+
+    assert {row.username for row in rows} == {"a", "b"}
+    for row in rows:
+        assert row.score == 100
+        assert row.attempts == 2
+        assert row.result_id in result_ids
+    assert [(row.criterion_index, row.passed) for row in criteria] == [(0, True), (1, True)]
+
+
+def test_swap_is_one_transaction(lab, monkeypatch):
+    with lab.begin() as conn:
+        submission_id = add_submission(conn, "a", 0, {"k1": "ok", "k2": "ok"})
+        before = (scores(conn, Submission.__table__), scores(conn, GradingResult.__table__))
+
+    def fail(conn, lab_id):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(best_results, "rebuild_lab", fail)
+    scored = [{
+        "id": submission_id, "class_name": "K1", "score": 100, "old_score": 0, "feedback": "",
+        "criteria": [(0, "command", True, None, "fp"), (1, "command", True, None, "fp")],
+    }]
+    with pytest.raises(RuntimeError):
+        regrade._swap(LAB, scored)
+
+    with lab.connect() as conn:
+        assert (scores(conn, Submission.__table__), scores(conn, GradingResult.__table__)) == before
+        assert conn.execute(select(CriterionResult.__table__)).all() == []
+
+
+def test_stored_remote_result_reused_only_for_same_criterion():
+    criterion = {"type": "gitlab_project", "key": "g1/build-image", "description": "Project", "score": 100}
+    plan = grading_engine.compile_scheme(LAB, {"criteria": [criterion]})
+    fingerprint = plan[0].fingerprint
+    stored = {0: (fingerprint, True, None)}
+    shared_remote = {0: (False, "Project not found")}
+    row = (1, "K1", regrade.pack_payload({}), 60, 100, stored)
+
+    # Kriteria sama (description/score boleh berubah): pakai hasil saat submit
+    same = {"criteria": [{**criterion, "description": "Project (baru)"}]}
+    assert regrade._score_chunk(LAB, same, [row], shared_remote)[0]["score"] == 100
+
+    # key berubah: hasil tersimpan tidak berlaku, pakai hasil cek ulang
+    changed = {"criteria": [{**criterion, "key": "g1/other"}]}
+    assert regrade._score_chunk(LAB, changed, [row], shared_remote)[0]["score"] == 0
+
+    # Baris lama tanpa fingerprint juga dicek ulang
+    legacy = (1, "K1", regrade.pack_payload({}), 60, 100, {0: (None, True, None)})
+    assert regrade._score_chunk(LAB, {"criteria": [criterion]}, [legacy], shared_remote)[0]["score"] == 0